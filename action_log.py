@@ -0,0 +1,193 @@
+"""
+Journal compact des actions d'un match : colonnes typées (array) au lieu d'une liste de dict ou de namedtuple.
+
+Une ligne par action saisie : horodatage, position, joueur, code action, et ce que le moteur de score en a dérivé
+(set et score avant l'action). Les chaînes sont internées en petits entiers : positions et codes action dans des
+tables fixes communes à tous les matchs du processus, joueurs et horodatages hors format dans des tables propres
+au journal, libérées avec lui quand le match quitte la mémoire. Les horodatages 'HH:MM:SS' sont stockés en secondes.
+Une ligne occupe 21 octets, ajouter ou retirer la dernière est en O(1) amorti et copier un journal revient
+à copier sept tableaux.
+"""
+import threading
+from array import array
+
+from registry import ACTIONS
+
+# --- TABLES D'INTERNEMENT ---
+
+class Interner:
+    """Table chaîne <-> entier, sûre entre threads : chaque chaîne n'y est stockée qu'une fois."""
+
+    __slots__ = ('values', '_ids', '_lock')
+
+    def __init__(self, initial=()):
+        self.values = []
+        self._ids = {}
+        self._lock = threading.Lock()
+        for value in initial:
+            self.id(value)
+
+    def id(self, value):
+        try:
+            return self._ids[value]
+        except KeyError:
+            with self._lock:
+                if value not in self._ids:
+                    self.values.append(value)
+                    self._ids[value] = len(self.values) - 1 # Publié après la valeur : un lecteur la trouve toujours
+                return self._ids[value]
+
+    def ids(self, typecode, values):
+        """Tableau des identifiants de 'values' (recherche en C quand toutes les valeurs sont déjà connues)."""
+        try:
+            return array(typecode, map(self._ids.__getitem__, values))
+        except KeyError:
+            return array(typecode, map(self.id, values))
+
+# Tables du processus, de taille fixe en pratique (les codes inconnus du référentiel sont rejetés à l'import)
+POSITIONS = Interner([f"P{p}" for p in range(1, 7)] + ['FIN'])
+ACTION_CODES = Interner([info.code for info in ACTIONS] + ['FIN_SET', 'FIN_MATCH']) # id = ActionInfo.id pour les codes connus
+
+def clock_seconds(text):
+    """Secondes depuis minuit d'un horodatage 'HH:MM:SS', ou None s'il n'a pas exactement ce format."""
+    if len(text) != 8 or text[2] != ':' or text[5] != ':':
+        return None
+    try:
+        value = int(text[:2]) * 3600 + int(text[3:5]) * 60 + int(text[6:])
+    except ValueError:
+        return None
+    return value if format_clock(value) == text else None # ' 9:05:00', '23:59:60'... : gardés tels quels
+
+def format_clock(value):
+    minutes, seconds = divmod(value, 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:{seconds:02d}"
+
+# --- JOURNAL ---
+
+# Colonne -> code de type array (octets par ligne : 4 + 1 + 4 + 2 + 2 + 4 + 4). Set et scores sont signés et larges :
+# les fichiers importés peuvent contenir des valeurs hors règles, et le score continue après la fin du match.
+COLUMN_TYPES = {
+    'timestamps': 'i', 'positions': 'B', 'players': 'I', 'actions': 'H',
+    'sets': 'h', 'scores_veec': 'i', 'scores_adverse': 'i',
+}
+
+
+class ActionLog:
+    """Actions d'un match dans l'ordre de saisie ; les colonnes dérivées (set, scores) sont écrites par ScoreEngine."""
+
+    __slots__ = (*COLUMN_TYPES, 'names', 'texts', '_text_ids')
+
+    def __init__(self):
+        for column, typecode in COLUMN_TYPES.items():
+            setattr(self, column, array(typecode))
+        self.names = Interner() # Joueurs du match : la table disparaît avec le journal
+        self.texts = [] # Horodatages hors format 'HH:MM:SS' (fichiers importés) : codés -1 - index dans cette liste
+        self._text_ids = {}
+
+    def _encode_timestamp(self, text):
+        seconds = clock_seconds(text)
+        if seconds is not None:
+            return seconds
+        index = self._text_ids.get(text)
+        if index is None: # Un même texte n'est stocké qu'une fois, même saisi et annulé à répétition
+            self.texts.append(text)
+            index = self._text_ids[text] = len(self.texts) - 1
+        return -1 - index
+
+    def _decode_timestamp(self, value):
+        return self.texts[-1 - value] if value < 0 else format_clock(value)
+
+    def __len__(self):
+        return len(self.actions)
+
+    def append(self, timestamp, pos, joueur, action, set_num=0, score_veec=0, score_adverse=0):
+        self.timestamps.append(self._encode_timestamp(timestamp))
+        self.positions.append(POSITIONS.id(pos))
+        self.players.append(self.names.id(joueur))
+        self.actions.append(ACTION_CODES.id(action))
+        self.sets.append(set_num)
+        self.scores_veec.append(score_veec)
+        self.scores_adverse.append(score_adverse)
+
+    def insert(self, index, timestamp, pos, joueur, action):
+        """Insère une action à 'index' (set et scores à zéro, à recalculer par le moteur)."""
+        self.timestamps.insert(index, self._encode_timestamp(timestamp))
+        self.positions.insert(index, POSITIONS.id(pos))
+        self.players.insert(index, self.names.id(joueur))
+        self.actions.insert(index, ACTION_CODES.id(action))
+        self.sets.insert(index, 0)
+        self.scores_veec.insert(index, 0)
+        self.scores_adverse.insert(index, 0)
+
+    def replace(self, index, timestamp, pos, joueur, action):
+        self.timestamps[index] = self._encode_timestamp(timestamp)
+        self.positions[index] = POSITIONS.id(pos)
+        self.players[index] = self.names.id(joueur)
+        self.actions[index] = ACTION_CODES.id(action)
+
+    def __delitem__(self, index):
+        for column in COLUMN_TYPES:
+            del getattr(self, column)[index]
+
+    def pop(self):
+        for column in COLUMN_TYPES:
+            getattr(self, column).pop()
+
+    def set_derived(self, index, set_num, score_veec, score_adverse):
+        self.sets[index] = set_num
+        self.scores_veec[index] = score_veec
+        self.scores_adverse[index] = score_adverse
+
+    # --- LECTURE ---
+
+    def action(self, index):
+        return ACTION_CODES.values[self.actions[index]]
+
+    def event(self, index):
+        """(horodatage, position, joueur, code action) de la ligne 'index'."""
+        return (self._decode_timestamp(self.timestamps[index]), POSITIONS.values[self.positions[index]],
+                self.names.values[self.players[index]], ACTION_CODES.values[self.actions[index]])
+
+    def derived(self, index):
+        """(set, score VEEC, score adverse) avant l'action de la ligne 'index'."""
+        return self.sets[index], self.scores_veec[index], self.scores_adverse[index]
+
+    def copy(self):
+        log = ActionLog.__new__(ActionLog)
+        for column in COLUMN_TYPES:
+            setattr(log, column, array(getattr(self, column).typecode, getattr(self, column)))
+        log.names = self.names # Table partagée : elle ne fait que grandir, les identifiants restent valables
+        log.texts = list(self.texts)
+        log._text_ids = dict(self._text_ids)
+        return log
+
+    # --- SÉRIALISATION (dcc.Store en mode sans état serveur) ---
+    # Les identifiants internés sont propres au processus et au journal : le Store reçoit les chaînes, en colonnes.
+    # Les horodatages gardent leur codage (secondes, ou -1 - index dans 'texts') : aucun formatage par requête.
+
+    def to_columns(self):
+        return {
+            'timestamp': self.timestamps.tolist(),
+            'texts': list(self.texts),
+            'pos': [POSITIONS.values[value] for value in self.positions],
+            'joueur': [self.names.values[value] for value in self.players],
+            'action': [ACTION_CODES.values[value] for value in self.actions],
+            'set': self.sets.tolist(),
+            'score_veec': self.scores_veec.tolist(),
+            'score_adverse': self.scores_adverse.tolist(),
+        }
+
+    @classmethod
+    def from_columns(cls, columns):
+        log = cls.__new__(cls)
+        log.timestamps = array('i', columns['timestamp'])
+        log.texts = list(columns['texts'])
+        log._text_ids = {text: index for index, text in enumerate(log.texts)}
+        log.names = Interner()
+        log.positions = POSITIONS.ids('B', columns['pos'])
+        log.players = log.names.ids('I', columns['joueur'])
+        log.actions = ACTION_CODES.ids('H', columns['action'])
+        log.sets = array('h', columns['set'])
+        log.scores_veec = array('i', columns['score_veec'])
+        log.scores_adverse = array('i', columns['score_adverse'])
+        return log
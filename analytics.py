@@ -0,0 +1,258 @@
+"""
+Analyse de saison : copie en colonnes de la table 'actions', projetable en mémoire (np.load mmap_mode='r').
+
+Les colonnes texte (match, position, joueur, code action) sont encodées en entiers avec un dictionnaire par colonne.
+Le cache est rafraîchi de façon incrémentale à partir du plus grand id déjà copié : les nouvelles lignes forment
+un nouveau morceau de fichiers .npy, fusionnés quand ils deviennent trop nombreux. Si une ligne déjà copiée a été
+supprimée (annulation), le cache est reconstruit entièrement. Les matchs archivés (archive.py) quittent 'actions' sans
+passer par le journal des suppressions : leurs lignes restent dans le cache, et une reconstruction les relit dans les archives.
+
+Les requêtes (regroupements, fenêtres glissantes sur les derniers matchs) sont vectorisées avec NumPy / pandas.
+pandas n'est importé qu'à la première lecture du cache (environ 0,4 s) : le démarrage de l'application n'en dépend pas.
+"""
+import fcntl
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from archive import iter_actions_since
+from database import DB_NAME, fetch_deletions_since
+from registry import ACTIONS_BY_CODE
+
+# --- CONFIGURATION ---
+
+ANALYTICS_DIR = os.environ.get('VEEC_ANALYTICS_DIR') or os.path.join(os.path.dirname(os.path.abspath(DB_NAME)), 'analytics_cache')
+MAX_CHUNKS = 16 # Au-delà, les morceaux sont fusionnés en un seul
+FORMAT_VERSION = 1
+
+# Colonnes numériques (lues telles quelles) et colonnes encodées par dictionnaire (colonne du cache -> colonne SQL)
+NUMERIC_COLUMNS = {'id': np.int64, 'set_num': np.int16, 'score_veec': np.int16, 'score_adverse': np.int16}
+CATEGORICAL_COLUMNS = {'match': 'match_id', 'position': 'position', 'joueur': 'joueur_nom', 'action': 'action_code'}
+
+# Axes de regroupement proposés par la page d'analyse
+GROUP_BY_COLUMNS = {'joueur': "Joueur", 'position': "Position", 'set_num': "Set", 'category': "Catégorie", 'match': "Match"}
+
+# Date et heure de début contenues dans l'identifiant : Match_AAAAMMJJ_HHMMSS_xxxxxx (app.py), Match_AAAAMMJJ_... (import)
+MATCH_DATE_PATTERN = re.compile(r'^Match_\d{8}_')
+
+def match_chronology_key(match_id):
+    """
+    Clé de tri chronologique d'un match. L'ordre des lignes ne suit pas les dates (match importé après un plus récent,
+    match archivé relu en premier) : seul l'identifiant les porte. Les identifiants sans date passent en premier.
+    """
+    return (1, match_id) if MATCH_DATE_PATTERN.match(match_id) else (0, match_id)
+
+
+class SeasonSnapshot:
+    """Cache en colonnes de toutes les actions de la base, stocké dans un dossier (meta.json + morceaux .npy)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._frame = None
+        self._frame_key = None
+
+    # --- FICHIERS ---
+
+    def _meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path(), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('format') == FORMAT_VERSION else None
+
+    def _write_meta(self, meta):
+        # Écriture atomique : un lecteur (autre worker) voit l'ancienne ou la nouvelle version, jamais un mélange
+        tmp_path = f"{self._meta_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self._meta_path())
+
+    @contextmanager
+    def _exclusive(self):
+        """Verrou du dossier, partagé entre threads et entre workers (un seul rafraîchissement à la fois)."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, '.lock'), 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_chunk(self, columns):
+        name = f"chunk_{uuid.uuid4().hex}"
+        path = os.path.join(self.directory, name)
+        os.makedirs(path)
+        for column, values in columns.items():
+            np.save(os.path.join(path, f"{column}.npy"), values)
+        return name
+
+    def _load_chunk(self, name):
+        path = os.path.join(self.directory, name)
+        return {column: np.load(os.path.join(path, f"{column}.npy"), mmap_mode='r')
+                for column in (*NUMERIC_COLUMNS, *CATEGORICAL_COLUMNS)}
+
+    def _remove_unused_chunks(self, meta):
+        for name in os.listdir(self.directory):
+            if name.startswith('chunk_') and name not in meta['chunks']:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    # --- RAFRAÎCHISSEMENT ---
+
+    def refresh(self):
+        """Copie les actions ajoutées depuis le dernier rafraîchissement ; retourne le nombre de lignes du cache."""
+        with self._exclusive():
+            meta = self._read_meta()
+            last_seq, min_deleted_id = fetch_deletions_since(meta['deleted_seq'] if meta else 0)
+            if meta is None or (min_deleted_id is not None and min_deleted_id <= meta['max_id']):
+                # Première construction, ou une ligne déjà copiée a été supprimée : reconstruction complète
+                meta = {'format': FORMAT_VERSION, 'max_id': 0, 'rows': 0, 'deleted_seq': 0, 'chunks': [],
+                        'dictionaries': {column: [] for column in CATEGORICAL_COLUMNS}}
+            if last_seq is not None:
+                meta['deleted_seq'] = last_seq
+
+            new_chunks = self._append_new_rows(meta)
+            if new_chunks or len(meta['chunks']) > MAX_CHUNKS:
+                meta['chunks'] = meta['chunks'] + new_chunks
+                if len(meta['chunks']) > MAX_CHUNKS:
+                    meta['chunks'] = [self._write_chunk(self._concatenate(meta['chunks']))]
+            self._write_meta(meta)
+            self._remove_unused_chunks(meta)
+            return meta['rows']
+
+    def _append_new_rows(self, meta):
+        codes = {column: {value: code for code, value in enumerate(values)}
+                 for column, values in meta['dictionaries'].items()}
+        chunks = []
+        for rows in iter_actions_since(meta['max_id']):
+            columns = {column: np.fromiter((row[column] for row in rows), dtype=dtype, count=len(rows))
+                       for column, dtype in NUMERIC_COLUMNS.items()}
+            for column, sql_column in CATEGORICAL_COLUMNS.items():
+                dictionary, values = codes[column], meta['dictionaries'][column]
+                encoded = np.empty(len(rows), dtype=np.int32)
+                for i, row in enumerate(rows):
+                    value = row[sql_column]
+                    code = dictionary.get(value)
+                    if code is None:
+                        code = dictionary[value] = len(values)
+                        values.append(value)
+                    encoded[i] = code
+                columns[column] = encoded
+            chunks.append(self._write_chunk(columns))
+            meta['max_id'] = max(meta['max_id'], int(columns['id'].max())) # Lignes archivées d'abord : id croissants par match seulement
+            meta['rows'] += len(rows)
+        return chunks
+
+    def _concatenate(self, chunk_names):
+        chunks = [self._load_chunk(name) for name in chunk_names]
+        if not chunks:
+            return {column: np.empty(0, dtype=NUMERIC_COLUMNS.get(column, np.int32))
+                    for column in (*NUMERIC_COLUMNS, *CATEGORICAL_COLUMNS)}
+        if len(chunks) == 1:
+            return chunks[0] # Un seul morceau : les colonnes restent projetées depuis le disque
+        return {column: np.concatenate([chunk[column] for chunk in chunks]) for column in chunks[0]}
+
+    # --- LECTURE ---
+
+    def frame(self):
+        """DataFrame de toutes les actions (colonnes catégorielles), mis en cache jusqu'au prochain rafraîchissement."""
+        import pandas as pd # Import paresseux : seule la page d'analyse en a besoin
+        meta = self._read_meta()
+        if meta is None:
+            self.refresh()
+            meta = self._read_meta()
+        key = tuple(meta['chunks'])
+        if self._frame is not None and self._frame_key == key:
+            return self._frame
+
+        try:
+            columns = self._concatenate(meta['chunks'])
+        except FileNotFoundError:
+            # Morceaux fusionnés par un autre worker entre la lecture de meta.json et celle des fichiers
+            with self._exclusive():
+                meta = self._read_meta()
+                columns = self._concatenate(meta['chunks'])
+            key = tuple(meta['chunks'])
+        data = {column: columns[column] for column in NUMERIC_COLUMNS}
+        for column in CATEGORICAL_COLUMNS:
+            data[column] = pd.Categorical.from_codes(columns[column], categories=pd.Index(meta['dictionaries'][column], dtype=object))
+        for column in ('position', 'joueur'):
+            # Ordre alphabétique pour l'affichage
+            data[column] = data[column].reorder_categories(sorted(data[column].categories))
+        # Matchs dans l'ordre chronologique : codes croissants avec la date (derniers matchs, fenêtres glissantes)
+        data['match'] = data['match'].reorder_categories(sorted(data['match'].categories, key=match_chronology_key))
+
+        # Attributs dérivés du référentiel, calculés une fois par code action puis diffusés par indexation
+        action_codes = meta['dictionaries']['action']
+        infos = [ACTIONS_BY_CODE.get(code) for code in action_codes]
+        categories = [info.category if info else code.split('_', 1)[0] for info, code in zip(infos, action_codes)]
+        quality = np.array([info.quality if info else 'neutre' for info in infos] or ['neutre'])
+        action = np.asarray(columns['action'])
+        data['category'] = pd.Categorical(np.array(categories or [''], dtype=object)[action])
+        data['positif'] = quality[action] == 'positif'
+        data['erreur'] = quality[action] == 'erreur'
+
+        frame = pd.DataFrame(data)
+        self._frame, self._frame_key = frame, key
+        return frame
+
+
+_snapshot = SeasonSnapshot(ANALYTICS_DIR)
+
+def refresh():
+    return _snapshot.refresh()
+
+def season_frame():
+    return _snapshot.frame()
+
+# --- REQUÊTES ---
+
+def _filter(frame, joueur=None, category=None, position=None, last_matches=None):
+    mask = np.ones(len(frame), dtype=bool)
+    if joueur:
+        mask &= (frame['joueur'] == joueur).to_numpy()
+    if category:
+        mask &= (frame['category'] == category).to_numpy()
+    if position:
+        mask &= (frame['position'] == position).to_numpy()
+    if last_matches:
+        # Les codes de match suivent l'ordre chronologique (frame) : les plus grands sont les plus récents
+        match_codes = frame['match'].cat.codes.to_numpy()
+        played = np.unique(match_codes[mask])
+        if len(played) > last_matches:
+            mask &= match_codes >= played[-last_matches]
+    return frame[mask]
+
+def _efficiency(grouped):
+    grouped['efficacite'] = np.round(100 * (grouped['positifs'] - grouped['erreurs']) / grouped['actions'], 1)
+    return grouped
+
+def group_stats(by=('joueur',), joueur=None, category=None, position=None, last_matches=None):
+    """Volume, gestes positifs, erreurs et efficacité regroupés par les colonnes 'by' (voir GROUP_BY_COLUMNS)."""
+    frame = _filter(season_frame(), joueur, category, position, last_matches)
+    grouped = frame.groupby(list(by), observed=True, sort=True).agg(
+        actions=('id', 'size'), positifs=('positif', 'sum'), erreurs=('erreur', 'sum')
+    ).reset_index()
+    return _efficiency(grouped)
+
+def rolling_efficiency(window=5, joueur=None, category=None, position=None, last_matches=None):
+    """Efficacité match par match et sur une fenêtre glissante des 'window' derniers matchs (ordre chronologique)."""
+    frame = _filter(season_frame(), joueur, category, position, last_matches)
+    per_match = frame.groupby('match', observed=True, sort=True).agg(
+        actions=('id', 'size'), positifs=('positif', 'sum'), erreurs=('erreur', 'sum')
+    )
+    rolling = per_match.rolling(window, min_periods=1).sum()
+    per_match = _efficiency(per_match)
+    per_match['efficacite_glissante'] = np.round(100 * (rolling['positifs'] - rolling['erreurs']) / rolling['actions'], 1)
+    return per_match.reset_index()
@@ -1,21 +1,47 @@
 import dash
-from dash import dcc, html, dash_table
-from dash.dependencies import Input, Output, State, ALL
+import flask
+from flask_compress import Compress
+from dash import dcc, html, dash_table, Patch
+from dash._utils import to_json
+from dash.dependencies import Input, Output, State, ALL, ClientsideFunction
 import plotly.graph_objects as go
-import pandas as pd
+import numpy as np
+
+import analytics
+import archive
+import metrics
+import roster
+from live import broker, sse_stream, scoreboard_html, MAX_STREAMS, RETRY_AFTER_SECONDS
+from export import EXPORT_FORMATS, EXPORT_STREAMS, export_filename
+from importer import import_upload_stream, upload_page_html
 from datetime import datetime
 import json
 import re
-import copy
+import hashlib
+import functools
+import contextlib
 import time
-import sqlite3
+import uuid
+import os
+import urllib.parse
+import threading
+from collections import OrderedDict
+
+from action_log import ActionLog
+from archive import fetch_all_stats, fetch_stats_page # Matchs archivés compris
+from score_engine import ScoreEngine, Event, SetResult, POINTS_POUR_GAGNER, SETS_POUR_GAGNER, MAX_SETS
+from registry import ACTION_CATEGORIES, CATEGORIES, ACTIONS_BY_CODE, ACTIONS_BY_CATEGORY_RESULT, POINT_EFFECTS
+from database import (
+    init_db, close_all_connections, transaction, insert_stat, delete_last_stat_and_get_data,
+    find_known_client_uuids, insert_client_action, fetch_player_aggregates, fetch_position_aggregates,
+    match_lock, fetch_match_version, fetch_match_versions, fetch_set_results, fetch_unfinished_matches, insert_set_result,
+    fetch_match_team, set_match_team, HISTORIQUE_SQL_COLUMNS, DEFAULT_TEAM_ID
+)
 
 # --- CONFIGURATION & CONSTANTES ---
 
-DB_NAME = 'match_stats.db'
-
-# URL mise à jour avec l'image du demi-terrain
-URL_IMAGE_TERRAIN = "https://raw.githubusercontent.com/takerusumida-lgtm/agent-stats-volley-veec/c8e81f5fd7ec811428e8bfbc5b5d880614f5fc40/Volleyball_Half_Court.png"
+# Image du demi-terrain, servie par l'application depuis assets/ (fonctionne sans accès à Internet)
+FICHIER_IMAGE_TERRAIN = "Volleyball_Half_Court.png"
 
 VEEC_ZONES_COORDS = {
     1: {"x": 75, "y": 45, "name": "P1 (Arrière Droit)"}, 6: {"x": 50, "y": 45, "name": "P6 (Arrière Centre)"},
@@ -23,136 +49,158 @@ VEEC_ZONES_COORDS = {
     3: {"x": 50, "y": 78, "name": "P3 (Avant Centre)"}, 4: {"x": 25, "y": 78, "name": "P4 (Avant Gauche)"},
 }
 
-LISTE_JOUEURS_PREDEFINIE = [
-    {"numero": 1, "nom": "Bryan R4"}, {"numero": 2, "nom": "Antoine Passeur"},
-    {"numero": 3, "nom": "Andréa R4"}, {"numero": 4, "nom": "Gianni Central"},
-    {"numero": 5, "nom": "Thibault R4"}, {"numero": 6, "nom": "Clément Pointu"},
-    {"numero": 7, "nom": "Valérian Libéro"}, {"numero": 10, "nom": "Tim Central"}, 
-    {"numero": 12, "nom": "Guillaume Pointu"}, {"numero": 14, "nom": "Romain Libéro"},
-    {"numero": 15, "nom": "Dorian Central"}, {"numero": 16, "nom": "Noah Passeur"},
-]
-
 VEEC_COLOR = "#007bff"
 ADVERSE_COLOR = "#dc3545"
 
-ACTION_CATEGORIES = [
-    ("SERVICE", "SVC", [
-        ("🎯 Ace (P)", "ACE", '#28a745'),      
-        ("🔄 Service OK (0)", "OK", '#ffc107'),  
-        ("💥 Erreur (Adv P)", "ERR", '#dc3545') 
-    ]),
-    ("RÉCEPTION", "REC", [
-        ("✅ Parfaite (+)", "PERF", '#28a745'), 
-        ("👐 Moyenne (0)", "OK", '#ffc107'),   
-        ("💔 Manquée (Adv P)", "ERR", '#dc3545') 
-    ]),
-    ("PASSE", "PAS", [
-        ("⭐ Parfaite (+)", "PERF", '#17a2b8'), 
-        ("👐 Moyenne (0)", "OK", '#ffc107'),   
-        ("❌ Mauvaise Passe (Adv P)", "ERR", '#dc3545') 
-    ]),
-    ("ATTAQUE", "ATK", [
-        ("💥 Point (P)", "POINT", '#28a745'),  
-        ("👐 Contre (0)", "CONTRE", '#ffc107'), 
-        ("❌ Faute (Adv P)", "ERR", '#dc3545')  
-    ]),
-    ("BLOC", "BLK", [
-        ("🛡️ Point (P)", "POINT", '#28a745'),   
-        ("🚫 Touché (0)", "TOUCH", '#17a2b8'),   
-        ("⛔ Faute (Adv P)", "ERR", '#dc3545')    
-    ]),
-    ("DEFÉNSE", "DEF", [
-        ("✅ Parfaite (+)", "PERF", '#28a745'),   
-        ("👐 Moyenne (0)", "OK", '#17a2b8'),   
-        ("❌ Manquée (Adv P)", "ERR", '#dc3545') 
-    ]),
-]
-
-# RÈGLES DU VOLLEY-BALL
-POINTS_POUR_GAGNER = 25
-POINTS_POUR_GAGNER_SET_DECISIF = 15 # Non implémenté ici pour la simplification, on utilise 25
-MAX_SETS = 5 # Match au meilleur des 5 sets (3 sets gagnants)
+# ÉTAT CÔTÉ SERVEUR
+# Si activé, le dcc.Store 'match-state' ne transporte que l'identifiant du match, la version du match affichée
+# par l'onglet et la sélection en cours : score, sets et historique restent sur le serveur (reconstruits depuis SQLite au besoin).
+SERVER_SIDE_STATE = os.environ.get('VEEC_SERVER_SIDE_STATE', '1') != '0'
+MAX_MATCHS_EN_MEMOIRE = 32 # Au-delà, les matchs les moins récemment utilisés sont relus depuis la table 'actions'
+
+# MODE CLIENTSIDE
+# Si activé, la sélection terrain -> joueur -> action et les règles de score/set s'exécutent dans le navigateur
+# (assets/veec_workflow.js) ; seule l'action validée est envoyée au serveur pour être enregistrée.
+# Ce mode s'appuie sur l'état côté serveur pour l'historique.
+CLIENTSIDE_MODE = SERVER_SIDE_STATE and os.environ.get('VEEC_CLIENTSIDE_MODE', '0') == '1'
+
+# SERVEUR
+DEBUG = os.environ.get('VEEC_DEBUG', '0') == '1'
+PORT = int(os.environ.get('VEEC_PORT', '8051'))
+
+# MESURES DE PERFORMANCE (metrics.py, exposées sur /metrics)
+# Le panneau de débogage affiche en bas de page les durées récentes des callbacks de ce worker.
+METRICS_OVERLAY = metrics.ENABLED and os.environ.get('VEEC_METRICS_OVERLAY', '0') == '1'
 
 # --- UTILITIES ---
+# La base est initialisée par create_app() (fin du fichier), pas à l'import du module.
 
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # Création de la table 'actions'
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS actions (
-            id INTEGER PRIMARY KEY,
-            match_id TEXT NOT NULL,
-            set_num INTEGER NOT NULL,
-            timestamp TEXT NOT NULL,
-            score_at_action TEXT NOT NULL,
-            position TEXT NOT NULL,
-            joueur_nom TEXT NOT NULL,
-            action_code TEXT NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-# Appeler cette fonction une fois au début de l'exécution
-init_db()
-
-def insert_stat(match_id, set_num, timestamp, score_at_action, position, joueur_nom, action_code):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        INSERT INTO actions (match_id, set_num, timestamp, score_at_action, position, joueur_nom, action_code) 
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (match_id, set_num, timestamp, score_at_action, position, joueur_nom, action_code))
-    
-    conn.commit()
-    conn.close()
+# Colonnes et nombre de lignes affichées dans la table d'historique
+HISTORIQUE_COLUMNS = ['timestamp', 'set', 'score', 'pos', 'joueur', 'action']
+HISTORIQUE_MAX_ROWS = 50
+
+def historique_table_data(engine):
+    return historique_entries(engine, HISTORIQUE_MAX_ROWS)
 
-# --- FONCTION D'AIDE SQLite ---
+def create_historique_table(engine):
+    # La table est créée une seule fois ; ses lignes sont ensuite mises à jour par Patch (voir patch_historique_table)
+    return dash_table.DataTable(
+        id='historique-table',
+        columns=[{"name": c.capitalize(), "id": c} for c in HISTORIQUE_COLUMNS],
+        data=historique_table_data(engine),
+        style_table={'overflowX': 'auto'},
+        style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'},
+        style_cell={'textAlign': 'left'}
+    )
 
-def delete_last_stat_and_get_data(match_id):
+def patch_historique_table(engine, added=0, removed=0):
     """
-    Supprime la dernière ligne enregistrée pour le match_id donné et retourne
-    l'action code et le set de l'entrée supprimée pour la correction du score Dash.
+    Met à jour la table d'historique sans la re-sérialiser : retire les `removed` lignes de tête,
+    ajoute les `added` nouvelles entrées en tête, puis fait glisser la fenêtre des HISTORIQUE_MAX_ROWS lignes.
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    # 1. Sélectionner la dernière ligne (ID le plus élevé) pour le match en cours
-    cursor.execute("""
-        SELECT id, action_code, set_num, score_at_action
-        FROM actions 
-        WHERE match_id = ? 
-        ORDER BY id DESC 
-        LIMIT 1
-    """, (match_id,))
-    last_row = cursor.fetchone()
-
-    if last_row:
-        last_id, action_code, set_num, score_at_action = last_row
-        
-        # 2. Supprimer la ligne
-        cursor.execute("DELETE FROM actions WHERE id = ?", (last_id,))
-        conn.commit()
-        conn.close()
-        
-        # 3. Retourner les données importantes pour la correction du score
-        return {'action': action_code, 'set': set_num, 'score_avant_action': score_at_action}
-    
-    conn.close()
-    return None
+    patch = Patch()
+    length = historique_length(engine)
+    displayed = min(length - added + removed, HISTORIQUE_MAX_ROWS) + added - removed
+    target = min(length, HISTORIQUE_MAX_ROWS)
+
+    for _ in range(removed):
+        del patch[0]
+    for entry in reversed(historique_entries(engine, added)):
+        patch.prepend(entry)
+
+    for _ in range(displayed - target):
+        del patch[target] # La ligne la plus ancienne sort de la fenêtre
+    for entry in historique_entries(engine, target, start=displayed):
+        patch.append(entry) # Une ligne plus ancienne revient dans la fenêtre (annulation)
+    return patch
+
+# Historique complet : pagination, tri et filtrage délégués à SQLite
+HISTORIQUE_PAGE_SIZE = 25
+FILTER_OPERATORS = {
+    'eq': '=', '=': '=', 'ne': '!=', '!=': '!=', 'lt': '<', '<': '<', 'le': '<=', '<=': '<=',
+    'gt': '>', '>': '>', 'ge': '>=', '>=': '>=', 'contains': 'contains', 'datestartswith': 'datestartswith',
+}
+FILTER_PART_REGEX = re.compile(r"^\{(?P<col>[^}]+)\}\s+(?P<op>\S+)\s+(?P<val>.+)$")
+
+def parse_filter_query(filter_query):
+    """Traduit le filter_query d'une DataTable ('{joueur} contains Bryan && {set} = 2') en liste de (colonne, opérateur, valeur)."""
+    filters = []
+    for part in (filter_query or '').split(' && '):
+        match = FILTER_PART_REGEX.match(part.strip())
+        if not match:
+            continue
+        column, operator, value = match.group('col'), match.group('op'), match.group('val').strip()
+        # Préfixes de sensibilité à la casse ('scontains', 'i=') : LIKE est déjà insensible à la casse
+        if operator not in FILTER_OPERATORS and operator[:1] in ('s', 'i'):
+            operator = operator[1:]
+        if column not in HISTORIQUE_SQL_COLUMNS or operator not in FILTER_OPERATORS:
+            continue
+        if value[:1] == value[-1:] and value[:1] in ('"', "'", '`'):
+            value = value[1:-1]
+        filters.append((column, FILTER_OPERATORS[operator], value))
+    return filters
+
+def create_historique_complet_table():
+    return dash_table.DataTable(
+        id='historique-complet-table',
+        columns=[{"name": c.capitalize(), "id": c, "type": 'numeric' if c == 'set' else 'text'} for c in HISTORIQUE_COLUMNS],
+        data=[],
+        page_current=0,
+        page_size=HISTORIQUE_PAGE_SIZE,
+        page_action='custom',
+        sort_action='custom',
+        sort_mode='multi',
+        sort_by=[],
+        filter_action='custom',
+        filter_query='',
+        style_table={'overflowX': 'auto'},
+        style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'},
+        style_cell={'textAlign': 'left'}
+    )
 
-def create_historique_table(historique_stats):
-    if not historique_stats:
-        return html.Div("Aucune stat enregistrée.", style={'padding': '10px', 'color': '#666'})
-    df = pd.DataFrame(historique_stats)
-    # Mise à jour des colonnes pour inclure 'set' et 'score'
-    cols = ['timestamp', 'set', 'score', 'pos', 'joueur', 'action'] 
-    df = df[[c for c in cols if c in df.columns]]
+# Statistiques en direct : lues dans les tables d'agrégats (quelques dizaines de lignes par match)
+STATS_COLUMNS = ['joueur', 'actions', 'positifs', 'erreurs', 'efficacite']
+
+def player_stats_rows(aggregates):
+    """Une ligne par joueur : volume, gestes positifs, erreurs, efficacité et détail +/-/total par catégorie."""
+    players = {}
+    for agg in aggregates:
+        info = ACTIONS_BY_CATEGORY_RESULT.get((agg['action_category'], agg['action_result']))
+        quality = info.quality if info else 'neutre'
+        row = players.setdefault(agg['joueur_nom'], {'joueur': agg['joueur_nom'], 'actions': 0, 'positifs': 0, 'erreurs': 0,
+                                                     **{code: [0, 0, 0] for code in CATEGORIES}})
+        row['actions'] += agg['count']
+        counts = row.get(agg['action_category'], [0, 0, 0]) # Catégorie retirée du référentiel : comptée dans le total seulement
+        counts[2] += agg['count']
+        if quality == 'positif':
+            row['positifs'] += agg['count']
+            counts[0] += agg['count']
+        elif quality == 'erreur':
+            row['erreurs'] += agg['count']
+            counts[1] += agg['count']
+
+    rows = []
+    for row in players.values():
+        row['efficacite'] = round(100 * (row['positifs'] - row['erreurs']) / row['actions']) if row['actions'] else 0
+        for code in CATEGORIES:
+            positifs, erreurs, total = row[code]
+            row[code] = f"{positifs}/{erreurs}/{total}" if total else ""
+        rows.append(row)
+    return sorted(rows, key=lambda r: r['actions'], reverse=True)
+
+def create_stats_table():
+    columns = [
+        {"name": "Joueur", "id": 'joueur'},
+        {"name": "Actions", "id": 'actions', "type": 'numeric'},
+        {"name": "Positifs", "id": 'positifs', "type": 'numeric'},
+        {"name": "Erreurs", "id": 'erreurs', "type": 'numeric'},
+        {"name": "Efficacité (%)", "id": 'efficacite', "type": 'numeric'},
+    ] + [{"name": f"{title} (+/-/total)", "id": code} for code, title in CATEGORIES.items()]
     return dash_table.DataTable(
-        columns=[{"name": i.capitalize(), "id": i} for i in df.columns],
-        data=df.head(50).to_dict('records'),
+        id='stats-table',
+        columns=columns,
+        data=[],
+        sort_action='native',
         style_table={'overflowX': 'auto'},
         style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'},
         style_cell={'textAlign': 'left'}
@@ -162,7 +210,7 @@ def create_simple_court_figure():
     """Crée le terrain avec 6 zones cliquables statiques."""
     fig = go.Figure()
     fig.add_layout_image(
-        dict(source=URL_IMAGE_TERRAIN, xref="x", yref="y", x=0, y=100, sizex=100, sizey=100,
+        dict(source=versioned_asset_url(FICHIER_IMAGE_TERRAIN), xref="x", yref="y", x=0, y=100, sizex=100, sizey=100,
              sizing="stretch", opacity=1.0, layer="below"))
 
     x_coords = [VEEC_ZONES_COORDS[p]["x"] for p in VEEC_ZONES_COORDS]
@@ -172,7 +220,7 @@ def create_simple_court_figure():
 
     fig.add_trace(go.Scatter(
         x=x_coords, y=y_coords, mode="markers+text",
-        marker=dict(size=60, color=VEEC_COLOR, opacity=0.7, line=dict(width=2, color="white")),
+        marker=dict(size=ZONE_MARKER_SIZE, color=VEEC_COLOR, opacity=0.7, line=dict(width=2, color="white")),
         text=text_labels, textfont=dict(color="white", size=20),
         customdata=custom_data, hoverinfo='text',
         hovertext=[VEEC_ZONES_COORDS[p]["name"] for p in VEEC_ZONES_COORDS]
@@ -186,166 +234,882 @@ def create_simple_court_figure():
     )
     return fig
 
-# --- LOGIQUE DU JEU VOLLEY-BALL ---
-def check_set_and_match_end(new_state):
-    """Vérifie la fin du set (25 points, +2 écart) et la fin du match."""
-    score_veec = new_state['score_veec']
-    score_adverse = new_state['score_adverse']
-    
-    # Définir le score minimum requis
-    # NOTE: Simplifié pour utiliser 25 points pour tous les sets.
-    # En réalité, le 5e set est à 15 points.
-    target_score = POINTS_POUR_GAGNER
-
-    set_ended = False
-    set_winner = None
-
-    # 1. Vérification de la fin de set
-    if score_veec >= target_score and (score_veec - score_adverse) >= 2:
-        set_ended = True
-        set_winner = 'VEEC'
-    elif score_adverse >= target_score and (score_adverse - score_veec) >= 2:
-        set_ended = True
-        set_winner = 'ADVERSE'
-
-    if set_ended:
-        # 2. Mise à jour des sets gagnés
-        if set_winner == 'VEEC':
-            new_state['sets_veec'] += 1
-        else:
-            new_state['sets_adverse'] += 1
-            
-        # 3. Vérification de la fin de match (3 sets gagnants)
-        if new_state['sets_veec'] >= 3 or new_state['sets_adverse'] >= 3:
-            # Le match est terminé
-            # On pourrait ajouter une variable 'match_over' pour bloquer l'interface
-            log_entry = {
-                'timestamp': datetime.now().strftime("%H:%M:%S"),
-                'set': new_state['current_set'],
-                'score': f"{score_veec}-{score_adverse}",
-                'pos': 'FIN',
-                'joueur': set_winner,
-                'action': 'FIN_MATCH'
-            }
-            new_state['historique_stats'].insert(0, log_entry)
-            
-            # Optionnel: Réinitialiser les scores, mais garder les sets finaux
-            # new_state['score_veec'] = 0
-            # new_state['score_adverse'] = 0
-            # new_state['current_set'] = MAX_SETS # ou une valeur spéciale
+# --- ANALYSE DE SAISON (page /analyse) ---
+# Requêtes sur tous les matchs de la base, via le cache en colonnes d'analytics.py (rafraîchi à l'ouverture de la page)
 
-        else:
-            # Le set est terminé, passage au set suivant
-            new_state['current_set'] += 1
-            new_state['score_veec'] = 0
-            new_state['score_adverse'] = 0
-            
-            # Enregistrement d'une ligne de fin de set pour le log
-            log_entry = {
-                'timestamp': datetime.now().strftime("%H:%M:%S"),
-                'set': new_state['current_set'] - 1, # Set qui vient de se terminer
-                'score': f"{score_veec}-{score_adverse}",
-                'pos': 'FIN',
-                'joueur': set_winner,
-                'action': 'FIN_SET'
-            }
-            new_state['historique_stats'].insert(0, log_entry)
+ANALYSE_PATH = '/analyse'
+
+def create_analyse_page():
+    control_style = {'width': '200px', 'marginRight': '15px'}
+    return html.Div([
+        html.Div([
+            html.H2("Analyse de saison", style={'margin': 0}),
+            dcc.Link("← Retour à la saisie", href='/'),
+        ], style={'display': 'flex', 'justifyContent': 'space-between', 'alignItems': 'center', 'padding': '20px', 'borderBottom': '1px solid #ccc'}),
 
-    return new_state
+        html.Div([
+            dcc.Dropdown(id='analyse-group-by', options=[{'label': label, 'value': value} for value, label in analytics.GROUP_BY_COLUMNS.items()],
+                         value=['joueur'], multi=True, clearable=False, style={'width': '300px', 'marginRight': '15px'}),
+            dcc.Dropdown(id='analyse-player-filter', options=player_options(p for team in roster.teams() for p in team.players),
+                         placeholder="Tous les joueurs", style=control_style),
+            dcc.Dropdown(id='analyse-category-filter', options=[{'label': title, 'value': code} for code, title in CATEGORIES.items()],
+                         placeholder="Toutes les actions", style=control_style),
+            dcc.Dropdown(id='analyse-position-filter', options=[{'label': f"P{p}", 'value': f"P{p}"} for p in ZONE_ORDER],
+                         placeholder="Toutes les positions", style=control_style),
+            html.Label(["Derniers matchs : ", dcc.Input(id='analyse-last-matches', type='number', min=1, step=1, placeholder="tous", style={'width': '70px'})],
+                       style={'marginRight': '15px'}),
+            html.Label(["Fenêtre glissante : ", dcc.Input(id='analyse-window', type='number', min=1, step=1, value=5, style={'width': '60px'})],
+                       style={'marginRight': '15px'}),
+            html.Button("🔄 Actualiser", id='btn-analyse-refresh', n_clicks=0),
+        ], style={'display': 'flex', 'alignItems': 'center', 'flexWrap': 'wrap', 'padding': '20px'}),
+
+        html.Div(id='analyse-status', style={'padding': '0 20px', 'color': '#6c757d'}),
+        dcc.Graph(id='analyse-rolling-graph', config={'displayModeBar': False}),
+        html.Div(dash_table.DataTable(
+            id='analyse-table', columns=[], data=[], sort_action='native', page_size=50,
+            style_table={'overflowX': 'auto'},
+            style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'},
+            style_cell={'textAlign': 'left'}
+        ), style={'padding': '20px'})
+    ], id='page-analyse', style={'display': 'none'})
+
+def create_rolling_figure(per_match, window):
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=per_match['match'].astype(str), y=per_match['efficacite'], name="Efficacité du match (%)",
+                         marker_color=VEEC_COLOR, opacity=0.5))
+    fig.add_trace(go.Scatter(x=per_match['match'].astype(str), y=per_match['efficacite_glissante'], mode='lines+markers',
+                             name=f"Moyenne sur {window} matchs (%)", line=dict(color=ADVERSE_COLOR, width=3)))
+    fig.update_layout(margin=dict(l=40, r=20, t=30, b=80), legend=dict(orientation='h'), xaxis=dict(type='category'),
+                      plot_bgcolor='white', height=350)
+    return fig
 
+# --- ÉQUIPES ET EFFECTIFS (page /effectifs) ---
+# Les joueurs sont lus dans le cache en mémoire de roster.py (jamais une requête SQLite par clic) ;
+# chaque match est rattaché à une équipe, choisie dans la barre de contrôle de la saisie.
 
-# --- INITIALISATION ---
+ROSTER_PATH = '/effectifs'
 
-initial_state = {
-    'match_id': f"Match_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-    'score_veec': 0, 'score_adverse': 0,
-    'sets_veec': 0, 'sets_adverse': 0,
-    'current_set': 1,
-    'historique_stats': [],
-    'temp_selected_pos': None, 
-    'temp_selected_player': None, 
-    'click_count': 0 
-}
+def player_options(players):
+    """Options d'un filtre par joueur (valeur : nom, comme joueur_nom dans les actions et les agrégats)."""
+    options = {}
+    for p in players:
+        options.setdefault(p.nom, {'label': f"N°{p.numero} - {p.nom}", 'value': p.nom})
+    return list(options.values())
 
-# --- LAYOUT ---
+def team_options():
+    return [{'label': team.nom, 'value': team.id} for team in roster.teams()]
 
-app = dash.Dash(__name__, suppress_callback_exceptions=True)
+def roster_store_data(team):
+    """Numéro -> nom, pour les titres des modales calculés dans le navigateur."""
+    return {p.numero: p.nom for p in team.players}
 
-app.layout = html.Div([
-    dcc.Store(id='match-state', data=initial_state),
-    dcc.Store(id='click-reset-trigger', data=0), 
-    
-    html.Div([
-        html.Div("VEEC", style={'fontSize': '2em', 'fontWeight': 'bold', 'color': VEEC_COLOR}),
+def roster_table_data(team):
+    return [{'id': p.id, 'numero': p.numero, 'nom': p.nom} for p in team.players]
+
+def create_roster_page():
+    """Édition des effectifs : un joueur retiré du tableau est désactivé (ses actions passées restent attachées à lui)."""
+    return html.Div([
         html.Div([
-            # Affichage du score par set
-            html.Span(f"Sets: {initial_state['sets_veec']}", id='sets-veec-display', style={'fontSize': '1.5em', 'marginRight': '10px', 'color': VEEC_COLOR}),
-            
-            html.Span(id='score-veec-display', children=str(initial_state['score_veec']), style={'fontSize': '3em', 'marginRight': '20px'}),
-            html.Span("-", style={'fontSize': '3em'}),
-            html.Span(id='score-adverse-display', children=str(initial_state['score_adverse']), style={'fontSize': '3em', 'marginLeft': '20px'}),
+            html.H2("Équipes et effectifs", style={'margin': 0}),
+            dcc.Link("← Retour à la saisie", href='/'),
+        ], style={'display': 'flex', 'justifyContent': 'space-between', 'alignItems': 'center', 'padding': '20px', 'borderBottom': '1px solid #ccc'}),
+
+        html.Div([
+            dcc.Dropdown(id='roster-edit-team', options=team_options(), value=DEFAULT_TEAM_ID, clearable=False,
+                         style={'width': '250px', 'marginRight': '15px'}),
+            dcc.Input(id='roster-new-team', type='text', placeholder="Nom de la nouvelle équipe", style={'marginRight': '10px'}),
+            html.Button("➕ Créer l'équipe", id='btn-roster-create-team', n_clicks=0),
+        ], style={'display': 'flex', 'alignItems': 'center', 'flexWrap': 'wrap', 'padding': '20px'}),
+
+        html.Div([
+            dash_table.DataTable(
+                id='roster-edit-table',
+                columns=[{'name': "Numéro", 'id': 'numero', 'type': 'numeric'}, {'name': "Nom", 'id': 'nom'}],
+                data=roster_table_data(roster.team(DEFAULT_TEAM_ID)),
+                editable=True, row_deletable=True,
+                style_table={'maxWidth': '500px'},
+                style_header={'backgroundColor': '#f8f9fa', 'fontWeight': 'bold'},
+                style_cell={'textAlign': 'left'}
+            ),
+            html.Div([
+                html.Button("➕ Ajouter un joueur", id='btn-roster-add-player', n_clicks=0, style={'marginRight': '10px'}),
+                html.Button("💾 Enregistrer l'effectif", id='btn-roster-save', n_clicks=0,
+                            style={'backgroundColor': '#28a745', 'color': 'white', 'border': 'none', 'borderRadius': '5px', 'padding': '5px 15px'}),
+            ], style={'marginTop': '15px'}),
+            html.Div(id='roster-edit-status', style={'marginTop': '10px', 'color': '#6c757d'}),
+        ], style={'padding': '0 20px'}),
+    ], id='page-effectifs', style={'display': 'none'})
+
+# --- EXPORT (CSV / JSON Lines / XLSX) ---
+# Le lien pointe vers la route Flask /export/<format> : le fichier est produit en flux par export.py,
+# sans passer par un callback Dash ni charger la saison en mémoire.
+
+EXPORT_PATH = '/export'
+IMPORT_PATH = '/import' # Page d'import de matchs passés (servie par Flask, voir importer.py)
+
+def create_export_panel():
+    return html.Details([
+        html.Summary("Export des données", style={'cursor': 'pointer', 'fontWeight': 'bold'}),
+        html.Div([
+            dcc.RadioItems(id='export-scope', options=[
+                {'label': "Match en cours", 'value': 'match'},
+                {'label': "Un set du match", 'value': 'set'},
+                {'label': "Saison (période)", 'value': 'saison'},
+            ], value='match', inline=True, style={'marginRight': '20px'}),
+            dcc.Dropdown(id='export-set', options=[{'label': f"Set {n}", 'value': n} for n in range(1, MAX_SETS + 1)],
+                         value=1, clearable=False, style={'width': '120px', 'marginRight': '20px'}),
+            dcc.DatePickerRange(id='export-dates', display_format='DD/MM/YYYY', clearable=True,
+                                start_date_placeholder_text="Début", end_date_placeholder_text="Fin", style={'marginRight': '20px'}),
+            dcc.RadioItems(id='export-format', options=[{'label': fmt.upper(), 'value': fmt} for fmt in EXPORT_FORMATS],
+                           value='csv', inline=True, style={'marginRight': '20px'}),
+            html.A("📥 Télécharger", id='export-link', href='', download='', n_clicks=0,
+                   style={'padding': '5px 15px', 'backgroundColor': '#28a745', 'color': 'white', 'borderRadius': '5px', 'textDecoration': 'none'}),
+        ], style={'display': 'flex', 'alignItems': 'center', 'flexWrap': 'wrap', 'margin': '10px 0'}),
+        html.Div(id='export-status-output', style={'color': '#6c757d', 'fontSize': '0.9em'})
+    ], id='export-panel', open=False, style={'padding': '20px'})
+
+def export_query(scope, match_id, set_num, start_date, end_date):
+    """Paramètres de /export/<format> selon la portée choisie (dates du DatePickerRange au format AAAA-MM-JJ)."""
+    if scope == 'saison':
+        return {key: value for key, value in (('from', start_date), ('to', end_date)) if value}
+    if scope == 'set':
+        return {'match_id': match_id, 'set': set_num}
+    return {'match_id': match_id}
+
+def parse_export_date(value):
+    """'AAAA-MM-JJ' (ou datetime ISO du DatePickerRange) -> 'AAAAMMJJ', comme la date des identifiants de match."""
+    if not value:
+        return None
+    return datetime.strptime(value[:10], '%Y-%m-%d').strftime('%Y%m%d')
+
+# --- CARTE DE CHALEUR DES ZONES ---
+# Les marqueurs du terrain sont recolorés par un Patch (couleur, taille, survol) : la figure et son image
+# de fond ne sont jamais renvoyées. Les taux par zone sont calculés à partir de la table stats_position.
+
+ZONE_ORDER = list(VEEC_ZONES_COORDS) # Ordre des points de la trace des zones
+ZONE_INDEX = {f"P{p}": i for i, p in enumerate(ZONE_ORDER)}
+ZONE_MARKER_SIZE = 60
+ZONE_EMPTY_COLOR = '#6c757d'
+HEATMAP_MODES = {'zones': "Zones", 'reussite': "Taux de réussite", 'erreurs': "Taux d'erreur"}
+
+def zone_rates(aggregates):
+    """Volume, gestes positifs et erreurs par zone (vecteurs dans l'ordre de ZONE_ORDER)."""
+    totals = np.zeros(len(ZONE_ORDER))
+    positifs = np.zeros(len(ZONE_ORDER))
+    erreurs = np.zeros(len(ZONE_ORDER))
+    for agg in aggregates:
+        index = ZONE_INDEX.get(agg['position'])
+        info = ACTIONS_BY_CATEGORY_RESULT.get((agg['action_category'], agg['action_result']))
+        if index is None:
+            continue
+        totals[index] += agg['count']
+        if info and info.quality == 'positif':
+            positifs[index] += agg['count']
+        elif info and info.quality == 'erreur':
+            erreurs[index] += agg['count']
+    return totals, positifs, erreurs
+
+def rate_colors(rates, has_data, invert=False):
+    """Dégradé rouge -> vert (vert -> rouge si invert) ; gris pour les zones sans action."""
+    t = 1 - rates if invert else rates
+    red = np.rint(220 * (1 - t) + 40 * t).astype(int)
+    green = np.rint(53 * (1 - t) + 167 * t).astype(int)
+    return [f"rgb({r},{g},69)" if ok else ZONE_EMPTY_COLOR for r, g, ok in zip(red, green, has_data)]
+
+def patch_court_heatmap(mode, aggregates):
+    """Patch de la trace des zones : couleur, taille et texte de survol selon le mode de la carte de chaleur."""
+    patch = Patch()
+    names = [VEEC_ZONES_COORDS[p]["name"] for p in ZONE_ORDER]
+    if mode not in ('reussite', 'erreurs'):
+        patch['data'][0]['marker']['color'] = VEEC_COLOR
+        patch['data'][0]['marker']['size'] = ZONE_MARKER_SIZE
+        patch['data'][0]['hovertext'] = names
+        return patch
+
+    totals, positifs, erreurs = zone_rates(aggregates)
+    has_data = totals > 0
+    counts = positifs if mode == 'reussite' else erreurs
+    rates = np.divide(counts, totals, out=np.zeros_like(totals), where=has_data)
+    # Taille proportionnelle au volume de la zone (entre 2/3 et 4/3 de la taille normale)
+    share = totals / totals.max() if has_data.any() else totals
+    sizes = np.rint(ZONE_MARKER_SIZE * (2 / 3 + 2 / 3 * share)).astype(int)
+
+    label = "positifs" if mode == 'reussite' else "erreurs"
+    patch['data'][0]['marker']['color'] = rate_colors(rates, has_data, invert=(mode == 'erreurs'))
+    patch['data'][0]['marker']['size'] = sizes.tolist()
+    patch['data'][0]['hovertext'] = [
+        f"{name} : {int(c)}/{int(t)} {label} ({round(100 * r)} %)" if t else f"{name} : aucune action"
+        for name, c, t, r in zip(names, counts, totals, rates)
+    ]
+    return patch
+
+def create_heatmap_controls(team):
+    return html.Div([
+        dcc.RadioItems(
+            id='heatmap-mode',
+            options=[{'label': label, 'value': value} for value, label in HEATMAP_MODES.items()],
+            value='zones', inline=True, inputStyle={'marginRight': '5px', 'marginLeft': '15px'}
+        ),
+        dcc.Dropdown(
+            id='heatmap-player-filter',
+            options=player_options(team.players),
+            placeholder="Tous les joueurs", style={'width': '220px', 'marginLeft': '15px'}
+        ),
+        dcc.Dropdown(
+            id='heatmap-category-filter',
+            options=[{'label': title, 'value': code} for code, title in CATEGORIES.items()],
+            placeholder="Toutes les actions", style={'width': '200px', 'marginLeft': '15px'}
+        ),
+    ], style={'display': 'flex', 'justifyContent': 'center', 'alignItems': 'center', 'flexWrap': 'wrap'})
+
+# --- MODALES DE SAISIE (construites une seule fois, affichées/masquées par leur style) ---
+
+PLAYER_MODAL_STYLE = {'position': 'fixed', 'top': 0, 'left': 0, 'width': '100%', 'height': '100%', 'backgroundColor': 'rgba(0,0,0,0.6)', 'display': 'flex', 'justifyContent': 'center', 'alignItems': 'center', 'zIndex': 2000}
+ACTION_MODAL_STYLE = {
+    'position': 'fixed', 'top': 0, 'left': 0, 'width': '100%', 'height': '100%',
+    'backgroundColor': 'rgba(0,0,0,0.7)', 'display': 'flex', 'justifyContent': 'center', 
+    'alignItems': 'center', 'zIndex': 2000 
+}
+PLAYER_MODAL_HIDDEN = {**PLAYER_MODAL_STYLE, 'display': 'none'}
+ACTION_MODAL_HIDDEN = {**ACTION_MODAL_STYLE, 'display': 'none'}
+
+def modal_display(visible):
+    """Patch du style d'une modale : seule la propriété 'display' transite."""
+    patch = Patch()
+    patch['display'] = 'flex' if visible else 'none'
+    return patch
+
+def player_buttons(team):
+    """Boutons de la modale joueur : un par joueur actif de l'équipe, identifié par son numéro."""
+    return [
+        html.Button(
+            f"N°{p.numero} - {p.nom}",
+            id={'type': 'select-player-btn', 'index': p.numero},
+            n_clicks=0,
+            style={'margin': '5px', 'padding': '10px 15px', 'fontSize': '1.0em', 'borderRadius': '5px', 'border': f'1px solid {VEEC_COLOR}', 'backgroundColor': '#fff', 'cursor': 'pointer'}
+        )
+        for p in team.players
+    ]
+
+def create_player_modal(team):
+    """Modale de sélection du joueur ; le titre (position) change via un callback clientside, les boutons avec l'équipe du match."""
+    return html.Div([
+        html.Div([
+            html.H3(id='player-modal-title', style={'textAlign': 'center', 'marginBottom': '20px'}),
+            html.Div(player_buttons(team), id='player-buttons', style={'display': 'flex', 'flexWrap': 'wrap', 'justifyContent': 'center', 'maxHeight': '60vh', 'overflowY': 'auto'}),
+            html.Button("Annuler", id={'type': 'modal-control', 'action': 'cancel', 'modal': 'player'}, n_clicks=0, style={'marginTop': '20px', 'width': '100%', 'padding': '10px', 'backgroundColor': '#ccc', 'color': 'black'})
+        ], style={'backgroundColor': 'white', 'padding': '30px', 'borderRadius': '15px', 'width': '90%', 'maxWidth': '600px', 'boxShadow': '0 5px 15px rgba(0,0,0,0.3)'})
+    ], id='player-modal', style=PLAYER_MODAL_HIDDEN)
+
+def create_action_modal():
+    """Modale de sélection de l'action ; seul le titre (joueur, position) change, via un callback clientside."""
+    # --- GENERATION DES BOUTONS EN COLONNES ---
+    cols = []
+    for title, code_base, buttons in ACTION_CATEGORIES:
+        button_elements = []
+        for label, code_result, bg_color in buttons:
+            action_value = f"{code_base}_{code_result}"
+            btn_id = {'type': 'select-action-btn', 'value': action_value}
+            button_elements.append(
+                html.Button(label, id=btn_id, n_clicks=0,
+                    style={'width': '100%', 'marginBottom': '8px', 'backgroundColor': bg_color, 'color': 'white', 
+                           'border': 'none', 'padding': '12px 0', 'borderRadius': '5px', 'fontSize': '1.1em', 
+                           'cursor': 'pointer', 'fontWeight': 'bold'}
+                ))
+        
+        cols.append(
+            html.Div([
+                html.H4(title, style={'textAlign': 'center', 'fontSize': '1.3em', 'marginBottom': '15px', 'color': '#333'}),
+                *button_elements
+            ], style={'width': '19%', 'display': 'inline-block', 'padding': '0 0.5%', 'verticalAlign': 'top', 'boxSizing': 'border-box'}))
+
+    content_style = {
+        'backgroundColor': 'white', 'padding': '30px', 'borderRadius': '15px', 'width': '95%', 
+        'maxWidth': '900px', 'boxShadow': '0 8px 16px rgba(0,0,0,0.4)', 'maxHeight': '90vh', 
+        'overflowY': 'auto', 'position': 'relative', 'zIndex': 1002 
+    }
+
+    modal_content_inner = html.Div(
+        children=[
+            html.Div([
+                html.H3(id='action-modal-title', style={'textAlign': 'center', 'color': '#333'}),
+                
+                html.Button("✕ Annuler", id={'type': 'modal-control', 'action': 'cancel', 'modal': 'action'}, n_clicks=0, 
+                    style={'position': 'absolute', 'top': '10px', 'right': '10px', 'backgroundColor': 'transparent', 
+                           'border': 'none', 'fontSize': '1.2em', 'cursor': 'pointer', 'color': '#333', 'padding': '10px'})
+            ], style={'position': 'relative', 'marginBottom': '20px'}),
             
-            # Affichage du score par set
-            html.Span(f"Sets: {initial_state['sets_adverse']}", id='sets-adverse-display', style={'fontSize': '1.5em', 'marginLeft': '10px', 'color': ADVERSE_COLOR}),
-        ], style={'display': 'flex', 'alignItems': 'center'}),
-        html.Div("ADVERSAIRE", style={'fontSize': '2em', 'fontWeight': 'bold', 'color': ADVERSE_COLOR}),
-    ], style={'display': 'flex', 'justifyContent': 'space-between', 'alignItems': 'center', 'padding': '20px', 'borderBottom': '1px solid #ccc', 'backgroundColor': 'white'}),
+            html.Div(cols, style={'display': 'flex', 'justifyContent': 'space-around', 'flexWrap': 'wrap'})
+        ], style=content_style
+    )
+    
+    return html.Div(children=modal_content_inner, id='action-modal', style=ACTION_MODAL_HIDDEN)
+
+# --- LOGIQUE DU JEU VOLLEY-BALL ---
+# Les règles (25 points, +2 écart, 3 sets gagnants) sont dans score_engine.py : l'état du match est
+# dérivé du journal des actions par ScoreEngine, l'historique affiché en est une projection : ses lignes
+# ne sont construites que pour la fenêtre affichée, jamais gardées dans l'état du match.
+
+def resolve_player(team_id, player_num):
+    """(nom, id) du joueur portant ce numéro dans l'équipe du match, lu dans le cache des effectifs ; (N°x, None) s'il est inconnu."""
+    player = roster.player(team_id, player_num)
+    return (player.nom, player.id) if player else (f"N°{player_num}", None)
+
+def historique_entry(event, derived):
+    return {
+        'timestamp': event.timestamp,
+        'set': derived.set_num, # Numéro du set de l'action
+        'score': f"{derived.score_veec}-{derived.score_adverse}", # Score au moment du clic (avant l'incrémentation)
+        'pos': event.pos,
+        'joueur': event.joueur,
+        'action': event.action
+    }
+
+def set_result_entry(set_result):
+    """Ligne de fin de set / fin de match de l'historique (jamais enregistrée dans la table 'actions')."""
+    return {
+        'timestamp': set_result.timestamp,
+        'set': set_result.set_num, # Set qui vient de se terminer
+        'score': f"{set_result.score_veec}-{set_result.score_adverse}",
+        'pos': 'FIN',
+        'joueur': set_result.winner,
+        'action': 'FIN_MATCH' if set_result.match_over else 'FIN_SET'
+    }
 
+def historique_entries(engine, stop, start=0):
+    """Lignes start à stop de l'historique (la plus récente en premier), lues dans le journal du moteur."""
+    entries = []
+    position = 0
+    index = len(engine) - 1
+    while index >= 0 and position < stop:
+        set_result = engine.set_results.get(index)
+        if set_result:
+            if position >= start:
+                entries.append(set_result_entry(set_result))
+            position += 1
+        if start <= position < stop:
+            entries.append(historique_entry(engine.event(index), engine.derived(index)))
+        position += 1
+        index -= 1
+    return entries
+
+def historique_length(engine):
+    """Nombre de lignes de l'historique : une par action, plus une par fin de set."""
+    return len(engine) + len(engine.set_results)
+
+def get_score_engine(state):
+    return state['_engine']
+
+def _sync_score(state, engine):
+    state['score_veec'], state['score_adverse'] = engine.score_veec, engine.score_adverse
+    state['sets_veec'], state['sets_adverse'] = engine.sets_veec, engine.sets_adverse
+    state['current_set'] = engine.current_set
+
+def apply_stat_to_state(new_state, pos, player_name, action_val, timestamp=None):
+    """
+    Applique une stat saisie à l'état du match (journal, score, fin de set/match).
+    Retourne l'entrée d'historique créée pour la stat et la fin de set qu'elle a provoquée (SetResult ou None).
+    """
+    engine = get_score_engine(new_state)
+    event = Event(timestamp or datetime.now().strftime("%H:%M:%S"), pos, player_name, action_val)
+    derived = engine.append(event)
+
+    _sync_score(new_state, engine)
+    return historique_entry(event, derived), derived.set_result
+
+def undo_last_stat(new_state):
+    """
+    Annule la dernière stat : le moteur rejoue le set concerné depuis son instantané, ce qui rouvre
+    correctement un set (ou un match) clos par cette stat. Retourne l'action annulée.
+    """
+    engine = get_score_engine(new_state)
+    event, _ = engine.pop()
+    _sync_score(new_state, engine)
+    return event
+
+
+# --- ÉTAT DU MATCH (CÔTÉ SERVEUR) ---
+
+# Clés de l'état qui transitent par le dcc.Store en mode serveur (taille constante)
+STORE_KEYS = ('match_id', 'team_id', 'table_version', 'temp_selected_pos', 'temp_selected_player', 'click_count')
+if CLIENTSIDE_MODE:
+    # Le navigateur calcule le score : il a besoin des compteurs (mais jamais de l'historique)
+    STORE_KEYS += ('score_veec', 'score_adverse', 'sets_veec', 'sets_adverse', 'current_set')
+
+_match_states = OrderedDict()
+_match_states_lock = threading.Lock()
+
+def new_match_state(match_id=None, team_id=DEFAULT_TEAM_ID):
+    return {
+        # Suffixe aléatoire : deux terrains qui démarrent dans la même seconde n'ont pas le même match
+        'match_id': match_id or f"Match_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}",
+        'team_id': team_id, # Équipe dont l'effectif est proposé à la saisie (table 'matches')
+        'db_version': 0, # Version du match dans la table 'matches' correspondant à cet état
+        # Version du match affichée par ce navigateur (score et historique) : une saisie ou une annulation faite
+        # depuis un affichage plus ancien est refusée et l'affichage rechargé (voir stale_display)
+        'table_version': 0,
+        'score_veec': 0, 'score_adverse': 0,
+        'sets_veec': 0, 'sets_adverse': 0,
+        'current_set': 1,
+        '_engine': ScoreEngine(), # Journal des actions : score dérivé et historique affiché (jamais dans le Store)
+        'temp_selected_pos': None,
+        'temp_selected_player': None,
+        'click_count': 0
+    }
+
+@metrics.timed(metrics.STATE_REBUILD_SECONDS)
+def rebuild_match_state(match_id):
+    """
+    Reconstruit score, sets et historique d'un match depuis la table 'actions' (ou son archive). Les sets terminés sont repris
+    de leurs fins de set enregistrées (table 'match_sets') : seules les actions du set en cours sont rejouées.
+    """
+    state = new_match_state(match_id)
+    # Version lue avant les lignes : une écriture concurrente rendra l'état périmé, jamais faussement à jour
+    state['db_version'] = fetch_match_version(match_id)
+    state['team_id'] = fetch_match_team(match_id)
+    rows = fetch_all_stats(match_id)
+    rows.reverse()
+    log = ActionLog()
+    for row in rows:
+        log.append(row['timestamp'], row['position'], row['joueur_nom'], row['action_code'],
+                   row['set_num'], row['score_veec'], row['score_adverse'])
+    index_by_id = {row['id']: index for index, row in enumerate(rows)}
+    engine = state['_engine'] = ScoreEngine.resume(
+        log,
+        # Fin de set dont l'action n'a pas été lue (écriture concurrente) : index -1, le match est rejoué
+        [(index_by_id.get(action_id, -1), set_result) for action_id, set_result in fetch_set_results(match_id)]
+    )
+    _sync_score(state, engine)
+    return state
+
+def _remember_match_state(state):
+    with _match_states_lock:
+        _match_states[state['match_id']] = state
+        _match_states.move_to_end(state['match_id'])
+        while len(_match_states) > MAX_MATCHS_EN_MEMOIRE:
+            _match_states.popitem(last=False)
+
+def load_match_state(store_data):
+    """
+    Retourne l'état complet du match à partir du contenu du dcc.Store.
+    En mode serveur, l'état est lu en mémoire (ou reconstruit depuis SQLite) et complété par la sélection en cours.
+    """
+    if not SERVER_SIDE_STATE:
+        with metrics.STATE_COPY_SECONDS.time():
+            return state_from_store(store_data)
+
+    match_id = store_data['match_id']
+    with _match_states_lock:
+        state = _match_states.get(match_id)
+    if state is None or state['db_version'] != fetch_match_version(match_id):
+        # Absent de la mémoire, ou un autre worker a écrit dans ce match depuis : relu depuis SQLite
+        state = rebuild_match_state(match_id)
+        _remember_match_state(state)
+
+    for key in ('temp_selected_pos', 'temp_selected_player', 'click_count'):
+        state[key] = store_data.get(key, state[key])
+    state['table_version'] = store_data.get('table_version') # Propre à chaque navigateur (None : inconnu, table renvoyée)
+    return state
+
+def assign_match_team(state, team_id):
+    """Rattache le match à une équipe (verrou du match tenu) ; écriture suivie comme une action (confirm_match_write)."""
+    up_to_date = not stale_display(state)
+    with transaction() as conn:
+        set_match_team(conn, state['match_id'], team_id)
+    state['team_id'] = team_id
+    if not confirm_match_write(state) and up_to_date:
+        state['table_version'] = state['db_version'] # Score et historique inchangés : l'affichage reste à jour
+
+def confirm_match_write(state):
+    """
+    À appeler après chaque écriture d'une action du match (verrou du match tenu). Si un autre worker a écrit
+    dans le même match entre-temps, la version ne suit plus : l'état est relu depuis SQLite.
+    Retourne True si l'état a été relu (l'historique affiché doit alors être renvoyé en entier).
+    """
+    state['db_version'] += 1
+    if not SERVER_SIDE_STATE or fetch_match_version(state['match_id']) == state['db_version']:
+        return False
+    fresh = rebuild_match_state(state['match_id'])
+    for key in ('temp_selected_pos', 'temp_selected_player', 'click_count', 'table_version'):
+        fresh[key] = state[key]
+    state.clear()
+    state.update(fresh)
+    return True
+
+def stale_display(state):
+    """True si le match a changé en base depuis l'affichage de ce navigateur (autre onglet, autre terrain, autre worker)."""
+    return state.get('table_version') != state['db_version']
+
+def score_display(state):
+    """Textes du score, des sets et du set en cours affichés sous le terrain."""
+    if state['sets_veec'] >= SETS_POUR_GAGNER or state['sets_adverse'] >= SETS_POUR_GAGNER:
+        current_set_out = "MATCH TERMINÉ !"
+    else:
+        current_set_out = f"Set en cours : {state['current_set']}"
+    return (str(state['score_veec']), str(state['score_adverse']),
+            f"Sets: {state['sets_veec']}", f"Sets: {state['sets_adverse']}", current_set_out)
+
+def reload_display(state):
+    """Recale un affichage périmé : sélection abandonnée, historique renvoyé en entier ; retourne (Store, table)."""
+    state['temp_selected_pos'] = None
+    state['temp_selected_player'] = None
+    state['table_version'] = state['db_version']
+    return save_match_state(state), historique_table_data(get_score_engine(state))
+
+# Mode sans état serveur : le journal voyage dans le Store en colonnes, avec les fins de set,
+# et le moteur est repris sans rejouer les sets terminés (ScoreEngine.resume).
+
+def store_from_state(state):
+    data = {key: value for key, value in state.items() if key != '_engine'}
+    engine = state['_engine']
+    data['journal'] = engine.log.to_columns()
+    data['fins_de_set'] = [[index, *set_result] for index, set_result in sorted(engine.set_results.items())]
+    return data
+
+def state_from_store(store_data):
+    if 'journal' not in store_data:
+        return rebuild_match_state(store_data['match_id']) # Store d'une version précédente de l'application
+    state = {key: value for key, value in store_data.items() if key not in ('journal', 'fins_de_set')}
+    state.setdefault('team_id', DEFAULT_TEAM_ID) # Store antérieur aux effectifs en base
+    state['_engine'] = ScoreEngine.resume(ActionLog.from_columns(store_data['journal']),
+                                          [(index, SetResult(*values)) for index, *values in store_data['fins_de_set']])
+    return state
+
+def forget_match_state(match_id):
+    """Retire un match de la mémoire : il sera reconstruit depuis SQLite au prochain accès."""
+    with _match_states_lock:
+        _match_states.pop(match_id, None)
+
+def save_match_state(state):
+    """Enregistre l'état du match et retourne les données à placer dans le dcc.Store."""
+    metrics.HISTORY_LENGTH.observe(historique_length(state['_engine']))
+    if not SERVER_SIDE_STATE:
+        return store_from_state(state)
+
+    _remember_match_state(state)
+    return {key: state[key] for key in STORE_KEYS}
+
+
+# --- DIFFUSION EN DIRECT (tableau de score /live/<match_id>) ---
+
+def live_payload(state):
+    """Message publié aux spectateurs : score, sets, set en cours et dernière action (jamais l'historique)."""
+    engine = state['_engine']
+    last = engine.event(len(engine) - 1) if len(engine) else None
+    info = ACTIONS_BY_CODE.get(last.action) if last else None
+    return {
+        'match_id': state['match_id'],
+        'score_veec': state['score_veec'], 'score_adverse': state['score_adverse'],
+        'sets_veec': state['sets_veec'], 'sets_adverse': state['sets_adverse'],
+        'current_set': state['current_set'],
+        'match_over': state['sets_veec'] >= SETS_POUR_GAGNER or state['sets_adverse'] >= SETS_POUR_GAGNER,
+        'last_action': last and {
+            'timestamp': last.timestamp, 'pos': last.pos, 'joueur': last.joueur,
+            'label': f"{info.category_title} {info.label}" if info else last.action,
+        },
+    }
+
+LIVE_POLL_SECONDS = 1.0
 
-    html.Div([
-        html.H4(f"Set en cours : {initial_state['current_set']}", id='current-set-display', style={'textAlign': 'center'}),
+_live_versions = {} # match_id -> version du dernier état publié par ce worker (matchs suivis seulement)
+_live_watcher = {'pid': None}
+_live_watcher_lock = threading.Lock()
+
+def publish_live(state):
+    if broker.subscriber_count(state['match_id']):
+        _live_versions[state['match_id']] = state.get('db_version')
+    broker.publish(state['match_id'], live_payload(state))
+
+def _watch_live_matches():
+    """
+    Avec plusieurs workers, une saisie n'est publiée que dans le worker qui l'a traitée. Ce thread relaie aux
+    spectateurs de ce worker les écritures faites ailleurs : une seule requête par seconde pour tous les matchs
+    suivis, quel que soit le nombre de spectateurs.
+    """
+    while True:
+        time.sleep(LIVE_POLL_SECONDS)
+        try:
+            match_ids = broker.subscribed_matches()
+            for match_id in _live_versions.keys() - set(match_ids): # Plus aucun spectateur : plus rien à relayer
+                _live_versions.pop(match_id, None)
+            for match_id, version in fetch_match_versions(match_ids).items():
+                if _live_versions.get(match_id) != version:
+                    with match_lock(match_id):
+                        publish_live(load_match_state({'match_id': match_id}) if SERVER_SIDE_STATE else rebuild_match_state(match_id))
+        except Exception:
+            app.logger.exception("Relais du score en direct interrompu")
+
+def _ensure_live_watcher():
+    with _live_watcher_lock:
+        if _live_watcher['pid'] != os.getpid(): # Un thread par worker (les threads ne survivent pas au fork)
+            _live_watcher['pid'] = os.getpid()
+            threading.Thread(target=_watch_live_matches, name='veec-live-watcher', daemon=True).start()
+
+def live_url(match_id):
+    return f"/live/{urllib.parse.quote(match_id, safe='')}"
+
+def match_id_children(match_id):
+    return [f"ID du Match : {match_id} ", html.A("📺 Score en direct", href=live_url(match_id), target='_blank')]
+
+
+# --- REPRISE D'UN MATCH (redémarrage du serveur, rechargement de la page) ---
+# L'identifiant du match affiché est gardé dans l'URL (?match=...) : recharger la page reprend le même match.
+# Les matchs non terminés peuvent aussi être repris depuis la liste du panneau « Reprendre un match ».
+
+def match_id_from_search(search):
+    return urllib.parse.parse_qs((search or '').lstrip('?')).get('match', [None])[0]
+
+def resume_label(match):
+    try:
+        started = datetime.strptime(match['match_id'][6:21], '%Y%m%d_%H%M%S').strftime('%d/%m/%Y %H:%M')
+    except ValueError:
+        started = match['match_id']
+    return (f"{started} - Sets {match['sets_veec']}-{match['sets_adverse']}, "
+            f"set {match['sets_veec'] + match['sets_adverse'] + 1} - {match['actions']} action(s)")
+
+def create_resume_panel():
+    return html.Details([
+        html.Summary("Reprendre un match en cours", style={'cursor': 'pointer'}),
         html.Div([
-            html.Div(f"ID du Match : {initial_state['match_id']}", id='match-id-display', 
-                     style={'fontSize': '0.9em', 'color': '#6c757d', 'marginRight': '20px'}),
+            dcc.Dropdown(id='resume-match-select', options=[], placeholder="Match non terminé...", style={'width': '420px'}),
+            html.Button("▶️ Reprendre", id='btn-resume-match', n_clicks=0,
+                        style={'padding': '5px 15px', 'marginLeft': '10px', 'border': 'none', 'borderRadius': '5px', 'cursor': 'pointer'}),
+        ], style={'display': 'flex', 'justifyContent': 'center', 'alignItems': 'center', 'marginTop': '10px'})
+    ], id='resume-panel', open=False, style={'textAlign': 'center', 'marginBottom': '10px'})
+
+# --- INITIALISATION ---
+
+def initial_store_data(state):
+    """Contenu initial du dcc.Store 'match-state' pour un nouvel état de match."""
+    return {key: state[key] for key in STORE_KEYS} if SERVER_SIDE_STATE else store_from_state(state)
+
+# --- PANNEAU DE MESURES (débogage) ---
+
+def create_metrics_overlay():
+    if not METRICS_OVERLAY:
+        return []
+    return [
+        html.Pre(id='metrics-overlay', style={'position': 'fixed', 'bottom': '5px', 'left': '5px', 'margin': 0, 'padding': '5px 8px',
+                                              'backgroundColor': 'rgba(0,0,0,0.75)', 'color': '#0f0', 'fontSize': '11px', 'zIndex': 2000}),
+        dcc.Interval(id='metrics-overlay-interval', interval=2000),
+    ]
+
+# --- LAYOUT ---
 
-            # NOUVEAU: Bouton pour annuler la dernière action
-            html.Button("↩️ Annuler la dernière action", id='btn-undo-last', n_clicks=0, 
-                        style={'padding': '5px 15px', 'backgroundColor': '#ff6347', 'color': 'white', 
-                               'border': 'none', 'borderRadius': '5px', 'cursor': 'pointer', 'marginRight': '20px'}),
+class VeecDash(dash.Dash):
+    """Dash dont la route /_dash-layout renvoie le layout pré-sérialisé (voir serve_layout_json)."""
+
+    def serve_layout(self):
+        if self._extra_components: # Composants ajoutés par Dash lui-même : sérialisation normale
+            return super().serve_layout()
+        return flask.Response(serve_layout_json(), mimetype='application/json')
+
+app = VeecDash(__name__, suppress_callback_exceptions=True)
+
+# --- FICHIERS STATIQUES ET COMPRESSION ---
+# Les URL de assets/ portant une empreinte (?v= pour les nôtres, ?m= ajouté par Dash à ses CSS/JS) changent avec
+# le contenu : le navigateur les garde un an sans revalider. Le terrain n'est ainsi téléchargé qu'une fois.
+
+ASSET_CACHE_SECONDS = 365 * 24 * 3600
+
+def versioned_asset_url(filename):
+    """URL d'un fichier de assets/ avec l'empreinte de son contenu."""
+    with open(os.path.join(app.config.assets_folder, filename), 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    return f"{app.get_asset_url(filename)}?v={digest}"
+
+@app.server.after_request
+def cache_versioned_assets(response):
+    request = flask.request
+    if (response.status_code == 200 and request.path.startswith(app.config.routes_pathname_prefix + app.config.assets_url_path.lstrip('/'))
+            and ('v' in request.args or 'm' in request.args)):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = ASSET_CACHE_SECONDS
+        response.cache_control.immutable = True
+    return response
+
+# Réponses JSON des callbacks, layout, HTML et JS compressés (brotli si le navigateur l'accepte, sinon gzip).
+# Brotli niveau 4 : gain proche du niveau maximal pour une fraction du temps CPU. Les réponses en flux
+# (direct, export, import) ne sont jamais compressées : elles resteraient bloquées dans le tampon du compresseur.
+app.server.config.update(
+    COMPRESS_ALGORITHM=['br', 'gzip'],
+    COMPRESS_BR_LEVEL=4,
+    COMPRESS_LEVEL=6,
+    COMPRESS_MIN_SIZE=500,
+    COMPRESS_STREAMS=False,
+)
 
-            html.Button("🔄 Nouveau Match", id='btn-new-match', n_clicks=0, 
-                        style={'padding': '5px 15px', 'backgroundColor': '#ffc107', 'color': 'black', 'border': 'none', 'borderRadius': '5px', 'cursor': 'pointer'})
-        ], style={'display': 'flex', 'justifyContent': 'center', 'alignItems': 'center', 'marginBottom': '20px'}) # NOUVEAU CONTENEUR FLEX
-    ], style={'textAlign': 'center', 'marginTop': '10px'}),
+# --- LAYOUT PRÉ-SÉRIALISÉ ---
+# Le layout ne diffère d'un chargement de page à l'autre que par l'identifiant du nouveau match. Il est construit
+# et sérialisé une seule fois (create_app) avec un identifiant provisoire, remplacé à chaque requête /_dash-layout :
+# terrain, modales et page d'analyse ne repassent plus par les composants Dash ni par l'encodeur JSON de Plotly.
+# Les effectifs (modale joueur, filtres, page /effectifs) en font partie : il est reconstruit quand leur version change.
+
+LAYOUT_MATCH_ID_PLACEHOLDER = "Match_00000000_000000_layout"
+
+@functools.lru_cache(maxsize=2)
+def static_layout(roster_version):
+    """Parties du layout qui ne dépendent que des effectifs (construites une fois par version des effectifs)."""
+    return {
+        'court_figure': create_simple_court_figure(),
+        'player_modal': create_player_modal(roster.team(DEFAULT_TEAM_ID)),
+        'action_modal': create_action_modal(),
+        'analyse_page': create_analyse_page(),
+        'roster_page': create_roster_page(),
+    }
 
-    dcc.Graph(
-        id='terrain-graph-simple',
-        figure=create_simple_court_figure(),
-        config={'displayModeBar': False, 'scrollZoom': False},
-        style={'height': '60vh'}
-    ),
+@functools.lru_cache(maxsize=2)
+def layout_json_template(roster_version):
+    return to_json(serve_layout(LAYOUT_MATCH_ID_PLACEHOLDER))
 
-    html.Div(id='input-modal-container'),
+def serve_layout_json():
+    """Réponse de /_dash-layout : le layout pré-sérialisé avec l'identifiant d'un nouveau match."""
+    return layout_json_template(roster.version()).replace(LAYOUT_MATCH_ID_PLACEHOLDER, new_match_state()['match_id'])
 
-    html.Hr(),
-    html.H3("Historique", style={'textAlign': 'center'}),
-    html.Div(id='historique-display', style={'padding': '20px'})
-])
+def serve_layout(match_id=None):
+    """
+    Layout servi à chaque chargement de page : chaque navigateur reçoit son propre identifiant de match
+    (un match généré à l'import serait partagé par tous les terrains et tous les workers).
+    """
+    initial_state = new_match_state(match_id)
+    team = roster.team(initial_state['team_id'])
+    static = static_layout(roster.version())
+    return html.Div([
+        dcc.Location(id='url', refresh=False), # refresh=False : écrire ?match=... ne recharge pas la page
+
+        html.Div([
+            dcc.Store(id='match-state', data=initial_store_data(initial_state)),
+            dcc.Store(id='click-reset-trigger', data=0), 
+    
+            html.Div([
+                html.Div("VEEC", style={'fontSize': '2em', 'fontWeight': 'bold', 'color': VEEC_COLOR}),
+                html.Div([
+                    # Affichage du score par set
+                    html.Span(f"Sets: {initial_state['sets_veec']}", id='sets-veec-display', style={'fontSize': '1.5em', 'marginRight': '10px', 'color': VEEC_COLOR}),
+            
+                    html.Span(id='score-veec-display', children=str(initial_state['score_veec']), style={'fontSize': '3em', 'marginRight': '20px'}),
+                    html.Span("-", style={'fontSize': '3em'}),
+                    html.Span(id='score-adverse-display', children=str(initial_state['score_adverse']), style={'fontSize': '3em', 'marginLeft': '20px'}),
+            
+                    # Affichage du score par set
+                    html.Span(f"Sets: {initial_state['sets_adverse']}", id='sets-adverse-display', style={'fontSize': '1.5em', 'marginLeft': '10px', 'color': ADVERSE_COLOR}),
+                ], style={'display': 'flex', 'alignItems': 'center'}),
+                html.Div("ADVERSAIRE", style={'fontSize': '2em', 'fontWeight': 'bold', 'color': ADVERSE_COLOR}),
+            ], style={'display': 'flex', 'justifyContent': 'space-between', 'alignItems': 'center', 'padding': '20px', 'borderBottom': '1px solid #ccc', 'backgroundColor': 'white'}),
+
+
+            html.Div([
+                html.H4(f"Set en cours : {initial_state['current_set']}", id='current-set-display', style={'textAlign': 'center'}),
+                html.Div([
+                    html.Div(match_id_children(initial_state['match_id']), id='match-id-display', 
+                             style={'fontSize': '0.9em', 'color': '#6c757d', 'marginRight': '20px'}),
+
+                    # NOUVEAU: Bouton pour annuler la dernière action
+                    html.Button("↩️ Annuler la dernière action", id='btn-undo-last', n_clicks=0, 
+                                style={'padding': '5px 15px', 'backgroundColor': '#ff6347', 'color': 'white', 
+                                       'border': 'none', 'borderRadius': '5px', 'cursor': 'pointer', 'marginRight': '20px'}),
+
+                    html.Button("🔄 Nouveau Match", id='btn-new-match', n_clicks=0, 
+                                style={'padding': '5px 15px', 'backgroundColor': '#ffc107', 'color': 'black', 'border': 'none', 'borderRadius': '5px', 'cursor': 'pointer'}),
+
+                    # Équipe du match : effectif proposé dans la modale joueur
+                    dcc.Dropdown(id='team-select', options=team_options(), value=team.id, clearable=False,
+                                 style={'width': '180px', 'marginLeft': '20px', 'textAlign': 'left'}),
+                    dcc.Link("👥 Effectifs", href=ROSTER_PATH, style={'marginLeft': '20px'}),
+                    dcc.Link("📊 Analyse de saison", href=ANALYSE_PATH, style={'marginLeft': '20px'}),
+                    html.A("📤 Import de matchs", href=IMPORT_PATH, style={'marginLeft': '20px'}),
+
+                    # Nombre d'actions saisies hors-ligne pas encore enregistrées (mode clientside)
+                    html.Span(id='action-queue-status', style={'marginLeft': '20px', 'color': '#856404', 'fontSize': '0.9em'})
+                ], style={'display': 'flex', 'justifyContent': 'center', 'alignItems': 'center', 'marginBottom': '20px'}), # NOUVEAU CONTENEUR FLEX
+                create_resume_panel()
+            ], style={'textAlign': 'center', 'marginTop': '10px'}),
+
+            create_heatmap_controls(team),
+
+            dcc.Graph(
+                id='terrain-graph-simple',
+                figure=static['court_figure'],
+                config={'displayModeBar': False, 'scrollZoom': False},
+                style={'height': '60vh'}
+            ),
+
+            dcc.Store(id='roster-store', data=roster_store_data(team)),
+            # Règles de score pour le mode clientside, et dernière action validée dans le navigateur
+            dcc.Store(id='rules-store', data={
+                'points_pour_gagner': POINTS_POUR_GAGNER,
+                'sets_pour_gagner': SETS_POUR_GAGNER,
+                'point_effects': POINT_EFFECTS,
+            }),
+            dcc.Store(id='pending-action'),
+            dcc.Store(id='ingest-ack'),
+            # Relance périodique de l'envoi des actions en attente (mode clientside uniquement)
+            dcc.Interval(id='action-queue-interval', interval=5000, disabled=not CLIENTSIDE_MODE),
+            static['player_modal'],
+            static['action_modal'],
+
+            html.Hr(),
+            html.H3("Historique", style={'textAlign': 'center'}),
+            html.Div(create_historique_table(initial_state['_engine']), id='historique-display', style={'padding': '20px'}),
+
+            html.Details([
+                html.Summary("Historique complet (tous les sets, tri et filtres)", style={'cursor': 'pointer', 'fontWeight': 'bold'}),
+                create_historique_complet_table()
+            ], id='historique-complet', open=False, style={'padding': '20px'}),
+
+            html.Details([
+                html.Summary("Statistiques en direct (par joueur)", style={'cursor': 'pointer', 'fontWeight': 'bold'}),
+                dcc.Dropdown(
+                    id='stats-set-filter',
+                    options=[{'label': 'Tout le match', 'value': 0}] + [{'label': f"Set {n}", 'value': n} for n in range(1, MAX_SETS + 1)],
+                    value=0, clearable=False, style={'width': '200px', 'margin': '10px 0'}
+                ),
+                create_stats_table()
+            ], id='stats-panel', open=False, style={'padding': '20px'}),
+
+            create_export_panel()
+        ], id='page-saisie'),
+
+        static['analyse_page'],
+        static['roster_page'],
+        *create_metrics_overlay()
+    ])
+
+app.layout = serve_layout
 
 # --- CALLBACKS ---
 
+def workflow_callback(*args, **kwargs):
+    """Enregistre un callback serveur du workflow de saisie, sauf en mode clientside où assets/veec_workflow.js le remplace."""
+    if CLIENTSIDE_MODE:
+        return lambda func: func
+    return app.callback(*args, **kwargs)
+
 # 1. Gestion du Workflow de Saisie (Terrain -> Joueur -> Action UI)
-@app.callback(
-    [Output('input-modal-container', 'children'),
+# Les modales sont déjà dans le layout : le serveur ne renvoie que leur 'display' (affichée / masquée)
+@workflow_callback(
+    [Output('player-modal', 'style'),
+     Output('action-modal', 'style'),
      Output('match-state', 'data', allow_duplicate=True)],
     [
         Input('terrain-graph-simple', 'clickData'),
         Input({'type': 'select-player-btn', 'index': ALL}, 'n_clicks'),
-        Input({'type': 'modal-control', 'action': ALL}, 'n_clicks')
+        Input({'type': 'modal-control', 'action': ALL, 'modal': ALL}, 'n_clicks')
     ],
     [State('match-state', 'data')],
     prevent_initial_call=True
 )
 def handle_stat_workflow(clickData, n_player_btn, n_control_btn, current_state):
     ctx = dash.callback_context
-    if not ctx.triggered: return dash.no_update, dash.no_update
+    if not ctx.triggered: return dash.no_update, dash.no_update, dash.no_update
 
     triggered_id = ctx.triggered[0]['prop_id']
-    new_state = copy.deepcopy(current_state)
+    new_state = load_match_state(current_state)
 
     # Clause de garde pour bloquer l'ajout de stat si le match est terminé
-    if new_state.get('sets_veec', 0) >= 3 or new_state.get('sets_adverse', 0) >= 3:
-        return None, dash.no_update # Ferme la modale si elle est ouverte et bloque l'action
+    if new_state.get('sets_veec', 0) >= SETS_POUR_GAGNER or new_state.get('sets_adverse', 0) >= SETS_POUR_GAGNER:
+        return modal_display(False), modal_display(False), dash.no_update # Ferme la modale si elle est ouverte et bloque l'action
 
     # --- Déclencheur : Annulation ---
     if 'modal-control' in triggered_id:
@@ -354,7 +1118,7 @@ def handle_stat_workflow(clickData, n_player_btn, n_control_btn, current_state):
             if triggered_dict.get('action') == 'cancel':
                 new_state['temp_selected_pos'] = None
                 new_state['temp_selected_player'] = None
-                return None, new_state
+                return modal_display(False), modal_display(False), save_match_state(new_state)
         except json.JSONDecodeError:
             pass
 
@@ -363,94 +1127,40 @@ def handle_stat_workflow(clickData, n_player_btn, n_control_btn, current_state):
         pos = clickData['points'][0]['customdata']
         new_state['temp_selected_pos'] = pos
         new_state['temp_selected_player'] = None
-        
-        player_buttons = []
-        for p in LISTE_JOUEURS_PREDEFINIE:
-            player_buttons.append(html.Button(
-                f"N°{p['numero']} - {p['nom']}", 
-                id={'type': 'select-player-btn', 'index': p['numero']},
-                n_clicks=0,
-                style={'margin': '5px', 'padding': '10px 15px', 'fontSize': '1.0em', 'borderRadius': '5px', 'border': f'1px solid {VEEC_COLOR}', 'backgroundColor': '#fff', 'cursor': 'pointer'}
-            ))
-        
-        modal_content = html.Div([
-            html.Div([
-                html.H3(f"P{pos} : Quel joueur ?", style={'textAlign': 'center', 'marginBottom': '20px'}),
-                html.Div(player_buttons, style={'display': 'flex', 'flexWrap': 'wrap', 'justifyContent': 'center', 'maxHeight': '60vh', 'overflowY': 'auto'}),
-                html.Button("Annuler", id={'type': 'modal-control', 'action': 'cancel'}, style={'marginTop': '20px', 'width': '100%', 'padding': '10px', 'backgroundColor': '#ccc', 'color': 'black'})
-            ], style={'backgroundColor': 'white', 'padding': '30px', 'borderRadius': '15px', 'width': '90%', 'maxWidth': '600px', 'boxShadow': '0 5px 15px rgba(0,0,0,0.3)'})
-        ], style={'position': 'fixed', 'top': 0, 'left': 0, 'width': '100%', 'height': '100%', 'backgroundColor': 'rgba(0,0,0,0.6)', 'display': 'flex', 'justifyContent': 'center', 'alignItems': 'center', 'zIndex': 2000})
-        
-        return modal_content, new_state
+        return modal_display(True), modal_display(False), save_match_state(new_state)
 
     # --- Phase 2 : Clic Joueur (Sélection Action UI) ---
     if 'select-player-btn' in triggered_id:
-        # ... (Logique de création de la modale inchangée)
         btn_id_dict = json.loads(triggered_id.split('.')[0])
-        player_num = btn_id_dict['index']
-        
-        new_state['temp_selected_player'] = player_num 
-        
-        pos = new_state['temp_selected_pos']
-        player_name = next((p['nom'] for p in LISTE_JOUEURS_PREDEFINIE if p['numero'] == player_num), f"N°{player_num}")
-        
-        # --- GENERATION DES BOUTONS EN COLONNES ---
-        cols = []
-        for title, code_base, buttons in ACTION_CATEGORIES:
-            button_elements = []
-            for label, code_result, bg_color in buttons:
-                action_value = f"{code_base}_{code_result}"
-                btn_id = {'type': 'select-action-btn', 'value': action_value}
-                button_elements.append(
-                    html.Button(label, id=btn_id, n_clicks=0,
-                        style={'width': '100%', 'marginBottom': '8px', 'backgroundColor': bg_color, 'color': 'white', 
-                               'border': 'none', 'padding': '12px 0', 'borderRadius': '5px', 'fontSize': '1.1em', 
-                               'cursor': 'pointer', 'fontWeight': 'bold'}
-                    ))
-            
-            cols.append(
-                html.Div([
-                    html.H4(title, style={'textAlign': 'center', 'fontSize': '1.3em', 'marginBottom': '15px', 'color': '#333'}),
-                    *button_elements
-                ], style={'width': '19%', 'display': 'inline-block', 'padding': '0 0.5%', 'verticalAlign': 'top', 'boxSizing': 'border-box'}))
-
-        content_style = {
-            'backgroundColor': 'white', 'padding': '30px', 'borderRadius': '15px', 'width': '95%', 
-            'maxWidth': '900px', 'boxShadow': '0 8px 16px rgba(0,0,0,0.4)', 'maxHeight': '90vh', 
-            'overflowY': 'auto', 'position': 'relative', 'zIndex': 1002 
-        }
-        modal_style = {
-            'position': 'fixed', 'top': 0, 'left': 0, 'width': '100%', 'height': '100%',
-            'backgroundColor': 'rgba(0,0,0,0.7)', 'display': 'flex', 'justifyContent': 'center', 
-            'alignItems': 'center', 'zIndex': 2000 
-        }
+        new_state['temp_selected_player'] = btn_id_dict['index']
+        return modal_display(False), modal_display(True), save_match_state(new_state)
 
-        modal_content_inner = html.Div(
-            children=[
-                html.Div([
-                    html.H3(f"Saisie Stat : N°{player_num} ({player_name}) - P{pos}", 
-                            style={'textAlign': 'center', 'color': '#333'}),
-                    
-                    html.Button("✕ Annuler", id={'type': 'modal-control', 'action': 'cancel'}, n_clicks=0, 
-                        style={'position': 'absolute', 'top': '10px', 'right': '10px', 'backgroundColor': 'transparent', 
-                               'border': 'none', 'fontSize': '1.2em', 'cursor': 'pointer', 'color': '#333', 'padding': '10px'})
-                ], style={'position': 'relative', 'marginBottom': '20px'}),
-                
-                html.Div(cols, style={'display': 'flex', 'justifyContent': 'space-around', 'flexWrap': 'wrap'})
-            ], style=content_style
-        )
-        
-        modal_content = html.Div(children=modal_content_inner, style=modal_style)
-        
-        return modal_content, new_state
+    return dash.no_update, dash.no_update, dash.no_update
 
-    return dash.no_update, dash.no_update
+# Titres des modales : seule partie dynamique, calculée dans le navigateur à partir de la sélection en cours
+app.clientside_callback(
+    """
+    function(state, roster) {
+        if (!state) {
+            return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+        }
+        var pos = state.temp_selected_pos;
+        var num = state.temp_selected_player;
+        var nom = (roster && roster[num]) || ('N°' + num);
+        return ['P' + pos + ' : Quel joueur ?', 'Saisie Stat : N°' + num + ' (' + nom + ') - P' + pos];
+    }
+    """,
+    [Output('player-modal-title', 'children'),
+     Output('action-modal-title', 'children')],
+    [Input('match-state', 'data')],
+    [State('roster-store', 'data')]
+)
 
 # 2. Validation et Traitement Final de la Statistique (Mis à jour pour la gestion du score et des sets)
-@app.callback(
+@workflow_callback(
     [Output('match-state', 'data', allow_duplicate=True),
-     Output('input-modal-container', 'children', allow_duplicate=True),
-     Output('historique-display', 'children'),
+     Output('action-modal', 'style', allow_duplicate=True),
+     Output('historique-table', 'data'),
      Output('score-veec-display', 'children'),
      Output('score-adverse-display', 'children'),
      Output('sets-veec-display', 'children'), # Affichage des sets
@@ -475,77 +1185,84 @@ def process_stat_entry(action_clicks, current_state):
     if action_clicks_value is None or action_clicks_value == 0:
         return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
 
-    new_state = copy.deepcopy(current_state)
+    # Écritures du match sérialisées dans ce processus : lecture de l'état, calcul et INSERT forment un tout
+    with match_lock(current_state['match_id']):
+        new_state = load_match_state(current_state)
+        if stale_display(new_state):
+            # Affichage antérieur à la dernière écriture du match : la saisie est refusée et l'onglet rechargé
+            new_state['click_count'] = new_state.get('click_count', 0) + 1
+            store_out, histo_table = reload_display(new_state)
+            return (store_out, modal_display(False), histo_table, *score_display(new_state), new_state['click_count'])
     
-    pos = new_state['temp_selected_pos']
-    player_val = new_state['temp_selected_player']
+        pos = new_state['temp_selected_pos']
+        player_val = new_state['temp_selected_player']
     
-    if pos is None or player_val is None:
-        return dash.no_update, None, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+        if pos is None or player_val is None:
+            return dash.no_update, modal_display(False), dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
 
-    triggered_id_dict = json.loads(triggered_id.split('.')[0])
-    action_val = triggered_id_dict['value']
-    
-    player_name = next((p['nom'] for p in LISTE_JOUEURS_PREDEFINIE if p['numero'] == player_val), f"N°{player_val}")
+        triggered_id_dict = json.loads(triggered_id.split('.')[0])
+        action_val = triggered_id_dict['value']
     
-    # --- 1. Mise à Jour du Score ---
-    score_avant_action = f"{new_state['score_veec']}-{new_state['score_adverse']}"
-    if '_ACE' in action_val or '_POINT' in action_val:
-        new_state['score_veec'] += 1
-    elif '_ERR' in action_val:
-        new_state['score_adverse'] += 1
-        
-    # --- 2. Enregistrer la stat enrichie ---
-    log_entry = {
-        'timestamp': datetime.now().strftime("%H:%M:%S"),
-        'set': new_state['current_set'], # Numéro du set en cours
-        'score': score_avant_action, # Score au moment du clic (avant l'incrémentation finale)
-        'pos': f"P{pos}",
-        'joueur': player_name,
-        'action': action_val
-    }
-    new_state['historique_stats'].insert(0, log_entry)
+        player_name, player_id = resolve_player(new_state['team_id'], player_val)
     
-    # --- 3. Vérification de la Fin de Set / Match ---
-    new_state = check_set_and_match_end(new_state)
-
-    if 'FIN_SET' not in action_val and 'FIN_MATCH' not in action_val:
-        # On n'insère dans la DB que si la stat est complète (pas les lignes de 'FIN_SET' ou 'FIN_MATCH' déjà ajoutées par check_set_and_match_end)
-        
-        # NOTE : Utiliser les variables créées localement dans le callback
-        current_match_id = new_state['match_id']
-        
-        insert_stat(
-            match_id=current_match_id,
-            set_num=new_state['current_set'],
-            timestamp=datetime.now().strftime("%H:%M:%S"),
-            score_at_action=score_avant_action,
-            position=f"P{pos}",
-            joueur_nom=player_name,
-            action_code=action_val
-        )
+        # --- 1. Mise à Jour du Score, de l'historique et vérification de la Fin de Set / Match ---
+        score_veec_avant, score_adverse_avant = new_state['score_veec'], new_state['score_adverse']
+        historique_len_avant = historique_length(get_score_engine(new_state))
+        try:
+            log_entry, set_result = apply_stat_to_state(new_state, f"P{pos}", player_name, action_val)
+
+            # --- 2. Enregistrer la stat enrichie ---
+            # Le set et l'horodatage sont ceux de l'entrée d'historique (avant un éventuel passage au set suivant)
+            action = ACTIONS_BY_CODE[action_val]
+            insert_stat(
+                match_id=new_state['match_id'],
+                set_num=log_entry['set'],
+                timestamp=log_entry['timestamp'],
+                score_veec=score_veec_avant,
+                score_adverse=score_adverse_avant,
+                position=log_entry['pos'],
+                joueur_nom=player_name,
+                action_category=action.category,
+                action_result=action.result,
+                joueur_id=player_id,
+                set_result=set_result # Fin de set : point de reprise du match, enregistré avec l'action
+            )
+            # Écriture d'un autre worker / terrain intercalée : la table est renvoyée en entier
+            reloaded = confirm_match_write(new_state)
+        except Exception:
+            # L'état en mémoire contient déjà l'action non enregistrée : il sera reconstruit depuis SQLite
+            forget_match_state(new_state['match_id'])
+            raise
     
-    # --- 4. Réinitialisation de l'état temporaire et mise à jour de l'affichage ---
-    new_state['temp_selected_pos'] = None
-    new_state['temp_selected_player'] = None
-    new_state['click_count'] = new_state.get('click_count', 0) + 1
+        # --- 3. Réinitialisation de l'état temporaire et mise à jour de l'affichage ---
+        new_state['temp_selected_pos'] = None
+        new_state['temp_selected_player'] = None
+        new_state['click_count'] = new_state.get('click_count', 0) + 1
             
-    histo_table = create_historique_table(new_state['historique_stats'])
+        # Ligne de la stat (et éventuelle ligne FIN_SET / FIN_MATCH) ajoutée en tête de table
+        if reloaded:
+            histo_table = historique_table_data(get_score_engine(new_state))
+        else:
+            engine = get_score_engine(new_state)
+            histo_table = patch_historique_table(engine, added=historique_length(engine) - historique_len_avant)
+        new_state['table_version'] = new_state['db_version']
     
-    # Mise à jour des outputs d'affichage
-    score_veec_out = str(new_state['score_veec'])
-    score_adverse_out = str(new_state['score_adverse'])
-    sets_veec_out = f"Sets: {new_state['sets_veec']}"
-    sets_adverse_out = f"Sets: {new_state['sets_adverse']}"
-    current_set_out = f"Set en cours : {new_state['current_set']}"
+        # Mise à jour des outputs d'affichage
+        score_veec_out = str(new_state['score_veec'])
+        score_adverse_out = str(new_state['score_adverse'])
+        sets_veec_out = f"Sets: {new_state['sets_veec']}"
+        sets_adverse_out = f"Sets: {new_state['sets_adverse']}"
+        current_set_out = f"Set en cours : {new_state['current_set']}"
     
-    # Si le match est fini, on l'indique dans l'affichage du set
-    if new_state.get('sets_veec', 0) >= 3 or new_state.get('sets_adverse', 0) >= 3:
-        current_set_out = "MATCH TERMINÉ !"
+        # Si le match est fini, on l'indique dans l'affichage du set
+        if new_state.get('sets_veec', 0) >= SETS_POUR_GAGNER or new_state.get('sets_adverse', 0) >= SETS_POUR_GAGNER:
+            current_set_out = "MATCH TERMINÉ !"
 
+        store_out = save_match_state(new_state)
+        publish_live(new_state) # Un seul message pour tous les spectateurs du match
     return (
-        new_state, 
-        None, 
+        store_out, 
+        modal_display(False), 
         histo_table, 
         score_veec_out, 
         score_adverse_out, 
@@ -556,7 +1273,7 @@ def process_stat_entry(action_clicks, current_state):
     )
 
 # 3. Callback de Réinitialisation 
-@app.callback(
+@workflow_callback(
     Output('terrain-graph-simple', 'clickData'),
     Input('click-reset-trigger', 'data'),
     prevent_initial_call=True
@@ -567,19 +1284,233 @@ def reset_click_data(trigger_data):
         return None
     return dash.no_update
 
-def fetch_all_stats(match_id):
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row # Permet d'accéder aux colonnes par leur nom
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM actions WHERE match_id = ? ORDER BY id DESC", (match_id,))
-    rows = cursor.fetchall()
-    
-    conn.close()
-    
-    # Convertir en liste de dictionnaires
-    return [dict(row) for row in rows]
+# 4. Mode clientside : sélection et score dans le navigateur, seule l'action validée remonte au serveur
+if CLIENTSIDE_MODE:
+    app.clientside_callback(
+        ClientsideFunction(namespace='veec', function_name='handleStatWorkflow'),
+        [Output('player-modal', 'style'),
+         Output('action-modal', 'style'),
+         Output('match-state', 'data', allow_duplicate=True)],
+        [Input('terrain-graph-simple', 'clickData'),
+         Input({'type': 'select-player-btn', 'index': ALL}, 'n_clicks'),
+         Input({'type': 'modal-control', 'action': ALL, 'modal': ALL}, 'n_clicks')],
+        [State('match-state', 'data'),
+         State('player-modal', 'style'),
+         State('action-modal', 'style'),
+         State('rules-store', 'data')],
+        prevent_initial_call=True
+    )
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='veec', function_name='processStatEntry'),
+        [Output('match-state', 'data', allow_duplicate=True),
+         Output('action-modal', 'style', allow_duplicate=True),
+         Output('score-veec-display', 'children'),
+         Output('score-adverse-display', 'children'),
+         Output('sets-veec-display', 'children'),
+         Output('sets-adverse-display', 'children'),
+         Output('current-set-display', 'children'),
+         Output('pending-action', 'data'),
+         Output('terrain-graph-simple', 'clickData')],
+        [Input({'type': 'select-action-btn', 'value': ALL}, 'n_clicks')],
+        [State('match-state', 'data'),
+         State('action-modal', 'style'),
+         State('rules-store', 'data')],
+        prevent_initial_call=True
+    )
+
+    # File d'attente hors-ligne : l'action validée est mise en file (localStorage) puis envoyée par lots à /api/actions/bulk
+    app.clientside_callback(
+        ClientsideFunction(namespace='veec', function_name='syncActionQueue'),
+        [Output('ingest-ack', 'data'),
+         Output('action-queue-status', 'children')],
+        [Input('pending-action', 'data'),
+         Input('action-queue-interval', 'n_intervals')]
+    )
+
+    @app.callback(
+        Output('historique-table', 'data', allow_duplicate=True),
+        [Input('ingest-ack', 'data')],
+        [State('match-state', 'data')],
+        prevent_initial_call=True
+    )
+    def refresh_historique_after_ingest(ack, current_state):
+        """Ajoute en tête de l'historique les lignes créées par l'ingestion des actions du match affiché."""
+        added = ((ack or {}).get('history_added') or {}).get(current_state['match_id'], 0)
+        if not added:
+            raise dash.exceptions.PreventUpdate
+        state = load_match_state(current_state)
+        return patch_historique_table(get_score_engine(state), added=added)
+
+def _validate_client_action(action):
+    """Retourne la raison du rejet d'une action envoyée par le navigateur, ou None si elle est valide (seq normalisé en entier)."""
+    if not isinstance(action, dict) or not isinstance(action.get('uuid'), str) or not action['uuid']:
+        return 'uuid manquant'
+    if not isinstance(action.get('match_id'), str) or not action['match_id']:
+        return 'match_id manquant'
+    if action.get('action') not in ACTIONS_BY_CODE:
+        return 'action inconnue'
+    if action.get('pos') not in VEEC_ZONES_COORDS:
+        return 'position inconnue'
+    if not isinstance(action.get('joueur'), int):
+        return 'joueur inconnu'
+    seq = action.get('seq')
+    if seq is not None:
+        # Entier attendu ; un numéro en texte (ancienne file, client tiers) est converti pour le tri et la colonne client_seq
+        if isinstance(seq, bool) or not isinstance(seq, (int, str)) or not str(seq).strip().lstrip('-').isdigit():
+            return 'seq invalide'
+        action['seq'] = int(seq)
+    return None
+
+def ingest_client_actions(actions):
+    """
+    Enregistre un lot d'actions validées par le navigateur, en une seule transaction.
+    Les actions déjà reçues (même UUID) sont ignorées : un lot peut être renvoyé sans double comptage.
+    Retourne les UUID insérés, doublons et rejets, et le nombre de lignes d'historique ajoutées par match.
+    """
+    result = {'inserted': [], 'duplicates': [], 'rejected': [], 'history_added': {}}
+    valid = []
+    for action in actions:
+        reason = _validate_client_action(action)
+        if reason:
+            result['rejected'].append({'uuid': action.get('uuid') if isinstance(action, dict) else None, 'reason': reason})
+        else:
+            valid.append(action)
+    # Ordre de saisie : numéro de séquence client au sein de chaque match
+    valid.sort(key=lambda a: (a['match_id'], a.get('seq') or 0))
 
+    # Verrous des matchs pris avant la transaction, dans un ordre fixe (même ordre que process_stat_entry / handle_undo)
+    with contextlib.ExitStack() as locks:
+        for match_id in sorted({a['match_id'] for a in valid}):
+            locks.enter_context(match_lock(match_id))
+
+        touched = {}
+        history_len_before = {}
+        try:
+            with transaction() as conn:
+                known = find_known_client_uuids(conn, (a['uuid'] for a in valid))
+                for action in valid:
+                    if action['uuid'] in known:
+                        result['duplicates'].append(action['uuid'])
+                        continue
+                    known.add(action['uuid'])
+
+                    match_id = action['match_id']
+                    if match_id not in touched:
+                        touched[match_id] = load_match_state({'match_id': match_id})
+                        history_len_before[match_id] = historique_length(get_score_engine(touched[match_id]))
+                    new_state = touched[match_id]
+                    if new_state['sets_veec'] >= SETS_POUR_GAGNER or new_state['sets_adverse'] >= SETS_POUR_GAGNER:
+                        result['rejected'].append({'uuid': action['uuid'], 'reason': 'match terminé'})
+                        continue
+
+                    player_name, player_id = resolve_player(new_state['team_id'], action['joueur'])
+                    score_veec_avant, score_adverse_avant = new_state['score_veec'], new_state['score_adverse']
+                    log_entry, set_result = apply_stat_to_state(new_state, f"P{action['pos']}", player_name, action['action'], action.get('timestamp'))
+                    info = ACTIONS_BY_CODE[action['action']]
+                    insert_client_action(
+                        conn, match_id, log_entry['set'], log_entry['timestamp'], score_veec_avant, score_adverse_avant,
+                        log_entry['pos'], player_name, info.category, info.result, player_id, action['uuid'], action.get('seq')
+                    )
+                    if set_result:
+                        insert_set_result(conn, match_id, set_result)
+                    result['inserted'].append(action['uuid'])
+                # Verrou d'écriture tenu : aucune autre écriture n'a pu s'intercaler, la version est exacte
+                for match_id, new_state in touched.items():
+                    new_state['db_version'] = fetch_match_version(match_id, conn)
+        except Exception:
+            # L'état en mémoire a déjà été modifié : il sera reconstruit depuis SQLite
+            for match_id in touched:
+                forget_match_state(match_id)
+            raise
+
+        for match_id, new_state in touched.items():
+            save_match_state(new_state)
+            publish_live(new_state)
+            result['history_added'][match_id] = historique_length(get_score_engine(new_state)) - history_len_before[match_id]
+    return result
+
+@app.server.route('/api/actions/bulk', methods=['POST'])
+def bulk_ingest_actions():
+    """Point d'entrée de la file d'attente du navigateur : {"actions": [{uuid, seq, match_id, pos, joueur, action, timestamp}, ...]}."""
+    payload = flask.request.get_json(silent=True) or {}
+    actions = payload.get('actions')
+    if not isinstance(actions, list):
+        return flask.jsonify({'error': "champ 'actions' manquant"}), 400
+    return flask.jsonify(ingest_client_actions(actions))
+
+def _live_streams_full():
+    return flask.Response("Trop de spectateurs connectés, nouvelle tentative dans quelques secondes.\n", status=503,
+                          mimetype='text/plain', headers={'Retry-After': str(RETRY_AFTER_SECONDS), 'Cache-Control': 'no-cache'})
+
+@app.server.route('/live/<match_id>')
+def live_scoreboard(match_id):
+    """Tableau de score en lecture seule (parents, coach, TV) : aucune dépendance à Dash côté navigateur."""
+    return flask.Response(scoreboard_html(live_url(match_id) + '/events'), mimetype='text/html')
+
+@app.server.route('/live/<match_id>/events')
+def live_events(match_id):
+    """
+    Flux server-sent events du match : dernier état à la connexion, puis un message par saisie / annulation.
+    Au-delà de MAX_STREAMS flux ouverts dans ce worker : 503, les threads restants sont gardés pour la saisie.
+    """
+    _ensure_live_watcher()
+    if broker.subscriber_count() >= MAX_STREAMS: # Refus avant toute lecture de l'état
+        return _live_streams_full()
+    initial_message = None
+    if broker.last_message(match_id) is None:
+        # Premier spectateur depuis le démarrage : état lu une fois (mémoire ou SQLite), pas à chaque rafraîchissement
+        state = load_match_state({'match_id': match_id}) if SERVER_SIDE_STATE else rebuild_match_state(match_id)
+        initial_message = json.dumps(live_payload(state), ensure_ascii=False)
+    subscriber = broker.subscribe(match_id, limit=MAX_STREAMS)
+    if subscriber is None:
+        return _live_streams_full()
+    response = flask.Response(sse_stream(match_id, subscriber, initial_message), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(lambda: broker.unsubscribe(match_id, subscriber)) # Connexion fermée avant le premier message
+    return response
+
+@app.server.route(f'{EXPORT_PATH}/<fmt>')
+def export_actions(fmt):
+    """
+    Export en flux : ?match_id=...&set=N pour un match ou un set, ?from=AAAA-MM-JJ&to=AAAA-MM-JJ pour une période.
+    La réponse est un générateur : chaque paquet de lignes lu dans SQLite est envoyé avant de lire le suivant.
+    """
+    if fmt not in EXPORT_STREAMS:
+        return flask.jsonify({'error': f"format inconnu : {fmt}"}), 404
+    args = flask.request.args
+    try:
+        filters = {
+            'match_id': args.get('match_id') or None,
+            'set_num': int(args['set']) if args.get('set') else None,
+            'date_from': parse_export_date(args.get('from')),
+            'date_to': parse_export_date(args.get('to')),
+        }
+    except ValueError:
+        return flask.jsonify({'error': "paramètre 'set', 'from' ou 'to' invalide"}), 400
+    filename = export_filename(fmt, **filters)
+    return flask.Response(EXPORT_STREAMS[fmt](**filters), mimetype=EXPORT_FORMATS[fmt][0], headers={
+        'Content-Disposition': f"attachment; filename=\"{filename}\"",
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.server.route(IMPORT_PATH, methods=['GET'])
+def import_page():
+    return flask.Response(upload_page_html(IMPORT_PATH), mimetype='text/html')
+
+@app.server.route(IMPORT_PATH, methods=['POST'])
+def import_upload():
+    """Import d'un fichier envoyé par la page : une ligne JSON d'avancement par paquet inséré, puis le rapport final."""
+    upload = flask.request.files.get('file')
+    if upload is None:
+        return flask.jsonify({'error': "champ 'file' manquant"}), 400
+    form = flask.request.form
+    # stream_with_context : le fichier envoyé reste lisible pendant que le générateur le copie sur disque
+    stream = import_upload_stream(upload, strict=form.get('strict') == '1', allow_unknown_players=form.get('allow_unknown_players') == '1',
+                                  team_id=form.get('team_id', DEFAULT_TEAM_ID, type=int))
+    return flask.Response(flask.stream_with_context(stream),
+                          mimetype='application/x-ndjson', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # 5. Callback de Démarrage d'un Nouveau Match
 @app.callback(
@@ -590,41 +1521,36 @@ def fetch_all_stats(match_id):
      Output('sets-adverse-display', 'children', allow_duplicate=True),
      Output('current-set-display', 'children', allow_duplicate=True),
      Output('match-id-display', 'children', allow_duplicate=True),
-     Output('historique-display', 'children', allow_duplicate=True),
+     Output('historique-table', 'data', allow_duplicate=True),
      Output('export-status-output', 'children', allow_duplicate=True)], # Clear statut export
     [Input('btn-new-match', 'n_clicks')],
+    [State('team-select', 'value')],
     prevent_initial_call=True
 )
-def start_new_match(n_clicks):
+def start_new_match(n_clicks, team_id):
     if n_clicks is None or n_clicks == 0:
         return dash.no_update
         
-    # Création d'un NOUVEL état initial
-    new_match_id = f"Match_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    new_initial_state = {
-        'match_id': new_match_id, 
-        'score_veec': 0, 
-        'score_adverse': 0,
-        'sets_veec': 0, 
-        'sets_adverse': 0,
-        'current_set': 1,
-        'historique_stats': [],
-        'temp_selected_pos': None, 
-        'temp_selected_player': None, 
-        'click_count': 0 
-    }
+    # Création d'un NOUVEL état initial, pour l'équipe sélectionnée
+    new_initial_state = new_match_state()
+    team_id = roster.team(team_id).id
+    if team_id != DEFAULT_TEAM_ID:
+        with match_lock(new_initial_state['match_id']):
+            assign_match_team(new_initial_state, team_id)
     
     # Mise à jour des outputs d'affichage
     sets_veec_out = f"Sets: {new_initial_state['sets_veec']}"
     sets_adverse_out = f"Sets: {new_initial_state['sets_adverse']}"
     current_set_out = f"Set en cours : {new_initial_state['current_set']}"
-    match_id_out = f"ID du Match : {new_initial_state['match_id']}"
+    match_id_out = match_id_children(new_initial_state['match_id'])
     
     # Réinitialisation de l'historique affiché
-    histo_table = create_historique_table([]) 
+    histo_table = [] 
     
+    store_out = save_match_state(new_initial_state)
+    publish_live(new_initial_state)
     return (
-        new_initial_state, 
+        store_out, 
         str(new_initial_state['score_veec']), 
         str(new_initial_state['score_adverse']), 
         sets_veec_out, 
@@ -636,10 +1562,114 @@ def start_new_match(n_clicks):
     )
 
 
+# 5 bis. Reprise d'un match : choisi dans la liste, ou identifiant présent dans l'URL au chargement de la page
+@app.callback(
+    [Output('match-state', 'data', allow_duplicate=True),
+     Output('score-veec-display', 'children', allow_duplicate=True),
+     Output('score-adverse-display', 'children', allow_duplicate=True),
+     Output('sets-veec-display', 'children', allow_duplicate=True),
+     Output('sets-adverse-display', 'children', allow_duplicate=True),
+     Output('current-set-display', 'children', allow_duplicate=True),
+     Output('match-id-display', 'children', allow_duplicate=True),
+     Output('historique-table', 'data', allow_duplicate=True),
+     Output('resume-panel', 'open'),
+     Output('team-select', 'value')],
+    [Input('btn-resume-match', 'n_clicks'),
+     Input('url', 'search')],
+    [State('resume-match-select', 'value'),
+     State('match-state', 'data')],
+    prevent_initial_call='initial_duplicate' # Appel initial : reprise du match de l'URL après un rechargement
+)
+def resume_match(n_clicks, search, selected_match_id, current_state):
+    if dash.callback_context.triggered_id == 'btn-resume-match':
+        match_id = selected_match_id
+    else:
+        match_id = match_id_from_search(search)
+    if not match_id or match_id == current_state['match_id']:
+        raise dash.exceptions.PreventUpdate
+
+    with match_lock(match_id):
+        # Score, sets et historique relus depuis SQLite (ou la mémoire du worker) : quelques millisecondes
+        state = load_match_state({'match_id': match_id}) if SERVER_SIDE_STATE else rebuild_match_state(match_id)
+        state['temp_selected_pos'] = None
+        state['temp_selected_player'] = None
+        state['table_version'] = state['db_version'] # Historique renvoyé en entier ci-dessous
+        histo_table = historique_table_data(get_score_engine(state))
+
+        if state['sets_veec'] >= SETS_POUR_GAGNER or state['sets_adverse'] >= SETS_POUR_GAGNER:
+            current_set_out = "MATCH TERMINÉ !"
+        else:
+            current_set_out = f"Set en cours : {state['current_set']}"
+        store_out = save_match_state(state)
+    return (
+        store_out,
+        str(state['score_veec']),
+        str(state['score_adverse']),
+        f"Sets: {state['sets_veec']}",
+        f"Sets: {state['sets_adverse']}",
+        current_set_out,
+        match_id_children(match_id),
+        histo_table,
+        False,
+        state['team_id']
+    )
+
+@app.callback(
+    Output('resume-match-select', 'options'),
+    [Input('resume-panel', 'open')],
+    prevent_initial_call=True
+)
+def update_resume_options(is_open):
+    """Liste des matchs non terminés, lue à l'ouverture du panneau (aucune requête au chargement de la page)."""
+    if not is_open:
+        raise dash.exceptions.PreventUpdate
+    return [{'label': resume_label(match), 'value': match['match_id']} for match in fetch_unfinished_matches()]
+
+# L'URL suit le match affiché (nouveau match, reprise, première saisie) : un rechargement reprend ce match
+app.clientside_callback(
+    """
+    function(state, search) {
+        if (!state || !state.match_id) {
+            return window.dash_clientside.no_update;
+        }
+        var wanted = '?match=' + encodeURIComponent(state.match_id);
+        return search === wanted ? window.dash_clientside.no_update : wanted;
+    }
+    """,
+    Output('url', 'search'),
+    [Input('match-state', 'data')],
+    [State('url', 'search')],
+    prevent_initial_call=True
+)
+
+# 5 ter. Équipe du match : effectif de la modale joueur et des filtres, lu dans le cache des effectifs
+@app.callback(
+    [Output('match-state', 'data', allow_duplicate=True),
+     Output('player-buttons', 'children'),
+     Output('roster-store', 'data'),
+     Output('heatmap-player-filter', 'options')],
+    [Input('team-select', 'value'),
+     Input('team-select', 'options')], # Effectif modifié dans la page /effectifs
+    [State('match-state', 'data')],
+    prevent_initial_call=True
+)
+def select_team(team_id, team_options_value, current_state):
+    if team_id is None:
+        raise dash.exceptions.PreventUpdate
+    roster.refresh()
+    team = roster.team(team_id)
+    store_out = dash.no_update
+    with match_lock(current_state['match_id']):
+        state = load_match_state(current_state)
+        if state['team_id'] != team.id:
+            assign_match_team(state, team.id)
+            store_out = save_match_state(state)
+    return store_out, player_buttons(team), roster_store_data(team), player_options(team.players)
+
 # 6. Callback d'Annulation de la Dernière Action
 @app.callback(
     [Output('match-state', 'data', allow_duplicate=True),
-     Output('historique-display', 'children', allow_duplicate=True),
+     Output('historique-table', 'data', allow_duplicate=True),
      Output('score-veec-display', 'children', allow_duplicate=True),
      Output('score-adverse-display', 'children', allow_duplicate=True),
      Output('sets-veec-display', 'children', allow_duplicate=True),
@@ -653,91 +1683,64 @@ def handle_undo(n_clicks, current_state):
     if n_clicks is None or n_clicks == 0:
         return dash.no_update
     
-    new_state = copy.deepcopy(current_state)
-    match_id = new_state.get('match_id')
-
-    if not new_state['historique_stats']:
-        # Rien à annuler dans l'état Dash
-        return dash.no_update
-        
-    # --- 1. Suppression de la dernière entrée SQLite ---
-    deleted_data = delete_last_stat_and_get_data(match_id)
-    
-    # --- 2. Suppression de la dernière entrée dans l'état Dash ---
-    removed_entry = new_state['historique_stats'].pop(0) # Le plus récent est à l'index 0
-    
-    if not deleted_data:
-        # Aucune donnée supprimée dans la DB (ça ne devrait pas arriver si l'historique Dash n'est pas vide)
-        return dash.no_update 
-    
-    action_code = removed_entry['action']
-
-    # --- 3. Correction de la Logique de Score et de Set ---
-    
-    # CAS A : Annuler la FIN de MATCH
-    if action_code == 'FIN_MATCH':
-        # On supprime le flag de fin de match, mais l'action précédente est FIN_SET, qui sera traitée après
-        
-        # On continue la boucle pour traiter l'action FIN_SET qui est maintenant la dernière entrée de l'historique
-        if new_state['historique_stats'][0]['action'] == 'FIN_SET':
-            removed_entry = new_state['historique_stats'].pop(0)
-            action_code = removed_entry['action']
-            delete_last_stat_and_get_data(match_id) # Supprime le FIN_SET de la DB
-
-    # CAS B : Annuler la FIN de SET
-    if action_code == 'FIN_SET':
-        # La ligne FIN_SET contient le score final du set (ex: 25-23). 
-        # L'action précédente dans l'historique est le point gagnant du set.
-        
-        # Récupérer le score du set précédent (avant le point gagnant) à partir de l'entrée précédente
-        score_set_precedent_str = removed_entry['score'] # score au moment du point gagnant
-        score_veec_final, score_adverse_final = map(int, score_set_precedent_str.split('-'))
+    with match_lock(current_state['match_id']):
+        new_state = load_match_state(current_state)
+        stale_table = stale_display(new_state)
+        if stale_table and not CLIENTSIDE_MODE:
+            # Affichage antérieur à la dernière écriture du match : la dernière action n'est pas celle que l'utilisateur
+            # voit, l'annulation est refusée et l'onglet rechargé. En mode clientside, les saisies de l'onglet sont
+            # ingérées en arrière-plan sans suivre la version : l'historique est seulement renvoyé en entier.
+            store_out, histo_table = reload_display(new_state)
+            return (store_out, histo_table, *score_display(new_state))
+        match_id = new_state.get('match_id')
+        engine = get_score_engine(new_state)
+        historique_len_avant = historique_length(engine)
+
+        if not len(engine):
+            # Rien à annuler dans l'état Dash
+            return dash.no_update
         
-        # On revient au set précédent
-        new_state['current_set'] -= 1
-        
-        # On décrémente le compteur de sets gagnés
-        if removed_entry['joueur'] == 'VEEC':
-            new_state['sets_veec'] -= 1
+        try:
+            # --- 1. Suppression de la dernière entrée SQLite ---
+            deleted_data = delete_last_stat_and_get_data(match_id)
+
+            if not deleted_data:
+                # Aucune donnée supprimée dans la DB (ça ne devrait pas arriver si l'historique Dash n'est pas vide)
+                return dash.no_update
+
+            # --- 2. Correction du score et des sets ---
+            # Le moteur rejoue le set depuis son début : annuler le point gagnant d'un set (ou du match)
+            # rouvre ce set et retire la ligne FIN_SET / FIN_MATCH correspondante.
+            undo_last_stat(new_state)
+            reloaded = confirm_match_write(new_state) or stale_table
+        except Exception:
+            # Suppression et état en mémoire peuvent ne plus concorder : l'état sera reconstruit depuis SQLite
+            forget_match_state(match_id)
+            raise
+
+        # --- 3. Mise à jour de l'affichage (similaire à process_stat_entry) ---
+
+        if reloaded:
+            histo_table = historique_table_data(get_score_engine(new_state))
         else:
-            new_state['sets_adverse'] -= 1
-            
-        # On charge le score qui était en cours juste avant la fin du set
-        new_state['score_veec'] = score_veec_final
-        new_state['score_adverse'] = score_adverse_final
-        
-        # L'action du point gagnant doit maintenant être annulée par la logique suivante (CAS C)
-        
-    # CAS C : Annuler un point/erreur régulier
-    
-    # Si on n'est pas en train d'annuler une FIN_SET/MATCH, on annule un point/erreur simple
-    if action_code != 'FIN_SET' and action_code != 'FIN_MATCH':
-        if '_ACE' in action_code or '_POINT' in action_code:
-            new_state['score_veec'] -= 1
-        elif '_ERR' in action_code:
-            new_state['score_adverse'] -= 1
-            
-        # Protection contre un score négatif (si on annule le score 0-0)
-        new_state['score_veec'] = max(0, new_state['score_veec'])
-        new_state['score_adverse'] = max(0, new_state['score_adverse'])
-
-
-    # --- 4. Mise à jour de l'affichage (similaire à process_stat_entry) ---
+            engine = get_score_engine(new_state)
+            histo_table = patch_historique_table(engine, removed=historique_len_avant - historique_length(engine))
+        new_state['table_version'] = new_state['db_version']
     
-    histo_table = create_historique_table(new_state['historique_stats'])
+        score_veec_out = str(new_state['score_veec'])
+        score_adverse_out = str(new_state['score_adverse'])
+        sets_veec_out = f"Sets: {new_state['sets_veec']}"
+        sets_adverse_out = f"Sets: {new_state['sets_adverse']}"
     
-    score_veec_out = str(new_state['score_veec'])
-    score_adverse_out = str(new_state['score_adverse'])
-    sets_veec_out = f"Sets: {new_state['sets_veec']}"
-    sets_adverse_out = f"Sets: {new_state['sets_adverse']}"
-    
-    if new_state.get('sets_veec', 0) >= 3 or new_state.get('sets_adverse', 0) >= 3:
-        current_set_out = "MATCH TERMINÉ !"
-    else:
-        current_set_out = f"Set en cours : {new_state['current_set']}"
+        if new_state.get('sets_veec', 0) >= SETS_POUR_GAGNER or new_state.get('sets_adverse', 0) >= SETS_POUR_GAGNER:
+            current_set_out = "MATCH TERMINÉ !"
+        else:
+            current_set_out = f"Set en cours : {new_state['current_set']}"
 
+        store_out = save_match_state(new_state)
+        publish_live(new_state)
     return (
-        new_state, 
+        store_out, 
         histo_table, 
         score_veec_out, 
         score_adverse_out, 
@@ -747,5 +1750,238 @@ def handle_undo(n_clicks, current_state):
     )
 
 
+# 7. Historique complet paginé (requêtes SQL à la demande)
+@app.callback(
+    [Output('historique-complet-table', 'data'),
+     Output('historique-complet-table', 'page_count')],
+    [Input('historique-complet-table', 'page_current'),
+     Input('historique-complet-table', 'page_size'),
+     Input('historique-complet-table', 'sort_by'),
+     Input('historique-complet-table', 'filter_query'),
+     Input('historique-complet', 'open'),
+     Input('match-state', 'data')],
+    prevent_initial_call=True
+)
+def update_historique_complet(page_current, page_size, sort_by, filter_query, is_open, current_state):
+    # Tant que le panneau est replié, les saisies ne déclenchent aucune requête
+    if not is_open:
+        raise dash.exceptions.PreventUpdate
+
+    page_current = page_current or 0
+    rows, total = fetch_stats_page(
+        current_state['match_id'],
+        filters=parse_filter_query(filter_query),
+        sort_by=[(s['column_id'], s['direction']) for s in (sort_by or []) if s['column_id'] in HISTORIQUE_SQL_COLUMNS],
+        offset=page_current * page_size,
+        limit=page_size
+    )
+    return rows, max(1, -(-total // page_size))
+
+
+# 8. Statistiques en direct (tables d'agrégats mises à jour dans la transaction de chaque saisie / annulation)
+@app.callback(
+    Output('stats-table', 'data'),
+    [Input('stats-panel', 'open'),
+     Input('stats-set-filter', 'value'),
+     Input('match-state', 'data')],
+    prevent_initial_call=True
+)
+def update_stats_panel(is_open, set_filter, current_state):
+    if not is_open:
+        raise dash.exceptions.PreventUpdate
+    return player_stats_rows(fetch_player_aggregates(current_state['match_id'], set_filter or None))
+
+
+# 9. Carte de chaleur des zones (Patch des marqueurs, sans renvoyer la figure)
+@app.callback(
+    Output('terrain-graph-simple', 'figure'),
+    [Input('heatmap-mode', 'value'),
+     Input('heatmap-player-filter', 'value'),
+     Input('heatmap-category-filter', 'value'),
+     Input('match-state', 'data')],
+    prevent_initial_call=True
+)
+def update_court_heatmap(mode, joueur_nom, action_category, current_state):
+    ctx = dash.callback_context
+    triggered_id = ctx.triggered[0]['prop_id'] if ctx.triggered else ''
+    if mode not in ('reussite', 'erreurs') and not triggered_id.startswith('heatmap-mode'):
+        # Carte désactivée : les saisies et les filtres ne touchent pas à la figure
+        raise dash.exceptions.PreventUpdate
+    aggregates = fetch_position_aggregates(current_state['match_id'], joueur_nom=joueur_nom,
+                                           action_category=action_category) if mode in ('reussite', 'erreurs') else []
+    return patch_court_heatmap(mode, aggregates)
+
+
+# 10. Navigation : saisie, analyse de saison et effectifs sont trois pages du même layout
+@app.callback(
+    [Output('page-saisie', 'style'),
+     Output('page-analyse', 'style'),
+     Output('page-effectifs', 'style')],
+    [Input('url', 'pathname')]
+)
+def display_page(pathname):
+    pages = {ANALYSE_PATH: 1, ROSTER_PATH: 2}
+    shown = pages.get(pathname, 0)
+    return tuple({'display': 'block' if index == shown else 'none'} for index in range(3))
+
+# 11. Analyse de saison (regroupements et fenêtre glissante vectorisés sur le cache en colonnes)
+@app.callback(
+    [Output('analyse-table', 'data'),
+     Output('analyse-table', 'columns'),
+     Output('analyse-rolling-graph', 'figure'),
+     Output('analyse-status', 'children')],
+    [Input('url', 'pathname'),
+     Input('btn-analyse-refresh', 'n_clicks'),
+     Input('analyse-group-by', 'value'),
+     Input('analyse-player-filter', 'value'),
+     Input('analyse-category-filter', 'value'),
+     Input('analyse-position-filter', 'value'),
+     Input('analyse-last-matches', 'value'),
+     Input('analyse-window', 'value')]
+)
+def update_analyse(pathname, n_refresh, group_by, joueur, category, position, last_matches, window):
+    if pathname != ANALYSE_PATH:
+        raise dash.exceptions.PreventUpdate
+
+    ctx = dash.callback_context
+    triggered_id = ctx.triggered[0]['prop_id'] if ctx.triggered else ''
+    if triggered_id.startswith(('url', 'btn-analyse-refresh')) or not ctx.triggered:
+        analytics.refresh() # Copie incrémentale des actions ajoutées depuis le dernier passage
+
+    filters = {'joueur': joueur, 'category': category, 'position': position, 'last_matches': last_matches or None}
+    group_by = group_by or ['joueur']
+    window = window or 5
+    grouped = analytics.group_stats(by=group_by, **filters)
+    per_match = analytics.rolling_efficiency(window=window, **filters)
+
+    columns = [{"name": analytics.GROUP_BY_COLUMNS[c], "id": c} for c in group_by] + [
+        {"name": "Actions", "id": 'actions', "type": 'numeric'},
+        {"name": "Positifs", "id": 'positifs', "type": 'numeric'},
+        {"name": "Erreurs", "id": 'erreurs', "type": 'numeric'},
+        {"name": "Efficacité (%)", "id": 'efficacite', "type": 'numeric'},
+    ]
+    frame = analytics.season_frame()
+    status = f"{frame['match'].cat.categories.size} match(s), {len(frame)} action(s) dans la base"
+    return grouped.astype({c: str for c in group_by if c != 'set_num'}).to_dict('records'), columns, create_rolling_figure(per_match, window), status
+
+
+# 12. Lien d'export (l'URL suit la portée, le format et le match en cours ; le téléchargement est servi par Flask)
+@app.callback(
+    [Output('export-link', 'href'),
+     Output('export-set', 'disabled'),
+     Output('export-dates', 'disabled')],
+    [Input('export-scope', 'value'),
+     Input('export-set', 'value'),
+     Input('export-dates', 'start_date'),
+     Input('export-dates', 'end_date'),
+     Input('export-format', 'value'),
+     Input('match-state', 'data')]
+)
+def update_export_link(scope, set_num, start_date, end_date, fmt, current_state):
+    query = export_query(scope, current_state['match_id'], set_num, start_date, end_date)
+    href = f"{EXPORT_PATH}/{fmt}"
+    if query:
+        href += '?' + urllib.parse.urlencode(query)
+    return href, scope != 'set', scope != 'saison'
+
+@app.callback(
+    Output('export-status-output', 'children'),
+    [Input('export-link', 'n_clicks')],
+    [State('export-scope', 'value'),
+     State('export-set', 'value'),
+     State('export-dates', 'start_date'),
+     State('export-dates', 'end_date'),
+     State('export-format', 'value'),
+     State('match-state', 'data')],
+    prevent_initial_call=True
+)
+def update_export_status(n_clicks, scope, set_num, start_date, end_date, fmt, current_state):
+    query = export_query(scope, current_state['match_id'], set_num, start_date, end_date)
+    filename = export_filename(fmt, query.get('match_id'), query.get('set'),
+                               parse_export_date(query.get('from')), parse_export_date(query.get('to')))
+    return f"📥 Téléchargement de {filename} lancé (fichier produit au fil de la lecture de la base)."
+
+# 13. Panneau de mesures (VEEC_METRICS_OVERLAY=1) : durées récentes des callbacks dans ce worker
+if METRICS_OVERLAY:
+    @app.callback(
+        Output('metrics-overlay', 'children'),
+        [Input('metrics-overlay-interval', 'n_intervals')]
+    )
+    def update_metrics_overlay(n_intervals):
+        lines = [f"{name:24} dernier {last * 1000:7.1f} ms  p50 {p50 * 1000:6.1f}  p99 {p99 * 1000:6.1f}  (n={count})"
+                 for name, (last, p50, p99, count) in sorted(metrics.recent_callback_summary().items())]
+        return '\n'.join(lines) or "Aucun callback mesuré"
+
+# 14. Édition des effectifs (page /effectifs) : chaque enregistrement invalide le cache des effectifs
+@app.callback(
+    [Output('roster-edit-table', 'data'),
+     Output('roster-edit-team', 'options'),
+     Output('roster-edit-team', 'value'),
+     Output('roster-edit-status', 'children'),
+     Output('team-select', 'options')],
+    [Input('roster-edit-team', 'value'),
+     Input('btn-roster-add-player', 'n_clicks'),
+     Input('btn-roster-save', 'n_clicks'),
+     Input('btn-roster-create-team', 'n_clicks')],
+    [State('roster-edit-table', 'data'),
+     State('roster-new-team', 'value')],
+    prevent_initial_call=True
+)
+def edit_roster(team_id, n_add, n_save, n_create, rows, new_team_name):
+    trigger = dash.callback_context.triggered_id
+    if trigger == 'btn-roster-add-player':
+        return (rows or []) + [{'id': None, 'numero': None, 'nom': ''}], dash.no_update, dash.no_update, "", dash.no_update
+    try:
+        if trigger == 'btn-roster-create-team':
+            team_id = roster.create_team(new_team_name)
+            status = f"Équipe « {roster.team(team_id).nom} » créée : ajoutez ses joueurs puis enregistrez."
+        elif trigger == 'btn-roster-save':
+            roster.save_team_players(team_id, rows or [])
+            status = f"Effectif enregistré ({len(roster.team(team_id).players)} joueur(s))."
+        else:
+            roster.refresh()
+            return roster_table_data(roster.team(team_id)), dash.no_update, dash.no_update, "", dash.no_update
+    except ValueError as e:
+        return dash.no_update, dash.no_update, dash.no_update, f"Non enregistré : {e}", dash.no_update
+    options = team_options()
+    return (roster_table_data(roster.team(team_id)), options, team_id if trigger == 'btn-roster-create-team' else dash.no_update,
+            status, options)
+
+@app.server.route('/metrics')
+def metrics_endpoint():
+    """Compteurs et histogrammes au format texte Prometheus (tous les workers si VEEC_METRICS_DIR est défini)."""
+    return flask.Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# --- FABRIQUE DE L'APPLICATION ---
+# L'import du module ne fait que déclarer le layout et les callbacks ; tout ce qui touche la base ou prépare
+# les réponses est fait ici, une seule fois. Avec gunicorn (preload_app), create_server() s'exécute dans le
+# processus maître avant le fork : les workers démarrent avec l'application déjà importée et prête.
+
+_app_ready = False
+
+def create_app():
+    """Prépare l'application (migrations, layout statique, mesures, compression) et la retourne. Idempotent."""
+    global _app_ready
+    if _app_ready:
+        return app
+    init_db()
+    layout_json_template(roster.version())
+    close_all_connections() # Aucune connexion SQLite ne doit être héritée par les workers après le fork
+
+    # Mesures : chaque callback serveur (déjà tous déclarés) et chaque requête HTTP
+    metrics.instrument_dash_callbacks(app)
+    metrics.instrument_flask(app.server)
+    # Archivage et maintenance SQLite dans un thread de fond, démarré par la première requête de chaque worker
+    app.server.before_request(archive.ensure_maintenance)
+    # Après les mesures : Flask exécute les after_request en ordre inverse, /metrics voit ainsi les octets compressés
+    Compress(app.server)
+    _app_ready = True
+    return app
+
+def create_server():
+    """Application WSGI pour le mode production : gunicorn -c gunicorn.conf.py 'app:create_server()'."""
+    return create_app().server
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=8051)
+    # Serveur de développement Flask ; VEEC_DEBUG=1 active le rechargement automatique et le débogueur
+    create_app().run(debug=DEBUG, host='0.0.0.0', port=PORT)
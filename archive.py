@@ -0,0 +1,411 @@
+"""
+Archivage des matchs terminés et maintenance de la base (plusieurs saisons dans un seul fichier SQLite).
+
+Un match terminé depuis plus de VEEC_ARCHIVE_AFTER_DAYS jours quitte la table 'actions' : ses lignes sont
+écrites, compressées (zlib, colonnes JSON), dans un fichier SQLite par saison (VEEC_ARCHIVE_DIR/saison_AAAA-AAAA.db).
+Son résumé reste dans la base principale : ligne de 'matches' (version, sets, statut, saison d'archive, bornes d'id),
+fins de set et agrégats par joueur et par position. Les triggers de 'actions' sont suspendus pendant la suppression :
+ni la version du match, ni ses agrégats, ni le journal des suppressions ne bougent.
+
+Les lectures qui doivent voir toute la saison passent par ce module (mêmes noms que dans database.py) :
+la base principale dit quels matchs sont archivés et dans quel fichier, et les lignes archivées sont relues
+dans une table 'actions' en mémoire, interrogée avec les requêtes de database.py. Le fichier d'archive est écrit
+avant la suppression dans la base principale : un lecteur ne trouve jamais un match dans aucune des deux.
+
+La maintenance (archivage, ANALYZE, VACUUM incrémental, checkpoint du WAL) tourne dans un thread de fond,
+jamais pendant une requête ; un verrou de fichier garantit qu'un seul worker l'exécute à la fois.
+
+Ligne de commande : python archive.py [--jours 60] [--sans-archivage]
+"""
+import argparse
+import fcntl
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from contextlib import closing, contextmanager, ExitStack
+from urllib.request import pathname2url
+
+import metrics
+import database
+from database import DB_NAME, get_connection, transaction, match_lock, fetch_match_version, actions_schema_suspended
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('VEEC_ARCHIVE_AFTER_DAYS', '60')) # 0 : pas d'archivage
+ARCHIVE_DIR = os.environ.get('VEEC_ARCHIVE_DIR') or os.path.join(os.path.dirname(os.path.abspath(DB_NAME)), 'archives')
+MAINTENANCE_INTERVAL = int(os.environ.get('VEEC_MAINTENANCE_INTERVAL', '3600')) # secondes ; 0 : pas de thread de maintenance
+MAINTENANCE_FIRST_DELAY = 60 # Premier passage après le démarrage du worker (hors du pic des premières requêtes)
+ARCHIVE_BATCH = 50 # Matchs archivés par transaction (le verrou d'écriture reste court)
+VACUUM_PAGES = 2000 # Pages libres rendues au système par passage
+QUIET_MINUTES = 30 # Conversion au VACUUM incrémental seulement si aucun match n'a été modifié depuis
+SEASON_START_MONTH = 8 # Une saison va d'août à juillet
+
+# Colonnes de 'actions' conservées dans l'archive, dans l'ordre des listes du payload
+ARCHIVED_COLUMNS = ('id', 'set_num', 'timestamp', 'score_veec', 'score_adverse', 'position', 'joueur_nom',
+                    'action_category', 'action_result', 'client_uuid', 'client_seq', 'joueur_id')
+
+MATCH_DATE_PATTERN = re.compile(r'^Match_(\d{4})(\d{2})\d{2}_')
+
+# --- REQUÊTES ---
+
+SQL_CREATE_ARCHIVE = """
+    CREATE TABLE IF NOT EXISTS archived_matches (
+        match_id TEXT PRIMARY KEY,
+        action_count INTEGER NOT NULL,
+        first_action_id INTEGER NOT NULL,
+        last_action_id INTEGER NOT NULL,
+        archived_at TEXT NOT NULL DEFAULT (datetime('now')),
+        payload BLOB NOT NULL
+    )
+"""
+
+# Table 'actions' d'un match archivé, recréée en mémoire pour les requêtes de database.py
+SQL_CREATE_MEMORY_ACTIONS = """
+    CREATE TABLE actions (
+        id INTEGER PRIMARY KEY,
+        match_id TEXT NOT NULL,
+        set_num INTEGER NOT NULL,
+        timestamp TEXT NOT NULL,
+        score_veec INTEGER NOT NULL,
+        score_adverse INTEGER NOT NULL,
+        position TEXT NOT NULL,
+        joueur_nom TEXT NOT NULL,
+        action_category TEXT NOT NULL,
+        action_result TEXT NOT NULL,
+        client_uuid TEXT,
+        client_seq INTEGER,
+        joueur_id INTEGER
+    )
+"""
+
+SQL_SELECT_MATCH_ROWS = f"SELECT {', '.join(ARCHIVED_COLUMNS)} FROM actions WHERE match_id = ? ORDER BY id"
+
+# Matchs terminés, non modifiés depuis N jours, ayant encore des lignes dans 'actions' (index (status, updated_at))
+SQL_SELECT_ARCHIVE_CANDIDATES = """
+    SELECT m.match_id, m.version, m.updated_at, m.archive, m.last_action_id
+    FROM matches m
+    WHERE m.status = 'termine' AND m.updated_at < datetime('now', ?)
+      AND EXISTS (SELECT 1 FROM actions a WHERE a.match_id = m.match_id)
+    ORDER BY m.updated_at
+    LIMIT ?
+"""
+
+SQL_MARK_ARCHIVED = """
+    UPDATE matches SET archive = ?, archived_at = datetime('now'), action_count = ?, first_action_id = ?, last_action_id = ?
+    WHERE match_id = ?
+"""
+
+SQL_SELECT_ARCHIVED_SINCE = """
+    SELECT match_id, archive, last_action_id FROM matches
+    WHERE archive IS NOT NULL AND last_action_id > ?
+    ORDER BY first_action_id
+"""
+
+# --- SAISONS ET FICHIERS D'ARCHIVE ---
+
+def season_of(match_id, updated_at=None):
+    """Saison 'AAAA-AAAA' d'un match, d'après la date de son identifiant (sinon de sa dernière modification)."""
+    found = MATCH_DATE_PATTERN.match(match_id)
+    year, month = (int(found.group(1)), int(found.group(2))) if found else (int(updated_at[:4]), int(updated_at[5:7]))
+    start = year if month >= SEASON_START_MONTH else year - 1
+    return f"{start}-{start + 1}"
+
+def archive_path(season):
+    return os.path.join(ARCHIVE_DIR, f"saison_{season}.db")
+
+def _open_archive(season):
+    """Fichier d'archive en lecture seule (erreur s'il n'existe pas : la base principale le référence)."""
+    return sqlite3.connect(f"file:{pathname2url(archive_path(season))}?mode=ro", uri=True)
+
+def _write_archives(season, entries):
+    """Écrit (ou remplace) les matchs d'une saison dans son fichier d'archive, en une transaction."""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with closing(sqlite3.connect(archive_path(season), isolation_level=None)) as conn:
+        conn.execute("PRAGMA synchronous=FULL") # Sur disque avant la suppression dans la base principale
+        conn.execute(SQL_CREATE_ARCHIVE)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("""
+            INSERT OR REPLACE INTO archived_matches (match_id, action_count, first_action_id, last_action_id, payload)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(match_id, len(rows), rows[0][0], rows[-1][0], encode_payload(rows)) for match_id, rows in entries])
+        conn.execute("COMMIT")
+
+def encode_payload(rows):
+    """Lignes (dans l'ordre de ARCHIVED_COLUMNS, triées par id) -> colonnes JSON compressées ; id en écarts successifs."""
+    columns = {column: list(values) for column, values in zip(ARCHIVED_COLUMNS, zip(*rows))}
+    ids = columns['id']
+    columns['id'] = [ids[0]] + [b - a for a, b in zip(ids, ids[1:])]
+    return zlib.compress(json.dumps(columns, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 9)
+
+def decode_payload(payload):
+    columns = json.loads(zlib.decompress(payload))
+    ids, last = [], 0
+    for delta in columns['id']:
+        last += delta
+        ids.append(last)
+    columns['id'] = ids
+    if 'joueur_id' not in columns: # Archivé avant les effectifs en base
+        columns['joueur_id'] = [None] * len(ids)
+    return list(zip(*(columns[column] for column in ARCHIVED_COLUMNS)))
+
+def _archived_rows(season, match_id, last_action_id):
+    """
+    Lignes archivées d'un match. Seules celles d'id <= last_action_id (borne enregistrée dans la base principale)
+    comptent : un archivage interrompu après l'écriture du fichier y a pu laisser des lignes encore dans 'actions'.
+    """
+    with closing(_open_archive(season)) as conn:
+        row = conn.execute("SELECT payload FROM archived_matches WHERE match_id = ?", (match_id,)).fetchone()
+    if row is None:
+        raise LookupError(f"{match_id} absent de l'archive {archive_path(season)}")
+    return [values for values in decode_payload(row[0]) if values[0] <= last_action_id]
+
+def _match_rows(conn, match_id, season, last_action_id):
+    """Toutes les lignes d'un match : archivées puis encore dans 'actions' (import après archivage), par id."""
+    archived = _archived_rows(season, match_id, last_action_id) if season else []
+    return archived + [tuple(row) for row in conn.execute(SQL_SELECT_MATCH_ROWS, (match_id,))]
+
+def _memory_actions(match_id, rows):
+    """Base en mémoire avec une table 'actions' contenant les lignes données (requêtes de database.py)."""
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute(SQL_CREATE_MEMORY_ACTIONS)
+    conn.executemany(f"""
+        INSERT INTO actions (match_id, {', '.join(ARCHIVED_COLUMNS)}) VALUES (?, {', '.join('?' * len(ARCHIVED_COLUMNS))})
+    """, [(match_id, *values) for values in rows])
+    return conn
+
+# --- LECTURES (base principale + archives) ---
+
+@contextmanager
+def _read_snapshot():
+    """Transaction de lecture : la liste des matchs archivés et les lignes de 'actions' viennent du même instantané."""
+    with get_connection() as conn:
+        conn.execute("BEGIN")
+        yield conn # get_connection() termine la transaction
+
+@contextmanager
+def _match_connection(match_id):
+    """Connexion où lire les actions d'un match : la base principale, ou une copie en mémoire si le match est archivé."""
+    with _read_snapshot() as conn:
+        row = conn.execute("SELECT archive, last_action_id FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+        if row is None or row['archive'] is None:
+            yield conn
+            return
+        rows = _match_rows(conn, match_id, row['archive'], row['last_action_id'])
+    with closing(_memory_actions(match_id, rows)) as memory:
+        yield memory
+
+def _rebatched(batches, batch_size):
+    """Regroupe les petits paquets (un par match archivé) en paquets d'environ batch_size lignes."""
+    pending = []
+    for rows in batches:
+        pending.extend(rows)
+        if len(pending) >= batch_size:
+            yield pending
+            pending = []
+    if pending:
+        yield pending
+
+def fetch_all_stats(match_id):
+    """Comme database.fetch_all_stats, match archivé compris."""
+    with _match_connection(match_id) as conn:
+        return database.fetch_all_stats(match_id, conn=conn)
+
+def fetch_stats_page(match_id, filters=(), sort_by=(), offset=0, limit=25):
+    """Comme database.fetch_stats_page, match archivé compris."""
+    with _match_connection(match_id) as conn:
+        return database.fetch_stats_page(match_id, filters, sort_by, offset, limit, conn=conn)
+
+def iter_actions_since(last_id, batch_size=10000):
+    """
+    Comme database.iter_actions_since, archives comprises : les lignes archivées d'id > last_id (matchs dans
+    l'ordre de leur première action) puis celles de 'actions'. Les id ne sont donc croissants que par match.
+    """
+    def batches():
+        with _read_snapshot() as conn:
+            for match in conn.execute(SQL_SELECT_ARCHIVED_SINCE, (last_id,)).fetchall():
+                rows = _archived_rows(match['archive'], match['match_id'], match['last_action_id'])
+                with closing(_memory_actions(match['match_id'], rows)) as memory:
+                    yield from database.iter_actions_since(last_id, batch_size, conn=memory)
+            yield from database.iter_actions_since(last_id, batch_size, conn=conn)
+    return _rebatched(batches(), batch_size)
+
+def iter_actions(match_id=None, set_num=None, date_from=None, date_to=None, batch_size=5000):
+    """Comme database.iter_actions (mêmes filtres), archives comprises : matchs archivés d'abord, puis 'actions'."""
+    where, params = ["archive IS NOT NULL"], []
+    if match_id:
+        where.append("match_id = ?")
+        params.append(match_id)
+    if date_from:
+        where.append("substr(match_id, 7, 8) >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("substr(match_id, 7, 8) <= ?")
+        params.append(date_to)
+
+    def batches():
+        with _read_snapshot() as conn:
+            archived = conn.execute(f"""
+                SELECT match_id, archive, last_action_id FROM matches WHERE {' AND '.join(where)} ORDER BY first_action_id
+            """, params).fetchall()
+            for match in archived:
+                rows = _archived_rows(match['archive'], match['match_id'], match['last_action_id'])
+                with closing(_memory_actions(match['match_id'], rows)) as memory:
+                    yield from database.iter_actions(match['match_id'], set_num, batch_size=batch_size, conn=memory)
+            yield from database.iter_actions(match_id, set_num, date_from, date_to, batch_size, conn=conn)
+    return _rebatched(batches(), batch_size)
+
+# --- ARCHIVAGE ---
+
+def archive_finished_matches(older_than_days=None, limit=ARCHIVE_BATCH):
+    """
+    Archive jusqu'à 'limit' matchs terminés et non modifiés depuis older_than_days jours ; retourne leurs identifiants.
+    Un match modifié entre la lecture et la suppression (version changée) est laissé pour le passage suivant.
+    """
+    older_than_days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    with _read_snapshot() as conn:
+        candidates = conn.execute(SQL_SELECT_ARCHIVE_CANDIDATES, (f"-{older_than_days} days", limit)).fetchall()
+        pending = {}
+        for match in candidates:
+            # Déjà archivé (lignes importées depuis) : le nouveau contenu réunit l'archive et les lignes de 'actions'
+            season = match['archive'] or season_of(match['match_id'], match['updated_at'])
+            rows = _match_rows(conn, match['match_id'], match['archive'], match['last_action_id'])
+            pending[match['match_id']] = (season, match['version'], rows)
+    if not pending:
+        return []
+
+    # 1. Fichiers d'archive (une transaction par saison)
+    by_season = {}
+    for match_id, (season, _, rows) in pending.items():
+        by_season.setdefault(season, []).append((match_id, rows))
+    for season, entries in by_season.items():
+        _write_archives(season, entries)
+
+    # 2. Base principale : suppression des lignes sans déclencher les triggers, résumé dans 'matches'
+    archived = []
+    with ExitStack() as locks:
+        for match_id in sorted(pending):
+            locks.enter_context(match_lock(match_id))
+        with transaction() as conn, actions_schema_suspended(conn):
+            for match_id, (season, version, rows) in pending.items():
+                if fetch_match_version(match_id, conn) != version:
+                    continue
+                conn.execute("DELETE FROM actions WHERE match_id = ?", (match_id,))
+                conn.execute(SQL_MARK_ARCHIVED, (season, len(rows), rows[0][0], rows[-1][0], match_id))
+                archived.append(match_id)
+    metrics.ARCHIVED_MATCHES.inc(len(archived))
+    return archived
+
+# --- MAINTENANCE ---
+
+@contextmanager
+def _maintenance_lock():
+    """Verrou de fichier non bloquant : True si ce processus exécute la maintenance, False si un autre s'en charge."""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with open(os.path.join(ARCHIVE_DIR, '.maintenance.lock'), 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def run_maintenance(archive=True, older_than_days=None):
+    """
+    Un passage de maintenance : archivage (par lots jusqu'à épuisement), statistiques de l'optimiseur, pages libres
+    rendues au système, checkpoint du WAL. Retourne un compte rendu, ou None si un autre processus est en cours.
+    """
+    with _maintenance_lock() as acquired:
+        if not acquired:
+            return None
+        report = {'archives': 0, 'pages_liberees': 0, 'vacuum_complet': False}
+
+        if archive and (ARCHIVE_AFTER_DAYS or older_than_days is not None):
+            with metrics.MAINTENANCE_SECONDS.time(task='archivage'):
+                while True:
+                    archived = archive_finished_matches(older_than_days)
+                    report['archives'] += len(archived)
+                    if len(archived) < ARCHIVE_BATCH:
+                        break
+
+        with get_connection() as conn:
+            quiet = conn.execute("""
+                SELECT NOT EXISTS (SELECT 1 FROM matches WHERE updated_at > datetime('now', ?))
+            """, (f"-{QUIET_MINUTES} minutes",)).fetchone()[0]
+
+            with metrics.MAINTENANCE_SECONDS.time(task='analyze'):
+                conn.execute("PRAGMA analysis_limit=1000") # ANALYZE par échantillonnage : quelques millisecondes par index
+                conn.execute("ANALYZE")
+
+            with metrics.MAINTENANCE_SECONDS.time(task='vacuum'):
+                if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                    conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})").fetchall()
+                    report['pages_liberees'] = min(free_pages, VACUUM_PAGES)
+                elif quiet:
+                    # Base créée avant le VACUUM incrémental : conversion unique (réécrit tout le fichier)
+                    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                    conn.execute("VACUUM")
+                    report['vacuum_complet'] = True
+
+            with metrics.MAINTENANCE_SECONDS.time(task='checkpoint'):
+                # Hors saisie, le WAL est aussi ramené à zéro octet ; sinon checkpoint sans attendre personne
+                mode = 'TRUNCATE' if quiet else 'PASSIVE'
+                report['checkpoint'] = tuple(conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone())
+        return report
+
+def _run_maintenance_loop():
+    time.sleep(MAINTENANCE_FIRST_DELAY)
+    while True:
+        try:
+            report = run_maintenance()
+            if report and (report['archives'] or report['vacuum_complet']):
+                logger.info("Maintenance : %s", report)
+        except Exception:
+            logger.exception("Maintenance de la base interrompue")
+        time.sleep(MAINTENANCE_INTERVAL)
+
+_maintenance_thread = {'pid': None}
+_maintenance_thread_lock = threading.Lock()
+
+def ensure_maintenance():
+    """Démarre le thread de maintenance de ce worker (à la première requête : les threads ne survivent pas au fork)."""
+    if not MAINTENANCE_INTERVAL or _maintenance_thread['pid'] == os.getpid():
+        return
+    with _maintenance_thread_lock:
+        if _maintenance_thread['pid'] == os.getpid():
+            return
+        _maintenance_thread['pid'] = os.getpid()
+    threading.Thread(target=_run_maintenance_loop, name='veec-maintenance', daemon=True).start()
+
+# --- LIGNE DE COMMANDE ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archivage des matchs terminés et maintenance de la base VEEC.")
+    parser.add_argument('--jours', type=int, default=None,
+                        help=f"archive les matchs terminés depuis plus de N jours (défaut : {ARCHIVE_AFTER_DAYS})")
+    parser.add_argument('--sans-archivage', action='store_true', help="maintenance seule (ANALYZE, VACUUM, checkpoint)")
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    report = run_maintenance(archive=not args.sans_archivage, older_than_days=args.jours)
+    if report is None:
+        print("Maintenance déjà en cours dans un autre processus", file=sys.stderr)
+        return 1
+    print(f"{report['archives']} match(s) archivé(s), {report['pages_liberees']} page(s) libérée(s)"
+          f"{', VACUUM complet' if report['vacuum_complet'] else ''}, checkpoint {report['checkpoint']}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
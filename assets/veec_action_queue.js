@@ -0,0 +1,108 @@
+// File d'attente hors-ligne des actions validées dans le navigateur (mode clientside).
+// Chaque action porte un UUID et un numéro de séquence générés côté client ; la file est conservée
+// dans le localStorage et envoyée par lots à /api/actions/bulk, qui ignore les UUID déjà reçus.
+// Un rechargement de la page ou un retour du Wi-Fi rejoue donc la file sans double comptage.
+
+window.dash_clientside = window.dash_clientside || {};
+
+(function () {
+    var QUEUE_KEY = 'veec-action-queue';
+    var SEQ_KEY_PREFIX = 'veec-action-seq-';
+    var BULK_URL = '/api/actions/bulk';
+    var MAX_BATCH = 500;
+
+    var inFlight = null;
+
+    function load() {
+        try {
+            return JSON.parse(window.localStorage.getItem(QUEUE_KEY)) || [];
+        } catch (e) {
+            return [];
+        }
+    }
+
+    function save(queue) {
+        window.localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+    }
+
+    // crypto.randomUUID n'existe qu'en contexte sécurisé (https / localhost) : repli sur getRandomValues
+    function newUuid() {
+        if (window.crypto && window.crypto.randomUUID) {
+            return window.crypto.randomUUID();
+        }
+        var bytes = new Uint8Array(16);
+        window.crypto.getRandomValues(bytes);
+        bytes[6] = (bytes[6] & 0x0f) | 0x40;
+        bytes[8] = (bytes[8] & 0x3f) | 0x80;
+        var hex = Array.prototype.map.call(bytes, function (b) { return (b + 0x100).toString(16).slice(1); }).join('');
+        return hex.slice(0, 8) + '-' + hex.slice(8, 12) + '-' + hex.slice(12, 16) + '-' + hex.slice(16, 20) + '-' + hex.slice(20);
+    }
+
+    function nextSeq(matchId) {
+        var key = SEQ_KEY_PREFIX + matchId;
+        var seq = (parseInt(window.localStorage.getItem(key), 10) || 0) + 1;
+        window.localStorage.setItem(key, String(seq));
+        return seq;
+    }
+
+    function enqueue(action) {
+        var queue = load();
+        if (!queue.some(function (a) { return a.uuid === action.uuid; })) {
+            queue.push(action);
+            save(queue);
+        }
+    }
+
+    // Un seul envoi à la fois ; les UUID acquittés (insérés, doublons ou rejetés) sortent de la file
+    function flush() {
+        if (inFlight) {
+            // Les actions ajoutées pendant l'envoi en cours partent juste après
+            return inFlight.then(flush);
+        }
+        var batch = load().slice(0, MAX_BATCH);
+        if (!batch.length) {
+            return Promise.resolve(null);
+        }
+        inFlight = fetch(BULK_URL, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({actions: batch})
+        }).then(function (response) {
+            if (!response.ok) {
+                throw new Error('HTTP ' + response.status);
+            }
+            return response.json();
+        }).then(function (ack) {
+            var done = {};
+            ack.inserted.concat(ack.duplicates).forEach(function (uuid) { done[uuid] = true; });
+            ack.rejected.forEach(function (r) { done[r.uuid] = true; });
+            save(load().filter(function (a) { return !done[a.uuid]; }));
+            return ack;
+        }).catch(function () {
+            return null; // Hors-ligne : nouvel essai au prochain tick de 'action-queue-interval'
+        }).then(function (ack) {
+            inFlight = null;
+            return ack;
+        });
+        return inFlight;
+    }
+
+    function statusText() {
+        var n = load().length;
+        return n ? '⏳ ' + n + ' action(s) en attente d\'envoi' : '';
+    }
+
+    window.dash_clientside.veec = Object.assign(window.dash_clientside.veec || {}, {
+        actionQueue: {newUuid: newUuid, nextSeq: nextSeq, enqueue: enqueue, flush: flush, load: load},
+
+        syncActionQueue: function (pending, nIntervals) {
+            if (pending && pending.uuid) {
+                enqueue(pending);
+            }
+            return flush().then(function (ack) {
+                var ackOut = ack && ack.inserted.length ? ack : window.dash_clientside.no_update;
+                return [ackOut, statusText()];
+            });
+        }
+    });
+})();
@@ -0,0 +1,150 @@
+// Mode clientside (VEEC_CLIENTSIDE_MODE=1) : équivalents navigateur de handle_stat_workflow,
+// process_stat_entry (app.py) et des règles de ScoreEngine (score_engine.py). Seule l'action validée est envoyée au serveur :
+// elle passe par le Store 'pending-action' puis par la file d'attente de veec_action_queue.js.
+
+window.dash_clientside = window.dash_clientside || {};
+
+(function () {
+    var no_update = function () { return window.dash_clientside.no_update; };
+
+    function withDisplay(style, visible) {
+        return Object.assign({}, style, {display: visible ? 'flex' : 'none'});
+    }
+
+    function triggeredId() {
+        var ctx = window.dash_clientside.callback_context;
+        if (!ctx || !ctx.triggered || !ctx.triggered.length) {
+            return null;
+        }
+        var propId = ctx.triggered[0].prop_id;
+        var idPart = propId.slice(0, propId.lastIndexOf('.'));
+        try {
+            return JSON.parse(idPart);
+        } catch (e) {
+            return idPart;
+        }
+    }
+
+    function triggeredValue() {
+        var ctx = window.dash_clientside.callback_context;
+        return ctx && ctx.triggered && ctx.triggered.length ? ctx.triggered[0].value : null;
+    }
+
+    function matchOver(state, rules) {
+        var setsToWin = rules ? rules.sets_pour_gagner : 3;
+        return state.sets_veec >= setsToWin || state.sets_adverse >= setsToWin;
+    }
+
+    function timestampNow() {
+        return new Date().toTimeString().slice(0, 8);
+    }
+
+    // Fin de set (points_pour_gagner, +2 écart) et fin de match : même règle que ScoreEngine._step
+    function checkSetAndMatchEnd(state, rules) {
+        var target = rules.points_pour_gagner;
+        var winner = null;
+        if (state.score_veec >= target && state.score_veec - state.score_adverse >= 2) {
+            winner = 'VEEC';
+        } else if (state.score_adverse >= target && state.score_adverse - state.score_veec >= 2) {
+            winner = 'ADVERSE';
+        }
+        if (!winner) {
+            return state;
+        }
+        if (winner === 'VEEC') {
+            state.sets_veec += 1;
+        } else {
+            state.sets_adverse += 1;
+        }
+        if (!matchOver(state, rules)) {
+            state.current_set += 1;
+            state.score_veec = 0;
+            state.score_adverse = 0;
+        }
+        return state;
+    }
+
+    window.dash_clientside.veec = Object.assign(window.dash_clientside.veec || {}, {
+        handleStatWorkflow: function (clickData, nPlayerBtn, nControlBtn, state, playerStyle, actionStyle, rules) {
+            var trigger = triggeredId();
+            if (!trigger || !state) {
+                return [no_update(), no_update(), no_update()];
+            }
+            var newState = Object.assign({}, state);
+
+            if (matchOver(newState, rules)) {
+                return [withDisplay(playerStyle, false), withDisplay(actionStyle, false), no_update()];
+            }
+
+            if (trigger.type === 'modal-control' && trigger.action === 'cancel') {
+                newState.temp_selected_pos = null;
+                newState.temp_selected_player = null;
+                return [withDisplay(playerStyle, false), withDisplay(actionStyle, false), newState];
+            }
+
+            if (trigger === 'terrain-graph-simple' && clickData) {
+                newState.temp_selected_pos = clickData.points[0].customdata;
+                newState.temp_selected_player = null;
+                return [withDisplay(playerStyle, true), withDisplay(actionStyle, false), newState];
+            }
+
+            if (trigger.type === 'select-player-btn' && triggeredValue()) {
+                newState.temp_selected_player = trigger.index;
+                return [withDisplay(playerStyle, false), withDisplay(actionStyle, true), newState];
+            }
+
+            return [no_update(), no_update(), no_update()];
+        },
+
+        processStatEntry: function (actionClicks, state, actionStyle, rules) {
+            var nothing = [no_update(), no_update(), no_update(), no_update(), no_update(),
+                           no_update(), no_update(), no_update(), no_update()];
+            var trigger = triggeredId();
+            if (!trigger || trigger.type !== 'select-action-btn' || !triggeredValue() || !state) {
+                return nothing;
+            }
+            if (state.temp_selected_pos === null || state.temp_selected_player === null || matchOver(state, rules)) {
+                nothing[1] = withDisplay(actionStyle, false);
+                return nothing;
+            }
+
+            var actionVal = trigger.value;
+            var newState = Object.assign({}, state);
+            var queue = window.dash_clientside.veec.actionQueue;
+            var pending = {
+                uuid: queue.newUuid(),
+                seq: queue.nextSeq(newState.match_id),
+                match_id: newState.match_id,
+                pos: newState.temp_selected_pos,
+                joueur: newState.temp_selected_player,
+                action: actionVal,
+                timestamp: timestampNow()
+            };
+
+            var effect = rules.point_effects[actionVal];
+            if (effect === 'VEEC') {
+                newState.score_veec += 1;
+            } else if (effect === 'ADVERSE') {
+                newState.score_adverse += 1;
+            }
+            checkSetAndMatchEnd(newState, rules);
+
+            newState.temp_selected_pos = null;
+            newState.temp_selected_player = null;
+            newState.click_count = (newState.click_count || 0) + 1;
+
+            var currentSetOut = matchOver(newState, rules) ? 'MATCH TERMINÉ !' : 'Set en cours : ' + newState.current_set;
+            return [
+                newState,
+                withDisplay(actionStyle, false),
+                String(newState.score_veec),
+                String(newState.score_adverse),
+                'Sets: ' + newState.sets_veec,
+                'Sets: ' + newState.sets_adverse,
+                currentSetOut,
+                pending,
+                null // Réinitialise clickData pour pouvoir recliquer la même zone
+            ];
+        }
+    });
+})();
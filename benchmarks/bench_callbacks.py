@@ -0,0 +1,326 @@
+"""
+Banc d'essai de la saisie : matchs synthétiques joués directement sur les callbacks Dash (sans navigateur).
+
+Chaque action passe par les trois callbacks d'une vraie saisie (clic terrain, choix du joueur, choix de l'action),
+les annulations par handle_undo. Les réponses sont sérialisées comme Dash le ferait (PlotlyJSONEncoder) et ce temps
+est compté dans la latence. Les fonctions SQLite sont ensuite mesurées seules sur la base ainsi remplie.
+
+Les matchs sont générés par échanges (service ou réception, construction, point ou faute), avec rotation,
+fins de set, matchs en 3 ou 5 sets et rafales d'annulations ; tout est déterminé par --seed.
+
+Usage :
+    python benchmarks/bench_callbacks.py [--matches 6] [--seed 1] [--label avant-refacto]
+    python benchmarks/bench_callbacks.py --compare benchmarks/results/<fichier>.json
+
+Le résultat (latences p50/p90/p99 par callback et par opération SQLite, taille du Store selon la longueur du match)
+est enregistré en JSON dans benchmarks/results/ pour comparer deux versions. La base et le cache d'analyse sont
+créés dans un dossier temporaire : la base de production n'est jamais touchée.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextvars import copy_context
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# Scénarios : probabilité que VEEC gagne l'échange, par set (le dernier taux vaut pour les sets suivants)
+SCENARIOS = {
+    'trois_sets': {'strength': [0.62], 'undo_rate': 0.0},
+    'cinq_sets': {'strength': [0.7, 0.3, 0.7, 0.3, 0.6], 'undo_rate': 0.0},
+    'annulations': {'strength': [0.7, 0.3, 0.7, 0.3, 0.6], 'undo_rate': 0.04},
+}
+STORE_SIZE_STEP = 25 # Une mesure de la taille du Store toutes les N actions
+WARMUP_STEPS = 20 # Premières saisies non comptées (imports paresseux, caches)
+DB_REPEAT = 200
+
+
+# --- STATISTIQUES ---
+
+def percentile(sorted_values, q):
+    """Percentile au rang le plus proche sur une liste triée."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(samples):
+    """Latences en secondes -> résumé en millisecondes."""
+    values = sorted(samples)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        'count': len(values),
+        'p50_ms': ms(percentile(values, 50)),
+        'p90_ms': ms(percentile(values, 90)),
+        'p99_ms': ms(percentile(values, 99)),
+        'mean_ms': ms(sum(values) / len(values)) if values else None,
+        'max_ms': ms(values[-1] if values else None),
+    }
+
+class Timings:
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def measure(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.add(name, time.perf_counter() - start)
+        return result
+
+    def report(self):
+        return {name: summarize(samples) for name, samples in sorted(self.samples.items())}
+
+
+# --- GÉNÉRATION DES MATCHS ---
+
+ROTATION = [1, 6, 5, 4, 3, 2] # Ordre de rotation des positions (le joueur en P2 passe en P1 au service)
+FRONT_ROW = [2, 3, 4]
+CONSTRUCTION = ['REC_OK', 'DEF_OK', 'DEF_PERF', 'PAS_OK', 'PAS_PERF', 'ATK_CONTRE', 'BLK_TOUCH']
+VEEC_FINISH = ['ATK_POINT', 'ATK_POINT', 'ATK_POINT', 'BLK_POINT']
+ADVERSE_FINISH = ['ATK_ERR', 'REC_ERR', 'DEF_ERR', 'PAS_ERR', 'BLK_ERR']
+
+def simulate_match(rng, scenario, roster, ScoreEngine, Event):
+    """
+    Génère les étapes d'un match : ('action', position, numéro, code) ou ('undo',).
+    Un ScoreEngine local suit le score pour savoir quand le set et le match se terminent.
+    """
+    strengths, undo_rate = scenario['strength'], scenario['undo_rate']
+    engine = ScoreEngine()
+    lineup = dict(zip(ROTATION, rng.sample(roster, 6))) # position -> numéro
+    serving = rng.random() < 0.5
+
+    def action(pos, code):
+        engine.append(Event('', f"P{pos}", lineup[pos], code))
+        return ('action', pos, lineup[pos], code)
+
+    while not engine.match_over:
+        strength = strengths[min(engine.current_set, len(strengths)) - 1]
+        veec_wins = rng.random() < strength
+        rally = []
+        if serving:
+            roll = rng.random()
+            if veec_wins and roll < 0.1:
+                rally.append((1, 'SVC_ACE'))
+            elif not veec_wins and roll < 0.15:
+                rally.append((1, 'SVC_ERR'))
+            else:
+                rally.append((1, 'SVC_OK'))
+        elif not veec_wins and rng.random() < 0.25:
+            rally.append((rng.choice(ROTATION[1:4]), 'REC_ERR'))
+        if not rally or rally[-1][1] == 'SVC_OK':
+            # Construction de l'échange, puis point ou faute
+            for _ in range(rng.randint(1, 4)):
+                rally.append((rng.choice(ROTATION), rng.choice(CONSTRUCTION)))
+            finish = rng.choice(VEEC_FINISH if veec_wins else ADVERSE_FINISH)
+            rally.append((rng.choice(FRONT_ROW) if finish.startswith(('ATK', 'BLK')) else rng.choice(ROTATION), finish))
+
+        for pos, code in rally:
+            if engine.match_over:
+                break
+            yield action(pos, code)
+            if undo_rate and rng.random() < undo_rate:
+                # Rafale d'annulations (erreurs de saisie corrigées), puis le match reprend
+                for _ in range(min(rng.randint(1, 4), len(engine))):
+                    engine.pop()
+                    yield ('undo',)
+
+        if veec_wins and not serving:
+            # Récupération du service : rotation d'un cran
+            lineup = {ROTATION[i]: lineup[ROTATION[(i + 1) % 6]] for i in range(6)}
+        serving = veec_wins
+
+
+# --- APPELS DES CALLBACKS ---
+
+def run_matches(appmod, args, timings):
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+    import plotly.utils
+
+    def call(callback, prop_id, value, *callback_args):
+        def run():
+            context_value.set(AttributeDict(triggered_inputs=[{'prop_id': prop_id, 'value': value}]))
+            return getattr(callback, '__wrapped__', callback)(*callback_args)
+        start = time.perf_counter()
+        outputs = copy_context().run(run)
+        response_bytes = len(json.dumps(outputs, cls=plotly.utils.PlotlyJSONEncoder))
+        return outputs, time.perf_counter() - start, response_bytes
+
+    def button_id(id_dict):
+        return json.dumps(id_dict, separators=(',', ':'), sort_keys=True) + '.n_clicks'
+
+    rng = random.Random(args.seed)
+    roster = [player.numero for player in appmod.roster.team(appmod.DEFAULT_TEAM_ID).players]
+    scenario_names = list(SCENARIOS)
+    store_sizes, matches, steps = [], [], 0
+
+    for match_num in range(args.matches):
+        scenario_name = scenario_names[match_num % len(scenario_names)]
+        store = appmod.initial_store_data(appmod.new_match_state())
+        actions = undos = 0
+        for step in simulate_match(rng, SCENARIOS[scenario_name], roster, appmod.ScoreEngine, appmod.Event):
+            record = steps >= WARMUP_STEPS
+            steps += 1
+            if step[0] == 'undo':
+                outputs, seconds, _ = call(appmod.handle_undo, 'btn-undo-last.n_clicks', 1, 1, store)
+                store = outputs[0]
+                undos += 1
+                if record:
+                    timings.add('handle_undo', seconds)
+                continue
+
+            _, pos, numero, code = step
+            click = {'points': [{'customdata': pos}]}
+            outputs, seconds_click, _ = call(appmod.handle_stat_workflow, 'terrain-graph-simple.clickData', click, click, [], [], store)
+            store = outputs[2]
+            outputs, seconds_player, _ = call(appmod.handle_stat_workflow, button_id({'type': 'select-player-btn', 'index': numero}),
+                                              1, None, [1], [], store)
+            store = outputs[2]
+            outputs, seconds_action, response_bytes = call(appmod.process_stat_entry, button_id({'type': 'select-action-btn', 'value': code}),
+                                                           1, [1], store)
+            store = outputs[0]
+            actions += 1
+            if record:
+                timings.add('handle_stat_workflow', seconds_click)
+                timings.add('handle_stat_workflow', seconds_player)
+                timings.add('process_stat_entry', seconds_action)
+            if actions % STORE_SIZE_STEP == 0:
+                store_sizes.append({'actions': actions, 'store_bytes': len(json.dumps(store)),
+                                    'process_stat_entry_response_bytes': response_bytes})
+
+        state = appmod.load_match_state(store) if appmod.SERVER_SIDE_STATE else store
+        matches.append({'match_id': state['match_id'], 'scenario': scenario_name, 'actions': actions, 'undos': undos,
+                        'sets': f"{state['sets_veec']}-{state['sets_adverse']}", 'final_store_bytes': len(json.dumps(store))})
+        print(f"  match {match_num + 1}/{args.matches} ({scenario_name}) : {actions} actions, {undos} annulations, "
+              f"sets {state['sets_veec']}-{state['sets_adverse']}", file=sys.stderr)
+    return matches, store_sizes
+
+def store_size_curve(store_sizes):
+    """Taille moyenne du Store et de la réponse de process_stat_entry par longueur de match."""
+    curve = {}
+    for sample in store_sizes:
+        curve.setdefault(sample['actions'], []).append(sample)
+    return [{'actions': actions,
+             'store_bytes': round(sum(s['store_bytes'] for s in samples) / len(samples)),
+             'process_stat_entry_response_bytes': round(sum(s['process_stat_entry_response_bytes'] for s in samples) / len(samples))}
+            for actions, samples in sorted(curve.items())]
+
+
+# --- OPÉRATIONS SQLite ---
+
+def run_database(database, matches, timings):
+    match_id = max(matches, key=lambda m: m['actions'])['match_id'] # Le plus long match joué
+    bench_match = 'Match_20000101_000000_bench'
+    for _ in range(DB_REPEAT):
+        timings.measure('insert_stat', database.insert_stat, bench_match, 1, '00:00:00', 0, 0, 'P1', 'Bench', 'ATK', 'POINT')
+    for _ in range(DB_REPEAT):
+        timings.measure('delete_last_stat_and_get_data', database.delete_last_stat_and_get_data, bench_match)
+    for _ in range(DB_REPEAT):
+        timings.measure('fetch_all_stats', database.fetch_all_stats, match_id)
+        timings.measure('fetch_stats_page', database.fetch_stats_page, match_id, [('action', 'contains', 'ATK')], [('score', 'desc')], 0, 25)
+        timings.measure('fetch_player_aggregates', database.fetch_player_aggregates, match_id)
+        timings.measure('fetch_position_aggregates', database.fetch_position_aggregates, match_id, None, None, 'ATK')
+        timings.measure('fetch_match_version', database.fetch_match_version, match_id)
+    for _ in range(10):
+        timings.measure('iter_actions (toute la base)', lambda: sum(len(rows) for rows in database.iter_actions()))
+
+
+# --- RÉSULTATS ---
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(result):
+    for section in ('callbacks', 'database'):
+        print(f"\n{section}")
+        print(f"  {'':32} {'n':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for name, stats in result[section].items():
+            print(f"  {name:32} {stats['count']:>6} {stats['p50_ms']:>9} {stats['p90_ms']:>9} {stats['p99_ms']:>9} {stats['max_ms']:>9}")
+    print("\nTaille du Store (octets) selon le nombre d'actions du match")
+    for point in result['store_size'][::4]:
+        print(f"  {point['actions']:>5} actions : Store {point['store_bytes']:>8}, réponse process_stat_entry {point['process_stat_entry_response_bytes']:>8}")
+
+def print_comparison(before, after):
+    print(f"\nComparaison avec {before.get('label')} ({before.get('git_revision')}) :")
+    if before.get('config') != after['config']:
+        # Autre nombre de matchs, graine ou mode : base de taille différente, écarts à lire avec prudence
+        print(f"  attention : configuration différente ({before.get('config')} -> {after['config']})")
+    print(f"  {'':32} {'p50 avant':>10} {'p50 après':>10} {'écart':>8} {'p99 avant':>10} {'p99 après':>10} {'écart':>8}")
+    for section in ('callbacks', 'database'):
+        for name, stats in after[section].items():
+            old = before.get(section, {}).get(name)
+            if not old:
+                continue
+            delta = lambda key: f"{100 * (stats[key] - old[key]) / old[key]:+.0f}%" if old[key] else ''
+            print(f"  {name:32} {old['p50_ms']:>10} {stats['p50_ms']:>10} {delta('p50_ms'):>8} "
+                  f"{old['p99_ms']:>10} {stats['p99_ms']:>10} {delta('p99_ms'):>8}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai des callbacks de saisie et des opérations SQLite.")
+    parser.add_argument('--matches', type=int, default=6, help="nombre de matchs simulés (scénarios en alternance)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--label', default=None, help="nom du résultat (par défaut : révision git)")
+    parser.add_argument('--output', default=None, help="fichier JSON du résultat (par défaut : benchmarks/results/)")
+    parser.add_argument('--compare', default=None, help="résultat JSON précédent à comparer")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='veec-bench-')
+    # Base et cache isolés, fixés avant l'import de l'application (lus à l'import de database / analytics)
+    os.environ['VEEC_DB_NAME'] = os.path.join(workdir, 'bench.db')
+    os.environ['VEEC_ANALYTICS_DIR'] = os.path.join(workdir, 'analytics_cache')
+    sys.path.insert(0, ROOT)
+    import app as appmod
+    import database
+    appmod.create_app()
+
+    timings = Timings()
+    gc.collect()
+    print(f"Simulation de {args.matches} match(s) dans {workdir}", file=sys.stderr)
+    matches, store_sizes = run_matches(appmod, args, timings)
+    callbacks = timings.report()
+    timings = Timings()
+    run_database(database, matches, timings)
+
+    revision = git_revision()
+    result = {
+        'label': args.label or revision or 'local',
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'matches': args.matches, 'seed': args.seed, 'server_side_state': appmod.SERVER_SIDE_STATE,
+                   'clientside_mode': appmod.CLIENTSIDE_MODE, 'group_commit': database.GROUP_COMMIT},
+        'matches': matches,
+        'callbacks': callbacks,
+        'database': timings.report(),
+        'store_size': store_size_curve(store_sizes),
+    }
+    print_report(result)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}_{result['label']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\nRésultat enregistré : {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(json.load(f), result)
+
+if __name__ == '__main__':
+    main()
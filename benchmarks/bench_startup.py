@@ -0,0 +1,157 @@
+"""
+Banc d'essai du démarrage à froid : temps entre le lancement d'un processus Python et la première page servie.
+
+Chaque essai est un nouveau processus (aucun module déjà importé) qui mesure, dans l'ordre :
+l'import de app.py, create_app() (migrations, layout statique, mesures), puis les trois requêtes d'un premier
+chargement de page (/, /_dash-layout, /_dash-dependencies) via le client de test Flask. Le processus indique
+aussi si les modules lourds chargés à la demande (pandas) l'ont été avant la première page.
+
+Usage :
+    python benchmarks/bench_startup.py [--runs 5] [--budget 2.5] [--label avant-refacto]
+    python benchmarks/bench_startup.py --compare benchmarks/results/<fichier>.json
+
+Le code de sortie est 1 si la médiane du temps jusqu'à la première page dépasse --budget (secondes) ou si un
+module paresseux a été importé au démarrage : le script peut servir de garde-fou en intégration continue.
+Chaque essai utilise une base neuve dans un dossier temporaire (migrations complètes comprises).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+DEFAULT_BUDGET_SECONDS = 2.5
+LAZY_MODULES = ('pandas',) # Ne doivent pas être importés avant la première page
+
+PHASES = ('interpreteur', 'import', 'create_app', 'index', 'layout', 'dependencies')
+
+# Exécuté dans un processus neuf : durées des phases (secondes) sur la dernière ligne de la sortie
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+phases = {}
+import app
+phases['import'] = time.perf_counter() - start
+mark = time.perf_counter()
+app.create_app()
+phases['create_app'] = time.perf_counter() - mark
+client = app.app.server.test_client()
+for phase, path in (('index', '/'), ('layout', '/_dash-layout'), ('dependencies', '/_dash-dependencies')):
+    mark = time.perf_counter()
+    response = client.get(path)
+    phases[phase] = time.perf_counter() - mark
+    if response.status_code != 200:
+        sys.exit(f"{path} : HTTP {response.status_code}")
+lazy = [name for name in json.loads(sys.argv[2]) if name in sys.modules]
+print(json.dumps({'phases': phases, 'lazy_loaded': lazy}))
+"""
+
+
+def run_once(workdir, index):
+    env = dict(os.environ)
+    env['VEEC_DB_NAME'] = os.path.join(workdir, f'startup_{index}.db')
+    env['VEEC_ANALYTICS_DIR'] = os.path.join(workdir, f'analytics_{index}')
+    env['VEEC_METRICS_DIR'] = os.path.join(workdir, f'metrics_{index}')
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', CHILD_SCRIPT, ROOT, json.dumps(LAZY_MODULES)],
+                               env=env, capture_output=True, text=True)
+    total = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"essai {index} en échec :\n{completed.stderr}")
+    run = json.loads(completed.stdout.strip().splitlines()[-1])
+    # Temps hors mesures du processus fils : lancement de l'interpréteur et imports de site
+    run['phases']['interpreteur'] = total - sum(run['phases'].values())
+    run['total'] = total
+    return run
+
+def summarize(runs):
+    ms = lambda v: round(v * 1000, 1)
+    phases = {phase: {'median_ms': ms(statistics.median(run['phases'][phase] for run in runs)),
+                      'max_ms': ms(max(run['phases'][phase] for run in runs))}
+              for phase in PHASES}
+    totals = sorted(run['total'] for run in runs)
+    return phases, {'median_ms': ms(statistics.median(totals)), 'min_ms': ms(totals[0]), 'max_ms': ms(totals[-1])}
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(result):
+    print(f"\n  {'phase':16} {'médiane ms':>11} {'max ms':>9}")
+    for phase, stats in result['phases'].items():
+        print(f"  {phase:16} {stats['median_ms']:>11} {stats['max_ms']:>9}")
+    total = result['first_page']
+    print(f"  {'première page':16} {total['median_ms']:>11} {total['max_ms']:>9}   (budget {result['budget_ms']} ms)")
+    if result['lazy_loaded']:
+        print(f"\n  importés au démarrage alors qu'ils devraient être paresseux : {', '.join(result['lazy_loaded'])}")
+
+def print_comparison(before, after):
+    print(f"\nComparaison avec {before.get('label')} ({before.get('git_revision')}) :")
+    print(f"  {'':16} {'avant ms':>10} {'après ms':>10} {'écart':>8}")
+    rows = [(phase, before.get('phases', {}).get(phase), stats) for phase, stats in after['phases'].items()]
+    rows.append(('première page', before.get('first_page'), after['first_page']))
+    for name, old, new in rows:
+        if not old:
+            continue
+        delta = f"{100 * (new['median_ms'] - old['median_ms']) / old['median_ms']:+.0f}%" if old['median_ms'] else ''
+        print(f"  {name:16} {old['median_ms']:>10} {new['median_ms']:>10} {delta:>8}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai du démarrage à froid de l'application.")
+    parser.add_argument('--runs', type=int, default=5, help="nombre de processus lancés")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS,
+                        help="temps maximal (s, médiane) jusqu'à la première page servie")
+    parser.add_argument('--label', default=None, help="nom du résultat (par défaut : révision git)")
+    parser.add_argument('--output', default=None, help="fichier JSON du résultat (par défaut : benchmarks/results/)")
+    parser.add_argument('--compare', default=None, help="résultat JSON précédent à comparer")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='veec-startup-')
+    print(f"{args.runs} démarrage(s) à froid dans {workdir}", file=sys.stderr)
+    runs = [run_once(workdir, index) for index in range(args.runs)]
+    phases, first_page = summarize(runs)
+
+    revision = git_revision()
+    result = {
+        'label': args.label or revision or 'local',
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': args.runs,
+        'budget_ms': round(args.budget * 1000),
+        'phases': phases,
+        'first_page': first_page,
+        'lazy_loaded': sorted({name for run in runs for name in run['lazy_loaded']}),
+    }
+    print_report(result)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}_startup_{result['label']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\nRésultat enregistré : {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(json.load(f), result)
+
+    if first_page['median_ms'] > result['budget_ms'] or result['lazy_loaded']:
+        print("\nBudget de démarrage dépassé.", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,938 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from registry import LISTE_JOUEURS_PREDEFINIE
+from score_engine import ScoreEngine, Event, SetResult
+from metrics import timed, SQLITE_QUERY_SECONDS, SQLITE_LOCK_WAIT_SECONDS, SQLITE_TRANSACTION_SECONDS, MATCH_LOCK_WAIT_SECONDS
+
+# --- CONFIGURATION ---
+
+DB_NAME = os.environ.get('VEEC_DB_NAME', 'match_stats.db')
+
+# Nombre de connexions gardées ouvertes dans le pool (les connexions en surplus sont fermées après usage)
+POOL_SIZE = int(os.environ.get('VEEC_DB_POOL_SIZE', '8'))
+BUSY_TIMEOUT_MS = 5000
+
+# Group commit : les insertions rapprochées sont regroupées dans une seule transaction (un seul fsync).
+# Chaque appel à insert_stat attend malgré tout que sa ligne soit validée sur disque avant de rendre la main.
+GROUP_COMMIT = os.environ.get('VEEC_DB_GROUP_COMMIT', '0') == '1'
+GROUP_COMMIT_WINDOW = 0.005 # secondes d'attente pour regrouper les insertions suivantes
+GROUP_COMMIT_MAX_BATCH = 256
+
+# Équipe créée par la migration 10 avec l'effectif d'origine : équipe des nouveaux matchs et des matchs importés
+DEFAULT_TEAM_ID = 1
+DEFAULT_TEAM_NAME = "VEEC"
+
+# --- REQUÊTES (texte constant : préparées une seule fois par connexion grâce au cache de sqlite3) ---
+
+# Colonnes lues : colonnes typées + reconstitution des anciens champs texte pour l'affichage et le rejeu
+ACTION_COLUMNS = """
+    id, match_id, set_num, timestamp,
+    score_veec, score_adverse, score_veec || '-' || score_adverse AS score_at_action,
+    position, joueur_nom, joueur_id,
+    action_category, action_result, action_category || '_' || action_result AS action_code
+"""
+
+SQL_INSERT_ACTION = """
+    INSERT INTO actions (match_id, set_num, timestamp, score_veec, score_adverse, position, joueur_nom, action_category, action_result,
+                         joueur_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SQL_INSERT_CLIENT_ACTION = """
+    INSERT OR IGNORE INTO actions (match_id, set_num, timestamp, score_veec, score_adverse, position, joueur_nom,
+                                   action_category, action_result, joueur_id, client_uuid, client_seq)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SQL_SET_MATCH_TEAM = """
+    INSERT INTO matches (match_id, team_id, version) VALUES (?, ?, 1)
+    ON CONFLICT DO UPDATE SET team_id = excluded.team_id, version = version + 1, updated_at = datetime('now')
+"""
+
+SQL_SELECT_LAST_ACTION = f"""
+    SELECT {ACTION_COLUMNS}
+    FROM actions
+    WHERE match_id = ?
+    ORDER BY id DESC
+    LIMIT 1
+"""
+
+SQL_DELETE_ACTION = "DELETE FROM actions WHERE id = ?"
+
+SQL_SELECT_MATCH_ACTIONS = f"SELECT {ACTION_COLUMNS} FROM actions WHERE match_id = ? ORDER BY id DESC"
+
+SQL_SELECT_MATCH_VERSION = "SELECT version FROM matches WHERE match_id = ?"
+
+SQL_SELECT_ACTIONS_SINCE = f"SELECT {ACTION_COLUMNS} FROM actions WHERE id > ? ORDER BY id"
+
+SQL_SELECT_DELETIONS_SINCE = "SELECT MAX(seq), MIN(action_id) FROM actions_deleted WHERE seq > ?"
+
+# Fin de set : last_action_id NULL = dernière action enregistrée du match (écrite juste avant, même transaction)
+SQL_INSERT_SET_RESULT = """
+    INSERT INTO match_sets (match_id, set_num, score_veec, score_adverse, winner, match_over, timestamp, last_action_id)
+    SELECT ?, ?, ?, ?, ?, ?, ?, COALESCE(?, MAX(id)) FROM actions WHERE match_id = ?
+"""
+
+SQL_SELECT_SET_RESULTS = """
+    SELECT set_num, score_veec, score_adverse, winner, match_over, timestamp, last_action_id
+    FROM match_sets WHERE match_id = ? ORDER BY set_num
+"""
+
+# Matchs non terminés ayant au moins une action, les plus récemment modifiés en premier
+SQL_SELECT_UNFINISHED_MATCHES = """
+    SELECT m.match_id, m.updated_at, m.sets_veec, m.sets_adverse,
+           (SELECT COUNT(*) FROM actions a WHERE a.match_id = m.match_id) AS actions
+    FROM matches m
+    WHERE m.status = 'en_cours' AND EXISTS (SELECT 1 FROM actions a WHERE a.match_id = m.match_id)
+    ORDER BY m.updated_at DESC, m.match_id DESC
+    LIMIT ?
+"""
+
+# Colonnes de l'historique paginé -> expressions SQL autorisées pour l'affichage, le tri et le filtrage
+HISTORIQUE_SQL_COLUMNS = {
+    'timestamp': "timestamp",
+    'set': "set_num",
+    'score': "score_veec || '-' || score_adverse",
+    'pos': "position",
+    'joueur': "joueur_nom",
+    'action': "action_category || '_' || action_result",
+}
+HISTORIQUE_SQL_OPERATORS = {'=': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+# Agrégats : +1 à l'insertion d'une action, -1 à sa suppression (la ligne disparaît à zéro)
+SQL_CREATE_AGGREGATE_TRIGGERS = """
+    CREATE TRIGGER IF NOT EXISTS trg_actions_agg_insert AFTER INSERT ON actions
+    BEGIN
+        INSERT INTO stats_joueur (match_id, set_num, joueur_nom, action_category, action_result, count)
+        VALUES (NEW.match_id, NEW.set_num, NEW.joueur_nom, NEW.action_category, NEW.action_result, 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+        INSERT INTO stats_position (match_id, set_num, position, joueur_nom, action_category, action_result, count)
+        VALUES (NEW.match_id, NEW.set_num, NEW.position, NEW.joueur_nom, NEW.action_category, NEW.action_result, 1)
+        ON CONFLICT DO UPDATE SET count = count + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_actions_agg_delete AFTER DELETE ON actions
+    BEGIN
+        UPDATE stats_joueur SET count = count - 1
+        WHERE match_id = OLD.match_id AND set_num = OLD.set_num AND joueur_nom = OLD.joueur_nom
+          AND action_category = OLD.action_category AND action_result = OLD.action_result;
+        DELETE FROM stats_joueur
+        WHERE match_id = OLD.match_id AND set_num = OLD.set_num AND joueur_nom = OLD.joueur_nom
+          AND action_category = OLD.action_category AND action_result = OLD.action_result AND count <= 0;
+        UPDATE stats_position SET count = count - 1
+        WHERE match_id = OLD.match_id AND set_num = OLD.set_num AND position = OLD.position AND joueur_nom = OLD.joueur_nom
+          AND action_category = OLD.action_category AND action_result = OLD.action_result;
+        DELETE FROM stats_position
+        WHERE match_id = OLD.match_id AND set_num = OLD.set_num AND position = OLD.position AND joueur_nom = OLD.joueur_nom
+          AND action_category = OLD.action_category AND action_result = OLD.action_result AND count <= 0;
+    END;
+"""
+
+# Lecture des agrégats : quelques dizaines de lignes par match, quel que soit le nombre d'actions
+SQL_SELECT_PLAYER_AGGREGATES = """
+    SELECT joueur_nom, action_category, action_result, SUM(count) AS count
+    FROM stats_joueur
+    WHERE match_id = ? AND (? IS NULL OR set_num = ?)
+    GROUP BY joueur_nom, action_category, action_result
+"""
+
+SQL_SELECT_POSITION_AGGREGATES = """
+    SELECT position, action_category, action_result, SUM(count) AS count
+    FROM stats_position
+    WHERE match_id = ? AND (? IS NULL OR set_num = ?)
+      AND (? IS NULL OR joueur_nom = ?) AND (? IS NULL OR action_category = ?)
+    GROUP BY position, action_category, action_result
+"""
+
+# --- POOL DE CONNEXIONS ---
+
+_pool = queue.LifoQueue()
+
+def _open_connection():
+    # isolation_level=None : les transactions sont ouvertes explicitement (BEGIN IMMEDIATE) par transaction()
+    conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                           check_same_thread=False, cached_statements=128)
+    conn.row_factory = sqlite3.Row # Permet d'accéder aux colonnes par leur nom
+    # Avant le mode WAL, et sur une base neuve seulement (une base existante est convertie par archive.py) : sur une
+    # base existante, ce PRAGMA attend le verrou d'écriture, et une connexion ouverte pendant une transaction échouerait
+    if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL") # Une action confirmée à l'écran est sur disque
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+@contextmanager
+def get_connection():
+    """Emprunte une connexion au pool pour la durée du bloc (usage exclusif par le thread appelant)."""
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _open_connection()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        if _pool.qsize() < POOL_SIZE:
+            _pool.put(conn)
+        else:
+            conn.close()
+
+@contextmanager
+def _connection(conn=None):
+    """La connexion donnée (transaction de lecture de l'appelant), sinon une connexion du pool."""
+    if conn is not None:
+        yield conn
+    else:
+        with get_connection() as conn:
+            yield conn
+
+@contextmanager
+def transaction():
+    """Transaction d'écriture : le verrou d'écriture est pris dès le début pour éviter les 'database is locked' en cours de route."""
+    with get_connection() as conn:
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        SQLITE_LOCK_WAIT_SECONDS.observe(time.perf_counter() - start)
+        try:
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            SQLITE_TRANSACTION_SECONDS.observe(time.perf_counter() - start)
+
+def close_all_connections():
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+# --- SÉRIALISATION DES ÉCRITURES PAR MATCH ---
+# Dans un processus, les écritures d'un même match (lecture de l'état, calcul, INSERT) sont exécutées
+# l'une après l'autre ; deux matchs différents ne s'attendent jamais. Entre workers, la table 'matches'
+# (version incrémentée par trigger) permet de détecter qu'un autre processus a écrit dans le match.
+
+class _MatchLock:
+    """RLock dont l'attente est mesurée quand il est déjà pris par un autre thread (aucun coût sinon)."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        if not self._lock.acquire(blocking=False):
+            start = time.perf_counter()
+            self._lock.acquire()
+            MATCH_LOCK_WAIT_SECONDS.observe(time.perf_counter() - start)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+_match_locks = {}
+_match_locks_guard = threading.Lock()
+
+def match_lock(match_id):
+    """Verrou (réentrant) des écritures d'un match dans ce processus. Toujours le prendre avant une transaction."""
+    with _match_locks_guard:
+        lock = _match_locks.get(match_id)
+        if lock is None:
+            lock = _match_locks[match_id] = _MatchLock()
+        return lock
+
+# --- GROUP COMMIT ---
+
+class _GroupCommitWriter:
+    """Thread d'écriture unique qui valide les insertions en attente par lots."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Le thread est (re)démarré à la demande, y compris dans un processus issu d'un fork
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='veec-db-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, statements):
+        """
+        Met en file une unité d'écriture : liste de (sql, params) validée en entier ou pas du tout.
+        Retourne un Future résolu après le COMMIT du lot qui la contient.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((statements, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < GROUP_COMMIT_MAX_BATCH:
+                    batch.append(self._queue.get(timeout=GROUP_COMMIT_WINDOW))
+            except queue.Empty:
+                pass
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        # Un point de sauvegarde par unité : une unité en échec est annulée seule, sans entraîner le reste du lot
+        committed, failed = [], []
+        try:
+            with transaction() as conn:
+                for statements, future in batch:
+                    conn.execute("SAVEPOINT unit")
+                    try:
+                        for sql, params in statements:
+                            conn.execute(sql, params)
+                    except Exception as exc:
+                        conn.execute("ROLLBACK TO unit")
+                        failed.append((future, exc))
+                    else:
+                        committed.append(future)
+                    conn.execute("RELEASE unit")
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        for future, exc in failed:
+            future.set_exception(exc)
+        for future in committed:
+            future.set_result(None)
+
+_writer = _GroupCommitWriter()
+
+def _reset_after_fork():
+    # Les connexions SQLite ne doivent pas être partagées entre processus (ni les verrous, possiblement pris au fork)
+    global _pool, _match_locks, _match_locks_guard
+    _pool = queue.LifoQueue()
+    _match_locks = {}
+    _match_locks_guard = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+# --- SCHÉMA ET MIGRATIONS ---
+# La version du schéma est stockée dans PRAGMA user_version ; chaque migration fait passer de la version N-1 à N.
+
+def _migration_1_create_actions(conn):
+    # Schéma d'origine de la table 'actions'
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS actions (
+            id INTEGER PRIMARY KEY,
+            match_id TEXT NOT NULL,
+            set_num INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            score_at_action TEXT NOT NULL,
+            position TEXT NOT NULL,
+            joueur_nom TEXT NOT NULL,
+            action_code TEXT NOT NULL
+        )
+    """)
+
+def _migration_2_index_actions(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_actions_match_id ON actions (match_id, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_actions_match_set ON actions (match_id, set_num)")
+
+def _migration_3_typed_columns(conn):
+    # Score 'V-A' -> deux entiers, code 'CAT_RESULTAT' -> catégorie + résultat.
+    # SQLite ne sait pas modifier le type d'une colonne : la table est reconstruite.
+    conn.execute("""
+        CREATE TABLE actions_v3 (
+            id INTEGER PRIMARY KEY,
+            match_id TEXT NOT NULL,
+            set_num INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            score_veec INTEGER NOT NULL,
+            score_adverse INTEGER NOT NULL,
+            position TEXT NOT NULL,
+            joueur_nom TEXT NOT NULL,
+            action_category TEXT NOT NULL,
+            action_result TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        INSERT INTO actions_v3 (id, match_id, set_num, timestamp, score_veec, score_adverse,
+                                position, joueur_nom, action_category, action_result)
+        SELECT id, match_id, set_num, timestamp,
+               CAST(substr(score_at_action, 1, instr(score_at_action, '-') - 1) AS INTEGER),
+               CAST(substr(score_at_action, instr(score_at_action, '-') + 1) AS INTEGER),
+               position, joueur_nom,
+               substr(action_code, 1, instr(action_code, '_') - 1),
+               substr(action_code, instr(action_code, '_') + 1)
+        FROM actions
+    """)
+    conn.execute("DROP TABLE actions")
+    conn.execute("ALTER TABLE actions_v3 RENAME TO actions")
+    _migration_2_index_actions(conn)
+
+def _migration_4_client_uuid(conn):
+    # Actions envoyées par la file d'attente du navigateur : l'UUID client rend l'ingestion idempotente
+    conn.execute("ALTER TABLE actions ADD COLUMN client_uuid TEXT")
+    conn.execute("ALTER TABLE actions ADD COLUMN client_seq INTEGER")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_actions_client_uuid ON actions (client_uuid) WHERE client_uuid IS NOT NULL")
+
+def _migration_5_aggregates(conn):
+    # Compteurs matérialisés par joueur et par position, tenus à jour par triggers dans la transaction
+    # qui insère ou supprime l'action (saisie, group commit, ingestion client, annulation).
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_joueur (
+            match_id TEXT NOT NULL,
+            set_num INTEGER NOT NULL,
+            joueur_nom TEXT NOT NULL,
+            action_category TEXT NOT NULL,
+            action_result TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (match_id, set_num, joueur_nom, action_category, action_result)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_position (
+            match_id TEXT NOT NULL,
+            set_num INTEGER NOT NULL,
+            position TEXT NOT NULL,
+            joueur_nom TEXT NOT NULL,
+            action_category TEXT NOT NULL,
+            action_result TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (match_id, set_num, position, joueur_nom, action_category, action_result)
+        ) WITHOUT ROWID
+    """)
+    create_aggregate_triggers(conn)
+    rebuild_aggregates(conn)
+
+def _migration_6_deletion_log(conn):
+    # Journal des suppressions : les copies externes de 'actions' (cache d'analyse) savent si une ligne
+    # déjà copiée a disparu, même si SQLite réattribue ensuite son id à une nouvelle action.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS actions_deleted (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            action_id INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_actions_log_delete AFTER DELETE ON actions
+        BEGIN
+            INSERT INTO actions_deleted (action_id) VALUES (OLD.id);
+        END
+    """)
+
+def _migration_7_matches(conn):
+    # Un compteur de version par match, incrémenté par trigger à chaque écriture dans 'actions' :
+    # un worker compare sa version en mémoire à celle-ci pour savoir si un autre worker a écrit dans le match.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS matches (
+            match_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO matches (match_id, version)
+        SELECT match_id, COUNT(*) FROM actions GROUP BY match_id
+    """)
+    for event, row in (('INSERT', 'NEW'), ('DELETE', 'OLD')):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_actions_match_version_{event.lower()} AFTER {event} ON actions
+            BEGIN
+                INSERT INTO matches (match_id, version) VALUES ({row}.match_id, 1)
+                ON CONFLICT DO UPDATE SET version = version + 1, updated_at = datetime('now');
+            END
+        """)
+
+def _migration_8_set_results(conn):
+    # Fins de set enregistrées (points de reprise) : un match se reprend après un redémarrage en ne rejouant
+    # que le set en cours. Les sets gagnés et le statut du match sont tenus à jour dans 'matches' par triggers ;
+    # supprimer une action (annulation) supprime les fins de set qu'elle avait atteintes ou dépassées.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS match_sets (
+            match_id TEXT NOT NULL,
+            set_num INTEGER NOT NULL,
+            score_veec INTEGER NOT NULL,
+            score_adverse INTEGER NOT NULL,
+            winner TEXT NOT NULL,
+            match_over INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            last_action_id INTEGER NOT NULL,
+            PRIMARY KEY (match_id, set_num)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("ALTER TABLE matches ADD COLUMN sets_veec INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE matches ADD COLUMN sets_adverse INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE matches ADD COLUMN status TEXT NOT NULL DEFAULT 'en_cours'") # 'en_cours' | 'termine'
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_status ON matches (status, updated_at)")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_match_sets_insert AFTER INSERT ON match_sets
+        BEGIN
+            UPDATE matches SET sets_veec = sets_veec + (NEW.winner = 'VEEC'), sets_adverse = sets_adverse + (NEW.winner = 'ADVERSE'),
+                               status = CASE WHEN NEW.match_over THEN 'termine' ELSE status END
+            WHERE match_id = NEW.match_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_match_sets_delete AFTER DELETE ON match_sets
+        BEGIN
+            UPDATE matches SET sets_veec = sets_veec - (OLD.winner = 'VEEC'), sets_adverse = sets_adverse - (OLD.winner = 'ADVERSE'),
+                               status = 'en_cours'
+            WHERE match_id = OLD.match_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_actions_match_sets_delete AFTER DELETE ON actions
+        BEGIN
+            DELETE FROM match_sets WHERE match_id = OLD.match_id AND last_action_id >= OLD.id;
+        END
+    """)
+    rebuild_set_results(conn, [row[0] for row in conn.execute("SELECT match_id FROM matches")])
+
+def _migration_9_archive(conn):
+    # Archivage des matchs terminés (archive.py) : leurs actions quittent 'actions' pour un fichier par saison,
+    # leur résumé (version, sets, statut, agrégats, fins de set) reste ici. Les id deviennent strictement croissants
+    # (AUTOINCREMENT) : une action archivée ou annulée ne voit jamais son id réattribué, ce qui permet aux copies
+    # externes (cache d'analyse) de suivre la table par id à travers les archives.
+    schema = conn.execute("""
+        SELECT sql FROM sqlite_master WHERE tbl_name = 'actions' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    """).fetchall()
+    conn.execute("""
+        CREATE TABLE actions_v9 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            match_id TEXT NOT NULL,
+            set_num INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            score_veec INTEGER NOT NULL,
+            score_adverse INTEGER NOT NULL,
+            position TEXT NOT NULL,
+            joueur_nom TEXT NOT NULL,
+            action_category TEXT NOT NULL,
+            action_result TEXT NOT NULL,
+            client_uuid TEXT,
+            client_seq INTEGER
+        )
+    """)
+    conn.execute("""
+        INSERT INTO actions_v9 (id, match_id, set_num, timestamp, score_veec, score_adverse, position, joueur_nom,
+                                action_category, action_result, client_uuid, client_seq)
+        SELECT id, match_id, set_num, timestamp, score_veec, score_adverse, position, joueur_nom,
+               action_category, action_result, client_uuid, client_seq
+        FROM actions
+    """)
+    conn.execute("DROP TABLE actions")
+    conn.execute("ALTER TABLE actions_v9 RENAME TO actions")
+    for (sql,) in schema:
+        conn.execute(sql)
+    # Les id déjà supprimés (annulations) ne sont pas réattribués non plus
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'actions'")
+    conn.execute("""
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'actions', MAX((SELECT COALESCE(MAX(id), 0) FROM actions), (SELECT COALESCE(MAX(action_id), 0) FROM actions_deleted))
+    """)
+
+    conn.execute("ALTER TABLE matches ADD COLUMN archive TEXT") # Saison du fichier d'archive (NULL : actions dans 'actions')
+    conn.execute("ALTER TABLE matches ADD COLUMN archived_at TEXT")
+    conn.execute("ALTER TABLE matches ADD COLUMN action_count INTEGER")
+    conn.execute("ALTER TABLE matches ADD COLUMN first_action_id INTEGER")
+    conn.execute("ALTER TABLE matches ADD COLUMN last_action_id INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_archive ON matches (last_action_id) WHERE archive IS NOT NULL")
+
+def _migration_10_rosters(conn):
+    # Équipes et effectifs en base (plusieurs équipes du club sur un même déploiement), modifiables sans redéployer.
+    # L'effectif codé en dur jusqu'ici devient l'équipe 1. Chaque match est rattaché à une équipe et chaque action
+    # à un joueur par son id ; joueur_nom reste le nom au moment de l'action (agrégats, analyse, export, archives).
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS teams (
+            id INTEGER PRIMARY KEY,
+            nom TEXT NOT NULL UNIQUE,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS players (
+            id INTEGER PRIMARY KEY,
+            team_id INTEGER NOT NULL REFERENCES teams (id),
+            numero INTEGER NOT NULL,
+            nom TEXT NOT NULL,
+            actif INTEGER NOT NULL DEFAULT 1
+        )
+    """)
+    # Un numéro par joueur actif dans une équipe ; un joueur parti est désactivé, jamais supprimé (actions)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_players_team_numero ON players (team_id, numero) WHERE actif")
+    # Version de l'équipe, incrémentée à chaque modification de son effectif : invalide le cache des workers (roster.py)
+    for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_players_team_version_{event.lower()} AFTER {event} ON players
+            BEGIN
+                UPDATE teams SET version = version + 1 WHERE id = {row}.team_id;
+            END
+        """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_teams_version_rename AFTER UPDATE OF nom ON teams
+        BEGIN
+            UPDATE teams SET version = version + 1 WHERE id = NEW.id;
+        END
+    """)
+    conn.execute("INSERT INTO teams (id, nom) VALUES (?, ?)", (DEFAULT_TEAM_ID, DEFAULT_TEAM_NAME))
+    conn.executemany("INSERT INTO players (team_id, numero, nom) VALUES (?, ?, ?)",
+                     [(DEFAULT_TEAM_ID, p['numero'], p['nom']) for p in LISTE_JOUEURS_PREDEFINIE])
+
+    conn.execute(f"ALTER TABLE matches ADD COLUMN team_id INTEGER NOT NULL DEFAULT {DEFAULT_TEAM_ID}")
+    conn.execute("ALTER TABLE actions ADD COLUMN joueur_id INTEGER") # players.id (NULL : joueur hors effectif, import)
+    # Actions existantes : joueur de l'effectif portant ce nom (NULL pour les joueurs hors effectif importés)
+    conn.execute("""
+        UPDATE actions SET joueur_id = (SELECT p.id FROM players p WHERE p.team_id = ? AND p.nom = actions.joueur_nom)
+    """, (DEFAULT_TEAM_ID,))
+
+MIGRATIONS = [
+    _migration_1_create_actions,
+    _migration_2_index_actions,
+    _migration_3_typed_columns,
+    _migration_4_client_uuid,
+    _migration_5_aggregates,
+    _migration_6_deletion_log,
+    _migration_7_matches,
+    _migration_8_set_results,
+    _migration_9_archive,
+    _migration_10_rosters,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def migrate(conn):
+    """Applique les migrations manquantes (à appeler dans une transaction)."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target_version, migration in enumerate(MIGRATIONS, start=1):
+        if target_version > version:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version={target_version}")
+    return max(version, SCHEMA_VERSION)
+
+def init_db():
+    with transaction() as conn:
+        migrate(conn)
+
+# --- FONCTIONS D'AIDE SQLite ---
+
+def _set_result_params(match_id, set_result, last_action_id=None):
+    return (match_id, set_result.set_num, set_result.score_veec, set_result.score_adverse, set_result.winner,
+            int(set_result.match_over), set_result.timestamp, last_action_id, match_id)
+
+@timed(SQLITE_QUERY_SECONDS, query='insert_stat')
+def insert_stat(match_id, set_num, timestamp, score_veec, score_adverse, position, joueur_nom, action_category, action_result,
+                joueur_id=None, set_result=None):
+    """Enregistre une action ; set_result (SetResult) : fin de set provoquée par l'action, écrite dans la même transaction."""
+    params = (match_id, set_num, timestamp, score_veec, score_adverse, position, joueur_nom, action_category, action_result, joueur_id)
+    statements = [(SQL_INSERT_ACTION, params)]
+    if set_result:
+        statements.append((SQL_INSERT_SET_RESULT, _set_result_params(match_id, set_result)))
+    if GROUP_COMMIT:
+        # Action et fin de set forment une seule unité du lot ; bloque jusqu'au COMMIT de ce lot
+        _writer.submit(statements).result()
+        return
+
+    with transaction() as conn:
+        for sql, statement_params in statements:
+            conn.execute(sql, statement_params)
+
+def insert_set_result(conn, match_id, set_result):
+    """Enregistre, dans la transaction en cours, la fin de set provoquée par la dernière action insérée du match."""
+    conn.execute(SQL_INSERT_SET_RESULT, _set_result_params(match_id, set_result))
+
+def rebuild_set_results(conn, match_ids):
+    """Recalcule les fins de set des matchs donnés en rejouant leurs actions (migration, import en masse)."""
+    for match_id in match_ids:
+        conn.execute("DELETE FROM match_sets WHERE match_id = ?", (match_id,))
+        engine = ScoreEngine()
+        rows = conn.execute("""
+            SELECT id, timestamp, position, joueur_nom, action_category || '_' || action_result
+            FROM actions WHERE match_id = ? ORDER BY id
+        """, (match_id,))
+        for action_id, timestamp, position, joueur_nom, action_code in rows.fetchall():
+            set_result = engine.append(Event(timestamp, position, joueur_nom, action_code)).set_result
+            if set_result:
+                conn.execute(SQL_INSERT_SET_RESULT, _set_result_params(match_id, set_result, action_id))
+                if set_result.match_over:
+                    break # Actions saisies après la fin du match (données importées) : le match est rejoué à la reprise
+
+@timed(SQLITE_QUERY_SECONDS, query='delete_last_stat_and_get_data')
+def delete_last_stat_and_get_data(match_id):
+    """
+    Supprime la dernière ligne enregistrée pour le match_id donné et retourne
+    l'action code et le set de l'entrée supprimée pour la correction du score Dash.
+    """
+    with transaction() as conn:
+        # 1. Sélectionner la dernière ligne (ID le plus élevé) pour le match en cours
+        last_row = conn.execute(SQL_SELECT_LAST_ACTION, (match_id,)).fetchone()
+        if not last_row:
+            return None
+
+        # 2. Supprimer la ligne
+        conn.execute(SQL_DELETE_ACTION, (last_row['id'],))
+
+    # 3. Retourner les données importantes pour la correction du score
+    return {'action': last_row['action_code'], 'set': last_row['set_num'], 'score_avant_action': last_row['score_at_action']}
+
+@timed(SQLITE_QUERY_SECONDS, query='fetch_all_stats')
+def fetch_all_stats(match_id, conn=None):
+    with _connection(conn) as conn:
+        rows = conn.execute(SQL_SELECT_MATCH_ACTIONS, (match_id,)).fetchall()
+
+    # Convertir en liste de dictionnaires
+    return [dict(row) for row in rows]
+
+def create_aggregate_triggers(conn):
+    for statement in SQL_CREATE_AGGREGATE_TRIGGERS.split("END;")[:-1]:
+        conn.execute(statement + "END;")
+
+def rebuild_aggregates(conn):
+    """Recalcule entièrement les tables d'agrégats depuis 'actions' (migration)."""
+    conn.execute("DELETE FROM stats_joueur")
+    conn.execute("DELETE FROM stats_position")
+    add_aggregates_since(conn, 0)
+
+def add_aggregates_since(conn, last_id):
+    """Ajoute aux agrégats les actions d'id > last_id, en une requête par table (import en masse)."""
+    conn.execute("""
+        INSERT INTO stats_joueur (match_id, set_num, joueur_nom, action_category, action_result, count)
+        SELECT match_id, set_num, joueur_nom, action_category, action_result, COUNT(*)
+        FROM actions WHERE id > ?
+        GROUP BY match_id, set_num, joueur_nom, action_category, action_result
+        ON CONFLICT DO UPDATE SET count = count + excluded.count
+    """, (last_id,))
+    conn.execute("""
+        INSERT INTO stats_position (match_id, set_num, position, joueur_nom, action_category, action_result, count)
+        SELECT match_id, set_num, position, joueur_nom, action_category, action_result, COUNT(*)
+        FROM actions WHERE id > ?
+        GROUP BY match_id, set_num, position, joueur_nom, action_category, action_result
+        ON CONFLICT DO UPDATE SET count = count + excluded.count
+    """, (last_id,))
+
+@contextmanager
+def actions_schema_suspended(conn, kinds=('trigger',)):
+    """
+    Supprime les triggers (et les index si 'index' est dans kinds) de la table 'actions' le temps du bloc,
+    puis les recrée à l'identique. À utiliser dans une transaction : les autres connexions ne voient jamais
+    la table sans ses triggers.
+    """
+    deferred = conn.execute(f"""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name = 'actions' AND sql IS NOT NULL AND type IN ({', '.join('?' * len(kinds))})
+    """, kinds).fetchall()
+    for kind, name, _ in deferred:
+        conn.execute(f'DROP {kind.upper()} "{name}"')
+    yield
+    for _, _, sql in deferred:
+        conn.execute(sql)
+
+def bulk_insert_actions(batches, team_id=DEFAULT_TEAM_ID, progress=None):
+    """
+    Insère des paquets de lignes (tuples dans l'ordre de SQL_INSERT_ACTION), une courte transaction par paquet :
+    le verrou d'écriture est rendu entre deux paquets, les saisies en cours passent entre eux.
+    Les matchs qui n'existaient pas encore sont rattachés à l'équipe team_id.
+    Dans chaque transaction, les triggers de 'actions' sont suspendus : agrégats et versions de match sont mis à jour
+    en une passe sur les lignes du paquet, puis les fins de set des matchs du paquet sont recalculées. Chaque paquet
+    validé laisse donc la base cohérente ; une exception levée par 'batches' n'annule que le paquet en cours.
+    progress(étape, lignes insérées) est appelé après chaque paquet. Retourne le nombre de lignes insérées.
+    """
+    inserted = 0
+    for batch in batches: # Lecture et validation du paquet suivant hors transaction
+        with transaction() as conn:
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM actions").fetchone()[0]
+            with actions_schema_suspended(conn):
+                conn.executemany(SQL_INSERT_ACTION, batch)
+                add_aggregates_since(conn, last_id)
+                conn.execute("""
+                    INSERT INTO matches (match_id, version, team_id)
+                    SELECT match_id, COUNT(*), ? FROM actions WHERE id > ? GROUP BY match_id
+                    ON CONFLICT DO UPDATE SET version = version + excluded.version, updated_at = datetime('now')
+                """, (team_id, last_id))
+            # Match à cheval sur deux paquets : ses fins de set sont recalculées à chacun d'eux. Un match archivé est
+            # terminé et ses lignes ne sont plus dans 'actions' : ses fins de set enregistrées restent valables
+            match_ids = sorted({row[0] for row in batch})
+            archived = {row[0] for row in conn.execute(f"""
+                SELECT match_id FROM matches WHERE archive IS NOT NULL AND match_id IN ({', '.join('?' * len(match_ids))})
+            """, match_ids)}
+            rebuild_set_results(conn, [match_id for match_id in match_ids if match_id not in archived])
+        inserted += len(batch)
+        if progress:
+            progress('insertion', inserted)
+    return inserted
+
+@timed(SQLITE_QUERY_SECONDS, query='fetch_player_aggregates')
+def fetch_player_aggregates(match_id, set_num=None):
+    """Compteurs (joueur, catégorie, résultat) d'un match, pour un set ou pour tout le match."""
+    with get_connection() as conn:
+        rows = conn.execute(SQL_SELECT_PLAYER_AGGREGATES, (match_id, set_num, set_num)).fetchall()
+    return [dict(row) for row in rows]
+
+@timed(SQLITE_QUERY_SECONDS, query='fetch_position_aggregates')
+def fetch_position_aggregates(match_id, set_num=None, joueur_nom=None, action_category=None):
+    """Compteurs (position, catégorie, résultat) d'un match, filtrables par set, joueur et catégorie."""
+    with get_connection() as conn:
+        rows = conn.execute(SQL_SELECT_POSITION_AGGREGATES, (match_id, set_num, set_num, joueur_nom, joueur_nom,
+                                                             action_category, action_category)).fetchall()
+    return [dict(row) for row in rows]
+
+@timed(SQLITE_QUERY_SECONDS, query='fetch_match_version')
+def fetch_match_version(match_id, conn=None):
+    """Version du match dans la table 'matches' (0 si aucune action n'a encore été écrite)."""
+    with _connection(conn) as conn:
+        row = conn.execute(SQL_SELECT_MATCH_VERSION, (match_id,)).fetchone()
+    return row[0] if row else 0
+
+@timed(SQLITE_QUERY_SECONDS, query='fetch_match_team')
+def fetch_match_team(match_id, conn=None):
+    """Équipe du match (DEFAULT_TEAM_ID tant que le match n'a rien écrit en base)."""
+    with _connection(conn) as conn:
+        row = conn.execute("SELECT team_id FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+    return row[0] if row else DEFAULT_TEAM_ID
+
+def set_match_team(conn, match_id, team_id):
+    """Rattache le match à une équipe dans la transaction en cours (la version du match est incrémentée)."""
+    conn.execute(SQL_SET_MATCH_TEAM, (match_id, team_id))
+
+@timed(SQLITE_QUERY_SECONDS, query='fetch_set_results')
+def fetch_set_results(match_id):
+    """Fins de set enregistrées d'un match, dans l'ordre : [(id de la dernière action du set, SetResult), ...]."""
+    with get_connection() as conn:
+        rows = conn.execute(SQL_SELECT_SET_RESULTS, (match_id,)).fetchall()
+    return [(row['last_action_id'], SetResult(row['set_num'], row['score_veec'], row['score_adverse'], row['winner'],
+                                              bool(row['match_over']), row['timestamp']))
+            for row in rows]
+
+@timed(SQLITE_QUERY_SECONDS, query='fetch_unfinished_matches')
+def fetch_unfinished_matches(limit=20):
+    """Matchs commencés et non terminés (reprise après un redémarrage ou un rechargement de page)."""
+    with get_connection() as conn:
+        rows = conn.execute(SQL_SELECT_UNFINISHED_MATCHES, (limit,)).fetchall()
+    return [dict(row) for row in rows]
+
+@timed(SQLITE_QUERY_SECONDS, query='fetch_match_versions')
+def fetch_match_versions(match_ids):
+    """Versions de plusieurs matchs en une requête : {match_id: version}."""
+    match_ids = list(match_ids)
+    if not match_ids:
+        return {}
+    placeholders = ", ".join("?" * len(match_ids))
+    with get_connection() as conn:
+        rows = conn.execute(f"SELECT match_id, version FROM matches WHERE match_id IN ({placeholders})", match_ids).fetchall()
+    versions = {match_id: 0 for match_id in match_ids}
+    versions.update((row[0], row[1]) for row in rows)
+    return versions
+
+def iter_actions_since(last_id, batch_size=10000, conn=None):
+    """Parcourt les actions d'id > last_id par ordre d'id, par paquets de lignes (jamais toute la table en mémoire)."""
+    with _connection(conn) as conn:
+        cursor = conn.execute(SQL_SELECT_ACTIONS_SINCE, (last_id,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+def iter_actions(match_id=None, set_num=None, date_from=None, date_to=None, batch_size=5000, conn=None):
+    """
+    Parcourt les actions (ordre d'id) par paquets, avec un curseur ouvert pendant toute la lecture.
+    date_from / date_to ('AAAAMMJJ') filtrent sur la date contenue dans l'identifiant 'Match_AAAAMMJJ_...'.
+    """
+    where, params = [], []
+    if match_id:
+        where.append("match_id = ?")
+        params.append(match_id)
+    if set_num:
+        where.append("set_num = ?")
+        params.append(set_num)
+    if date_from:
+        where.append("substr(match_id, 7, 8) >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("substr(match_id, 7, 8) <= ?")
+        params.append(date_to)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    with _connection(conn) as conn:
+        cursor = conn.execute(f"SELECT {ACTION_COLUMNS} FROM actions {where_sql} ORDER BY id", params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+@timed(SQLITE_QUERY_SECONDS, query='fetch_deletions_since')
+def fetch_deletions_since(seq):
+    """Retourne (dernier numéro du journal des suppressions, plus petit id supprimé depuis seq) ou (None, None)."""
+    with get_connection() as conn:
+        return tuple(conn.execute(SQL_SELECT_DELETIONS_SINCE, (seq,)).fetchone())
+
+@timed(SQLITE_QUERY_SECONDS, query='find_known_client_uuids')
+def find_known_client_uuids(conn, uuids):
+    """Retourne les UUID client déjà présents dans la table 'actions' (par paquets, limite de paramètres SQLite)."""
+    uuids = list(uuids)
+    known = set()
+    for start in range(0, len(uuids), 500):
+        chunk = uuids[start:start + 500]
+        placeholders = ", ".join("?" * len(chunk))
+        rows = conn.execute(f"SELECT client_uuid FROM actions WHERE client_uuid IN ({placeholders})", chunk).fetchall()
+        known.update(row[0] for row in rows)
+    return known
+
+@timed(SQLITE_QUERY_SECONDS, query='insert_client_action')
+def insert_client_action(conn, match_id, set_num, timestamp, score_veec, score_adverse, position, joueur_nom,
+                         action_category, action_result, joueur_id, client_uuid, client_seq):
+    """Insère une action venant de la file client dans la transaction en cours ; retourne False si l'UUID était déjà connu."""
+    cursor = conn.execute(SQL_INSERT_CLIENT_ACTION, (match_id, set_num, timestamp, score_veec, score_adverse, position, joueur_nom,
+                                                     action_category, action_result, joueur_id, client_uuid, client_seq))
+    return cursor.rowcount == 1
+
+@timed(SQLITE_QUERY_SECONDS, query='fetch_stats_page')
+def fetch_stats_page(match_id, filters=(), sort_by=(), offset=0, limit=25, conn=None):
+    """
+    Retourne une page de l'historique d'un match et le nombre total de lignes correspondant aux filtres.
+    filters : liste de (colonne, opérateur, valeur) ; sort_by : liste de (colonne, 'asc' | 'desc').
+    Tri, filtrage et pagination sont faits par SQLite (LIMIT/OFFSET sur l'index (match_id, id)).
+    conn : autre base ayant une table 'actions' (match archivé chargé en mémoire, voir archive.py).
+    """
+    where = ["match_id = ?"]
+    params = [match_id]
+    for column, operator, value in filters:
+        expr = HISTORIQUE_SQL_COLUMNS[column]
+        if operator == 'contains':
+            where.append(f"{expr} LIKE ?")
+            params.append(f"%{value}%")
+        elif operator == 'datestartswith':
+            where.append(f"{expr} LIKE ?")
+            params.append(f"{value}%")
+        else:
+            where.append(f"{expr} {HISTORIQUE_SQL_OPERATORS[operator]} ?")
+            params.append(value)
+    where_sql = " AND ".join(where)
+
+    order = []
+    for column, direction in sort_by:
+        direction = 'ASC' if direction == 'asc' else 'DESC'
+        if column == 'score':
+            order.append(f"score_veec {direction}, score_adverse {direction}") # Tri numérique, pas alphabétique
+        else:
+            order.append(f"{HISTORIQUE_SQL_COLUMNS[column]} {direction}")
+    order.append("id DESC") # Ordre stable entre les pages
+    columns = ", ".join(f'{expr} AS "{column}"' for column, expr in HISTORIQUE_SQL_COLUMNS.items())
+
+    with _connection(conn) as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM actions WHERE {where_sql}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {columns} FROM actions WHERE {where_sql} ORDER BY {', '.join(order)} LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchall()
+    return [dict(row) for row in rows], total
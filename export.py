@@ -0,0 +1,176 @@
+"""
+Export des actions en CSV, JSON Lines ou XLSX, en flux.
+
+Les lignes sont lues par paquets (curseur SQLite ouvert pendant la réponse) et chaque paquet est converti puis
+envoyé aussitôt : la mémoire utilisée ne dépend pas de la taille de l'export, et la lecture (WAL) ne bloque pas
+les écritures des terrains en cours de saisie.
+
+Le XLSX est écrit avec zipfile de la bibliothèque standard, en mode flux (sans retour arrière dans le fichier) ;
+les cellules texte sont en ligne (inlineStr), sans table de chaînes partagées à garder en mémoire.
+"""
+import csv
+import io
+import json
+import zipfile
+from xml.sax.saxutils import escape
+
+from archive import iter_actions # Matchs archivés compris
+from registry import ACTIONS_BY_CODE
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+# Colonnes exportées : colonnes de la table 'actions' + code et libellé de l'action
+EXPORT_COLUMNS = ['id', 'match_id', 'set_num', 'timestamp', 'score_veec', 'score_adverse', 'position',
+                  'joueur_nom', 'action_category', 'action_result', 'action_code', 'action_label']
+NUMERIC_EXPORT_COLUMNS = {'id', 'set_num', 'score_veec', 'score_adverse'}
+
+XLSX_MAX_ROWS = 1048576 # Limite d'Excel par feuille (en-tête compris) : les lignes suivantes vont sur une nouvelle feuille
+
+
+def export_record(row):
+    info = ACTIONS_BY_CODE.get(row['action_code'])
+    record = {column: row[column] for column in EXPORT_COLUMNS[:-1]}
+    record['action_label'] = info.label if info else ''
+    return record
+
+def _records(**filters):
+    for rows in iter_actions(**filters):
+        yield [export_record(row) for row in rows]
+
+# --- CSV ---
+
+def stream_csv(**filters):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';') # ';' : séparateur attendu par Excel en français
+    writer.writerow(EXPORT_COLUMNS)
+    yield '﻿' + buffer.getvalue() # BOM : Excel détecte l'UTF-8 (accents des noms)
+    for records in _records(**filters):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([record[column] for column in EXPORT_COLUMNS] for record in records)
+        yield buffer.getvalue()
+
+# --- JSON LINES ---
+
+def stream_jsonl(**filters):
+    for records in _records(**filters):
+        yield ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+# --- XLSX ---
+
+class _ChunkSink:
+    """Fichier en écriture seule (ni tell ni seek) : zipfile passe en mode flux ; les octets sont récupérés par drain()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+_COLUMN_LETTERS = [_column_letter(i) for i in range(len(EXPORT_COLUMNS))]
+
+def _xlsx_row(row_num, values):
+    cells = []
+    for letter, column, value in zip(_COLUMN_LETTERS, EXPORT_COLUMNS, values):
+        ref = f"{letter}{row_num}"
+        if row_num > 1 and column in NUMERIC_EXPORT_COLUMNS and value is not None:
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        else:
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t>{escape(str(value))}</t></is></c>')
+    return f'<row r="{row_num}">{"".join(cells)}</row>'
+
+_SHEET_HEADER = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                 '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_FOOTER = '</sheetData></worksheet>'
+
+def _xlsx_static_parts(sheet_count):
+    sheets = ''.join(f'<sheet name="Actions{" " + str(i) if i > 1 else ""}" sheetId="{i}" r:id="rId{i}"/>'
+                     for i in range(1, sheet_count + 1))
+    rels = ''.join(f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                   f'Target="worksheets/sheet{i}.xml"/>' for i in range(1, sheet_count + 1))
+    overrides = ''.join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+                        f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                        for i in range(1, sheet_count + 1))
+    return {
+        '[Content_Types].xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            f'{overrides}</Types>'),
+        '_rels/.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'),
+        'xl/workbook.xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{sheets}</sheets></workbook>'),
+        'xl/_rels/workbook.xml.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{rels}</Relationships>'),
+    }
+
+def stream_xlsx(**filters):
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        sheet_count = 1
+        sheet = archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        sheet.write((_SHEET_HEADER + _xlsx_row(1, EXPORT_COLUMNS)).encode('utf-8'))
+        row_num = 1
+        for records in _records(**filters):
+            parts = []
+            for record in records:
+                if row_num == XLSX_MAX_ROWS:
+                    # Feuille pleine : on la ferme et on continue sur la suivante
+                    sheet.write((''.join(parts) + _SHEET_FOOTER).encode('utf-8'))
+                    sheet.close()
+                    parts = []
+                    sheet_count += 1
+                    sheet = archive.open(f'xl/worksheets/sheet{sheet_count}.xml', 'w', force_zip64=True)
+                    sheet.write((_SHEET_HEADER + _xlsx_row(1, EXPORT_COLUMNS)).encode('utf-8'))
+                    row_num = 1
+                row_num += 1
+                parts.append(_xlsx_row(row_num, [record[column] for column in EXPORT_COLUMNS]))
+            sheet.write(''.join(parts).encode('utf-8'))
+            yield sink.drain()
+        sheet.write(_SHEET_FOOTER.encode('utf-8'))
+        sheet.close()
+        # Le classeur ne connaît le nombre de feuilles qu'à la fin : l'ordre des entrées d'un zip est libre
+        for name, content in _xlsx_static_parts(sheet_count).items():
+            archive.writestr(name, content)
+    yield sink.drain()
+
+EXPORT_STREAMS = {'csv': stream_csv, 'jsonl': stream_jsonl, 'xlsx': stream_xlsx}
+
+def export_filename(fmt, match_id=None, set_num=None, date_from=None, date_to=None):
+    if match_id:
+        name = f"{match_id}_set{set_num}" if set_num else match_id
+    else:
+        name = f"saison_{date_from or 'debut'}_{date_to or 'fin'}"
+    return f"veec_{name}.{EXPORT_FORMATS[fmt][1]}"
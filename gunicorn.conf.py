@@ -0,0 +1,40 @@
+# Configuration gunicorn du mode production : gunicorn -c gunicorn.conf.py 'app:create_server()'
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('VEEC_PORT', '8051')}"
+
+# Plusieurs processus (un par cœur par défaut) ; les matchs en mémoire de chaque worker restent cohérents
+# grâce à la version de la table 'matches' (voir load_match_state dans app.py).
+workers = int(os.environ.get('VEEC_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# Workers à threads : les flux /live/<match_id>/events restent ouverts et occupent chacun un thread. Ils sont
+# plafonnés par worker (VEEC_LIVE_MAX_STREAMS, moitié des threads par défaut, voir live.py) : au-delà, 503.
+worker_class = 'gthread'
+threads = int(os.environ.get('VEEC_THREADS', '16'))
+
+# Preload : l'application est importée et préparée (migrations, layout statique) une seule fois par le maître,
+# puis partagée par fork ; un worker redémarré est prêt aussitôt. Le pool SQLite est vidé avant le fork
+# (create_app) et les threads (écriture groupée, direct, mesures, maintenance) ne démarrent qu'à la première requête du worker.
+preload_app = True
+
+# Mesures (/metrics) : chaque worker écrit ses valeurs dans ce dossier, additionnées par celui qui répond.
+# Défini ici (processus maître) pour être hérité par tous les workers ; vidé à chaque démarrage du serveur.
+os.environ.setdefault('VEEC_METRICS_DIR', os.path.join(tempfile.gettempdir(), f"veec-metrics-{os.environ.get('VEEC_PORT', '8051')}"))
+
+def on_starting(server):
+    shutil.rmtree(os.environ['VEEC_METRICS_DIR'], ignore_errors=True)
+
+def child_exit(server, worker):
+    # Valeurs d'un worker arrêté (redémarrage, max_requests, plantage) : plus additionnées par /metrics
+    import metrics
+    metrics.mark_process_dead(worker.pid)
+
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('VEEC_LOG_LEVEL', 'info')
@@ -0,0 +1,474 @@
+"""
+Import en masse de matchs passés (CSV, JSON Lines ou XLSX) dans la table 'actions'.
+
+Les lignes sont lues en flux, validées contre le référentiel (codes d'ACTION_CATEGORIES, effectif, positions),
+puis insérées par paquets avec executemany, une courte transaction par paquet (voir database.bulk_insert_actions) :
+le verrou d'écriture est rendu entre deux paquets, un import peut tourner pendant les saisies d'un match.
+En mode strict, tout le fichier est validé avant la première écriture : une ligne invalide n'écrit rien.
+
+Colonnes reconnues (en-tête, insensible à la casse) : celles de l'export (export.py) ; 'set', 'joueur', 'pos',
+'action' et 'score' ('V-A') sont acceptés comme alias. Sans colonnes de set et de score, ils sont recalculés
+par le moteur de score, repris des actions déjà en base pour ce match puis nourri des lignes du fichier dans l'ordre.
+Les lignes d'un match déjà terminé (en base ou plus haut dans le fichier) sont rejetées.
+
+Les joueurs sont cherchés (nom ou numéro) dans l'effectif de l'équipe choisie (roster.py, équipe 1 par défaut),
+à laquelle sont rattachés les matchs importés.
+
+Ligne de commande : python importer.py saison_2024.csv [autre_fichier.xlsx ...] [--strict] [--allow-unknown-players]
+                    [--equipe ID]
+"""
+import argparse
+import csv
+import html
+import json
+import os
+import queue
+import re
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+import roster
+from action_log import ActionLog
+from archive import fetch_all_stats # Matchs archivés compris
+from database import DEFAULT_TEAM_ID, init_db, bulk_insert_actions, fetch_set_results
+from registry import ACTIONS_BY_CODE
+from score_engine import ScoreEngine, Event, MAX_SETS
+
+# --- CONFIGURATION ---
+
+IMPORT_BATCH_SIZE = 5000 # Lignes par transaction : verrou d'écriture tenu quelques dizaines de millisecondes
+MAX_REPORTED_ERRORS = 50 # Les erreurs suivantes sont seulement comptées
+
+IMPORT_FORMATS = {'.csv': 'csv', '.txt': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.xlsx': 'xlsx'}
+
+# En-têtes acceptés -> colonne de la table 'actions'
+COLUMN_ALIASES = {'set': 'set_num', 'joueur': 'joueur_nom', 'pos': 'position', 'action': 'action_code', 'score_at_action': 'score'}
+
+# Les identifiants de match portent leur date : filtres de période de l'export et de l'archivage
+MATCH_ID_PATTERN = re.compile(r'^Match_\d{8}_')
+
+POSITIONS = {f"P{n}" for n in range(1, 7)}
+
+
+class ImportAborted(Exception):
+    """Import annulé en mode strict : aucune ligne n'a été écrite."""
+
+
+# --- LECTURE DES FICHIERS ---
+
+def _normalize_header(name):
+    name = str(name or '').strip().lower().replace(' ', '_')
+    return COLUMN_ALIASES.get(name, name)
+
+def _read_csv(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        first_line = f.readline()
+        f.seek(0)
+        # ';' (Excel en français, export.py) ou ','
+        delimiter = ';' if first_line.count(';') >= first_line.count(',') else ','
+        reader = csv.reader(f, delimiter=delimiter)
+        header = [_normalize_header(name) for name in next(reader, [])]
+        for line_num, values in enumerate(reader, start=2):
+            if any(values):
+                yield line_num, dict(zip(header, values))
+
+def _read_jsonl(path):
+    with open(path, encoding='utf-8-sig') as f:
+        for line_num, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict):
+                yield line_num, None
+                continue
+            yield line_num, {_normalize_header(key): value for key, value in record.items()}
+
+_XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+def _xlsx_column_index(ref):
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+def _read_xlsx(path):
+    """Lecture en flux des feuilles (iterparse) ; chaque feuille commence par sa ligne d'en-tête."""
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        shared_strings = []
+        if 'xl/sharedStrings.xml' in names:
+            with archive.open('xl/sharedStrings.xml') as f:
+                for _, elem in iterparse(f):
+                    if elem.tag == f'{_XLSX_NS}si':
+                        shared_strings.append(''.join(t.text or '' for t in elem.iter(f'{_XLSX_NS}t')))
+                        elem.clear()
+        sheets = sorted((name for name in names if re.fullmatch(r'xl/worksheets/sheet\d+\.xml', name)),
+                        key=lambda name: int(re.search(r'(\d+)\.xml$', name).group(1)))
+        for sheet_num, sheet in enumerate(sheets, start=1):
+            header = None
+            with archive.open(sheet) as f:
+                for _, elem in iterparse(f):
+                    if elem.tag != f'{_XLSX_NS}row':
+                        continue
+                    values = {}
+                    for position, cell in enumerate(elem.iter(f'{_XLSX_NS}c')):
+                        ref = cell.get('r')
+                        column = _xlsx_column_index(ref) if ref else position
+                        cell_type = cell.get('t')
+                        if cell_type == 's':
+                            value = shared_strings[int(cell.findtext(f'{_XLSX_NS}v'))]
+                        elif cell_type == 'inlineStr':
+                            value = ''.join(t.text or '' for t in cell.iter(f'{_XLSX_NS}t'))
+                        else:
+                            value = cell.findtext(f'{_XLSX_NS}v') or ''
+                        values[column] = value
+                    row_num = int(elem.get('r') or 0)
+                    elem.clear()
+                    if header is None:
+                        header = {column: _normalize_header(value) for column, value in values.items()}
+                        continue
+                    if any(values.values()):
+                        yield f"feuille {sheet_num}, ligne {row_num}", {header[c]: v for c, v in values.items() if c in header}
+
+READERS = {'csv': _read_csv, 'jsonl': _read_jsonl, 'xlsx': _read_xlsx}
+
+def detect_format(filename):
+    fmt = IMPORT_FORMATS.get(os.path.splitext(filename)[1].lower())
+    if fmt is None:
+        raise ValueError(f"format non reconnu : {filename} (attendu : {', '.join(sorted(IMPORT_FORMATS))})")
+    return fmt
+
+# --- VALIDATION ---
+
+def _text(record, column):
+    value = record.get(column)
+    return '' if value is None else str(value).strip()
+
+def _integer(record, column):
+    value = _text(record, column)
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"{column} invalide : {value!r}")
+    if not number.is_integer():
+        raise ValueError(f"{column} invalide : {value!r}")
+    return int(number)
+
+def _timestamp(record):
+    value = _text(record, 'timestamp')
+    try:
+        fraction = float(value)
+    except ValueError:
+        return value
+    # Heure Excel (fraction de journée) -> 'HH:MM:SS'
+    seconds = round((fraction % 1) * 86400)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def _player(record, team, allow_unknown_players):
+    """(nom, id du joueur) ; id None pour un joueur hors effectif accepté."""
+    value = _text(record, 'joueur_nom')
+    player = team.by_nom.get(value)
+    numero = value.removeprefix('N°').strip()
+    if player is None and numero.isdigit():
+        player = team.by_numero.get(int(numero))
+    if player is not None:
+        return player.nom, player.id
+    if allow_unknown_players and value:
+        return value, None
+    raise ValueError(f"joueur inconnu de l'effectif : {value!r}")
+
+def _action(record):
+    code = _text(record, 'action_code').upper()
+    if not code and record.get('action_category'):
+        code = f"{_text(record, 'action_category').upper()}_{_text(record, 'action_result').upper()}"
+    info = ACTIONS_BY_CODE.get(code)
+    if info is None:
+        raise ValueError(f"code action inconnu : {code!r}")
+    return info
+
+def validate_record(record, team, allow_unknown_players=False):
+    """Contrôle une ligne lue ; retourne un dict aux colonnes de la table 'actions' (set et score éventuellement absents)."""
+    match_id = _text(record, 'match_id')
+    if not MATCH_ID_PATTERN.match(match_id):
+        raise ValueError(f"match_id invalide : {match_id!r} (attendu : 'Match_AAAAMMJJ_...')")
+    position = _text(record, 'position').upper()
+    if position.isdigit():
+        position = f"P{position}"
+    if position not in POSITIONS:
+        raise ValueError(f"position invalide : {position!r}")
+    info = _action(record)
+    joueur_nom, joueur_id = _player(record, team, allow_unknown_players)
+    row = {
+        'match_id': match_id,
+        'timestamp': _timestamp(record),
+        'position': position,
+        'joueur_nom': joueur_nom,
+        'joueur_id': joueur_id,
+        'action_category': info.category,
+        'action_result': info.result,
+        'action_code': info.code,
+    }
+    if _text(record, 'set_num'):
+        row['set_num'] = _integer(record, 'set_num')
+        if not 1 <= row['set_num'] <= MAX_SETS:
+            raise ValueError(f"set_num hors limites : {row['set_num']}")
+    if _text(record, 'score') and not _text(record, 'score_veec'):
+        record = {**record, **dict(zip(('score_veec', 'score_adverse'), _text(record, 'score').split('-', 1)))}
+    if _text(record, 'score_veec') or _text(record, 'score_adverse'):
+        row['score_veec'] = _integer(record, 'score_veec')
+        row['score_adverse'] = _integer(record, 'score_adverse')
+        if row['score_veec'] < 0 or row['score_adverse'] < 0:
+            raise ValueError("score négatif")
+    return row
+
+# --- IMPORT ---
+
+def _stored_engine(match_id):
+    """Moteur de score repris des actions déjà en base pour ce match (archives comprises), vide pour un nouveau match."""
+    rows = fetch_all_stats(match_id)
+    rows.reverse()
+    log = ActionLog()
+    for row in rows:
+        log.append(row['timestamp'], row['position'], row['joueur_nom'], row['action_code'],
+                   row['set_num'], row['score_veec'], row['score_adverse'])
+    index_by_id = {row['id']: index for index, row in enumerate(rows)}
+    return ScoreEngine.resume(log, [(index_by_id.get(action_id, -1), set_result)
+                                    for action_id, set_result in fetch_set_results(match_id)])
+
+def import_file(path, fmt=None, strict=False, allow_unknown_players=False, team_id=DEFAULT_TEAM_ID,
+                batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Importe un fichier ; retourne le rapport {'file', 'read', 'imported', 'rejected', 'errors', 'step', 'seconds'}.
+    Les nouveaux matchs sont rattachés à l'équipe team_id, dont l'effectif sert à valider les joueurs.
+    Les lignes invalides sont ignorées (et listées dans 'errors'), ou annulent tout l'import si strict : le fichier
+    est alors lu deux fois, une première pour le valider entièrement avant d'écrire le moindre paquet.
+    progress(rapport) est appelé après chaque paquet inséré et à chaque étape finale.
+    """
+    fmt = fmt or detect_format(path)
+    report = {'file': os.path.basename(path), 'read': 0, 'imported': 0, 'rejected': 0, 'errors': [], 'step': 'lecture', 'seconds': 0.0}
+    started = time.perf_counter()
+    init_db()
+    team = next((t for t in roster.teams() if t.id == team_id), None)
+    if team is None:
+        raise ValueError(f"équipe inconnue : {team_id}")
+
+    def reject(line, message):
+        report['rejected'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line, 'message': message})
+        if strict:
+            raise ImportAborted(f"{line} : {message}")
+
+    def rows():
+        """Lignes valides du fichier, set et score complétés par le moteur de score ; les autres sont rejetées."""
+        engines = {} # match_id -> ScoreEngine, repris de la base au premier passage du match (une fois par lecture)
+        for line, record in READERS[fmt](path):
+            report['read'] += 1
+            if record is None:
+                reject(line, "ligne JSON invalide")
+                continue
+            try:
+                row = validate_record(record, team, allow_unknown_players)
+            except ValueError as e:
+                reject(line, str(e))
+                continue
+            engine = engines.get(row['match_id'])
+            if engine is None:
+                engine = engines[row['match_id']] = _stored_engine(row['match_id'])
+            if engine.match_over:
+                reject(line, f"match déjà terminé : {row['match_id']}")
+                continue
+            # Toutes les lignes passent par le moteur, même celles qui donnent leur set et leur score :
+            # les suivantes du même match sont calculées après elles
+            derived = engine.append(Event(row['timestamp'], row['position'], row['joueur_nom'], row['action_code']))
+            row.setdefault('set_num', derived.set_num)
+            row.setdefault('score_veec', derived.score_veec)
+            row.setdefault('score_adverse', derived.score_adverse)
+            yield row
+
+    def batches():
+        batch = []
+        for row in rows():
+            batch.append((row['match_id'], row['set_num'], row['timestamp'], row['score_veec'], row['score_adverse'],
+                          row['position'], row['joueur_nom'], row['action_category'], row['action_result'], row['joueur_id']))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def on_progress(step, inserted):
+        report['step'], report['imported'] = step, inserted
+        report['seconds'] = round(time.perf_counter() - started, 2)
+        if progress:
+            progress(report)
+
+    try:
+        if strict:
+            # Les paquets sont validés un à un : une ligne invalide trouvée en cours d'import ne pourrait plus annuler
+            # les précédents
+            on_progress('validation', 0)
+            for _ in rows():
+                pass
+            report['read'] = 0
+        report['imported'] = bulk_insert_actions(batches(), team_id=team_id, progress=on_progress)
+    except ImportAborted:
+        report['imported'] = 0
+        report['step'] = 'annulé'
+        raise
+    finally:
+        report['seconds'] = round(time.perf_counter() - started, 2)
+    report['step'] = 'terminé'
+    if progress:
+        progress(report)
+    return report
+
+def import_upload_stream(file_storage, strict=False, allow_unknown_players=False, team_id=DEFAULT_TEAM_ID):
+    """
+    Réponse de la page d'import : le fichier envoyé est copié sur disque puis importé dans un thread ;
+    le générateur renvoie une ligne JSON par avancement (rapport), la dernière contient 'done': true.
+    """
+    try:
+        fmt = detect_format(file_storage.filename or '')
+    except ValueError as e:
+        yield json.dumps({'done': True, 'error': str(e)}, ensure_ascii=False) + '\n'
+        return
+    updates = queue.Queue()
+    upload = tempfile.NamedTemporaryFile(suffix=f".{fmt}", delete=False)
+    with upload:
+        file_storage.save(upload)
+
+    def run():
+        try:
+            report = import_file(upload.name, fmt, strict=strict, allow_unknown_players=allow_unknown_players,
+                                 team_id=team_id, progress=lambda r: updates.put(dict(r)))
+            report = dict(report, file=file_storage.filename)
+            updates.put(dict(report, done=True))
+        except (ImportAborted, ValueError, zipfile.BadZipFile, UnicodeDecodeError) as e:
+            updates.put({'done': True, 'error': str(e)})
+        finally:
+            os.unlink(upload.name)
+
+    # L'import continue même si le navigateur ferme la page (le thread n'est pas lié à la réponse)
+    threading.Thread(target=run, name='veec-import', daemon=True).start()
+    while True:
+        update = updates.get()
+        yield json.dumps(update, ensure_ascii=False) + '\n'
+        if update.get('done'):
+            break
+
+
+UPLOAD_HTML = """<!DOCTYPE html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<title>VEEC - Import de matchs</title>
+<style>
+  body { font-family: sans-serif; max-width: 800px; margin: 40px auto; }
+  #progress { margin: 20px 0; font-weight: bold; }
+  #errors { color: #dc3545; font-size: 0.9em; }
+</style>
+</head>
+<body>
+  <h2>Import de matchs passés</h2>
+  <p>Fichiers CSV (séparateur ';' ou ','), JSON Lines ou XLSX, avec les colonnes de l'export :
+     match_id, timestamp, position, joueur_nom, action_code (ou action_category + action_result),
+     et si possible set_num, score_veec, score_adverse (sinon recalculés, à la suite des actions déjà enregistrées).
+     Les lignes d'un match déjà terminé sont rejetées.</p>
+  <p>L'import écrit par petits paquets : les saisies d'un match en cours restent possibles pendant ce temps.</p>
+  <form id="form">
+    <input type="file" name="file" accept=".csv,.txt,.jsonl,.ndjson,.xlsx" required>
+    <label>Équipe : <select name="team_id">__TEAM_OPTIONS__</select></label>
+    <label><input type="checkbox" name="strict" value="1"> Tout annuler à la première ligne invalide</label>
+    <label><input type="checkbox" name="allow_unknown_players" value="1"> Accepter les joueurs hors effectif</label>
+    <button type="submit">📤 Importer</button>
+  </form>
+  <div id="progress"></div>
+  <ul id="errors"></ul>
+  <p><a href="/">← Retour à la saisie</a></p>
+<script>
+  document.getElementById('form').onsubmit = async function (event) {
+    event.preventDefault();
+    var progress = document.getElementById('progress'), errors = document.getElementById('errors'), imported = 0;
+    progress.textContent = 'Envoi du fichier...';
+    errors.innerHTML = '';
+    var response = await fetch(__UPLOAD_URL__, {method: 'POST', body: new FormData(event.target)});
+    var reader = response.body.getReader(), decoder = new TextDecoder(), buffer = '';
+    while (true) {
+      var chunk = await reader.read();
+      if (chunk.done) break;
+      buffer += decoder.decode(chunk.value, {stream: true});
+      var lines = buffer.split('\\n');
+      buffer = lines.pop();
+      lines.forEach(function (line) {
+        if (!line) return;
+        var r = JSON.parse(line);
+        if (r.error) {
+          // Paquets déjà validés avant l'erreur : ils restent en base (aucun en mode strict)
+          progress.textContent = 'Import interrompu : ' + r.error + (imported ? ' (' + imported + ' ligne(s) déjà importée(s))' : '');
+          return;
+        }
+        imported = r.imported;
+        progress.textContent = (r.done ? 'Terminé' : 'Étape : ' + r.step) + ' - ' + r.read + ' ligne(s) lue(s), '
+          + r.imported + ' importée(s), ' + r.rejected + ' rejetée(s) en ' + r.seconds + ' s';
+        if (r.done) {
+          r.errors.forEach(function (e) {
+            var li = document.createElement('li');
+            li.textContent = e.line + ' : ' + e.message;
+            errors.appendChild(li);
+          });
+        }
+      });
+    }
+  };
+</script>
+</body>
+</html>
+"""
+
+def upload_page_html(upload_url):
+    options = "".join(f'<option value="{t.id}">{html.escape(t.nom)}</option>' for t in roster.teams())
+    return UPLOAD_HTML.replace('__UPLOAD_URL__', json.dumps(upload_url)).replace('__TEAM_OPTIONS__', options)
+
+# --- LIGNE DE COMMANDE ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import en masse de matchs passés dans la base VEEC.")
+    parser.add_argument('files', nargs='+', help="fichiers .csv, .jsonl ou .xlsx")
+    parser.add_argument('--strict', action='store_true', help="annule l'import d'un fichier à la première ligne invalide")
+    parser.add_argument('--allow-unknown-players', action='store_true', help="accepte les joueurs absents de l'effectif")
+    parser.add_argument('--equipe', type=int, default=DEFAULT_TEAM_ID, help="id de l'équipe des matchs importés")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    def show(report):
+        print(f"\r{report['file']} : {report['step']} - {report['read']} lue(s), {report['imported']} importée(s), "
+              f"{report['rejected']} rejetée(s), {report['seconds']} s", end='', file=sys.stderr, flush=True)
+
+    status = 0
+    for path in args.files:
+        try:
+            report = import_file(path, strict=args.strict, allow_unknown_players=args.allow_unknown_players,
+                                 team_id=args.equipe, batch_size=args.batch_size, progress=show)
+        except (ImportAborted, ValueError, OSError, zipfile.BadZipFile, UnicodeDecodeError) as e:
+            print(f"\n{path} : import annulé - {e}", file=sys.stderr)
+            status = 1
+            continue
+        print(file=sys.stderr)
+        for error in report['errors']:
+            print(f"  {error['line']} : {error['message']}", file=sys.stderr)
+        if report['rejected'] > len(report['errors']):
+            print(f"  ... et {report['rejected'] - len(report['errors'])} autre(s) ligne(s) rejetée(s)", file=sys.stderr)
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
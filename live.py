@@ -0,0 +1,196 @@
+"""
+Diffusion en direct du score (parents, second écran du coach, TV du club).
+
+Un courtier de messages en mémoire : chaque saisie, annulation ou ingestion publie une seule fois l'état du
+match ; chaque spectateur connecté à /live/<match_id>/events (server-sent events) reçoit le message par sa
+propre file. Aucun spectateur n'interroge SQLite, quel que soit leur nombre.
+
+Les spectateurs lents ne bloquent jamais la saisie : leur file est bornée et ne garde que les derniers états
+(un tableau de score n'a besoin que du plus récent). Chaque flux ouvert occupe un thread du worker pour toute
+la durée de la connexion : leur nombre est plafonné (MAX_STREAMS) pour qu'il reste toujours des threads pour
+la saisie ; au-delà, le spectateur reçoit 503 et son navigateur réessaie un peu plus tard.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+SUBSCRIBER_QUEUE_SIZE = 16
+HEARTBEAT_SECONDS = 15 # Commentaire SSE périodique : garde la connexion ouverte derrière les proxys
+
+# Flux simultanés par worker : par défaut la moitié des threads gunicorn (gunicorn.conf.py)
+MAX_STREAMS = int(os.environ.get('VEEC_LIVE_MAX_STREAMS') or max(1, int(os.environ.get('VEEC_THREADS', '16')) // 2))
+RETRY_AFTER_SECONDS = 10 # Délai avant une nouvelle tentative quand le plafond est atteint
+IDLE_SECONDS = 15 * 60 # Dernier message d'un match sans spectateur oublié après ce délai
+PRUNE_INTERVAL_SECONDS = 60
+
+
+class MatchBroker:
+    """Publication / abonnement par match_id, avec mémoire du dernier message pour les nouveaux spectateurs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._last_message = {}
+        self._idle_since = {} # match_id -> instant où le match s'est retrouvé sans spectateur
+        self._stream_count = 0
+        self._pruned_at = time.monotonic()
+
+    def subscribe(self, match_id, limit=None):
+        """Nouvelle file de spectateur, ou None si 'limit' flux sont déjà ouverts dans ce processus."""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            if limit is not None and self._stream_count >= limit:
+                return None
+            self._subscribers.setdefault(match_id, set()).add(subscriber)
+            self._stream_count += 1
+            self._idle_since.pop(match_id, None)
+            last_message = self._last_message.get(match_id)
+        if last_message is not None:
+            subscriber.put_nowait(last_message)
+        return subscriber
+
+    def unsubscribe(self, match_id, subscriber):
+        """Retire un spectateur ; sans effet s'il l'a déjà été (fin du générateur et fermeture de la réponse)."""
+        with self._lock:
+            subscribers = self._subscribers.get(match_id)
+            if subscribers is None or subscriber not in subscribers:
+                return
+            subscribers.discard(subscriber)
+            self._stream_count -= 1
+            if not subscribers:
+                del self._subscribers[match_id]
+                self._idle_since[match_id] = time.monotonic()
+
+    def last_message(self, match_id):
+        with self._lock:
+            return self._last_message.get(match_id)
+
+    def _prune(self, now):
+        """Oublie le dernier message des matchs restés sans spectateur plus de IDLE_SECONDS (verrou tenu)."""
+        self._pruned_at = now
+        for match_id, since in list(self._idle_since.items()):
+            if now - since >= IDLE_SECONDS:
+                del self._idle_since[match_id]
+                self._last_message.pop(match_id, None)
+
+    def publish(self, match_id, payload):
+        """Envoie payload (dict) à tous les spectateurs du match ; le JSON est sérialisé une seule fois."""
+        message = json.dumps(payload, ensure_ascii=False)
+        now = time.monotonic()
+        with self._lock:
+            subscribers = list(self._subscribers.get(match_id, ()))
+            if subscribers:
+                self._last_message[match_id] = message
+            elif payload.get('match_over'):
+                # Match terminé sans spectateur : plus rien à garder (un spectateur tardif relit l'état)
+                self._last_message.pop(match_id, None)
+                self._idle_since.pop(match_id, None)
+            else:
+                self._last_message[match_id] = message
+                self._idle_since.setdefault(match_id, now)
+            if now - self._pruned_at >= PRUNE_INTERVAL_SECONDS:
+                self._prune(now)
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(message)
+                    break
+                except queue.Full:
+                    # Spectateur en retard : on jette son plus vieux message, seul le dernier état compte
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def subscribed_matches(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    def subscriber_count(self, match_id=None):
+        with self._lock:
+            if match_id is not None:
+                return len(self._subscribers.get(match_id, ()))
+            return self._stream_count
+
+
+broker = MatchBroker()
+
+def sse_stream(match_id, subscriber, initial_message=None):
+    """
+    Générateur de réponse text/event-stream pour un spectateur déjà abonné (broker.subscribe, fait par la route
+    pour pouvoir répondre 503 au-delà du plafond) ; se désabonne quand la connexion se ferme.
+    """
+    try:
+        if initial_message is not None and broker.last_message(match_id) is None:
+            yield f"data: {initial_message}\n\n"
+        while True:
+            try:
+                message = subscriber.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            yield f"data: {message}\n\n"
+    finally:
+        broker.unsubscribe(match_id, subscriber)
+
+
+SCOREBOARD_HTML = """<!DOCTYPE html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>VEEC - Score en direct</title>
+<style>
+  body { font-family: sans-serif; margin: 0; background: #111; color: #fff; text-align: center; }
+  .teams { display: flex; justify-content: space-around; align-items: center; padding: 5vh 2vw 0; }
+  .team { font-size: 6vw; font-weight: bold; }
+  .veec { color: #007bff; } .adverse { color: #dc3545; }
+  .score { font-size: 18vw; font-weight: bold; line-height: 1; }
+  .sets { font-size: 4vw; color: #ccc; }
+  #set { font-size: 4vw; margin: 2vh 0; }
+  #last { font-size: 3vw; color: #aaa; min-height: 4vw; }
+  #status { position: fixed; bottom: 1vh; right: 1vw; font-size: 1.5vw; color: #666; }
+</style>
+</head>
+<body>
+  <div class="teams">
+    <div><div class="team veec">VEEC</div><div class="sets">Sets : <span id="sets-veec">0</span></div></div>
+    <div class="score"><span id="score-veec">0</span> - <span id="score-adverse">0</span></div>
+    <div><div class="team adverse">ADVERSAIRE</div><div class="sets">Sets : <span id="sets-adverse">0</span></div></div>
+  </div>
+  <div id="set"></div>
+  <div id="last"></div>
+  <div id="status">connexion...</div>
+<script>
+  function connect() {
+    var source = new EventSource(__EVENTS_URL__);
+    source.onopen = function () { document.getElementById('status').textContent = 'en direct'; };
+    source.onerror = function () {
+      document.getElementById('status').textContent = 'reconnexion...';
+      if (source.readyState === EventSource.CLOSED) {
+        // Refus du serveur (503 : trop de spectateurs) : le navigateur ne réessaie pas seul
+        setTimeout(connect, (__RETRY_SECONDS__ + Math.random() * __RETRY_SECONDS__) * 1000);
+      }
+    };
+    source.onmessage = function (event) {
+      var s = JSON.parse(event.data);
+      ['score-veec', 'score-adverse', 'sets-veec', 'sets-adverse'].forEach(function (id) {
+        document.getElementById(id).textContent = s[id.replace('-', '_')];
+      });
+      document.getElementById('set').textContent = s.match_over ? 'MATCH TERMINÉ' : 'Set ' + s.current_set;
+      var a = s.last_action;
+      document.getElementById('last').textContent = a ? a.joueur + ' - ' + a.label + ' (' + a.pos + ')' : '';
+    };
+  }
+  connect();
+</script>
+</body>
+</html>
+"""
+
+def scoreboard_html(events_url):
+    # '</' échappé : l'URL (qui contient le match_id) ne peut pas fermer la balise <script>
+    return (SCOREBOARD_HTML.replace('__EVENTS_URL__', json.dumps(events_url).replace('</', '<\\/'))
+            .replace('__RETRY_SECONDS__', str(RETRY_AFTER_SECONDS)))
@@ -0,0 +1,301 @@
+"""
+Mesures de performance des chemins chauds (callbacks, requêtes HTTP, SQLite, état du match).
+
+Compteurs et histogrammes à seaux fixes, sans dépendance : une mesure coûte un perf_counter, une recherche
+dichotomique dans les seaux et un incrément sous verrou. Exposés au format texte Prometheus par /metrics.
+
+Avec plusieurs workers gunicorn, chaque processus écrit régulièrement ses valeurs dans VEEC_METRICS_DIR
+(un fichier JSON par pid) : /metrics additionne tous les workers, quel que soit celui qui répond. Le fichier
+d'un worker arrêté est supprimé (hook child_exit de gunicorn.conf.py, ou à la lecture si le processus n'existe plus).
+VEEC_METRICS=0 désactive toutes les mesures.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# --- CONFIGURATION ---
+
+ENABLED = os.environ.get('VEEC_METRICS', '1') != '0'
+METRICS_DIR = os.environ.get('VEEC_METRICS_DIR') # Dossier partagé entre workers (None : processus unique)
+FLUSH_SECONDS = 5
+RECENT_SAMPLES = 200 # Dernières durées gardées par callback pour le panneau de débogage
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LENGTH_BUCKETS = (10, 50, 100, 200, 400, 800, 1600, 3200)
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name, self.help_text = name, help_text
+        self.values = {} # (('label', 'valeur'), ...) -> total
+        _metrics[name] = self
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name, self.help_text, self.buckets = name, help_text, buckets
+        self.values = {} # labels -> [effectif par seau (non cumulé, +Inf compris)..., somme]
+        _metrics[name] = self
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+def timed(histogram, **labels):
+    """Décorateur : durée de chaque appel dans 'histogram' (la fonction est rendue telle quelle si les mesures sont désactivées)."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+# --- MESURES ---
+
+CALLBACK_SECONDS = Histogram('veec_callback_seconds', "Durée des callbacks Dash, sérialisation JSON de la réponse comprise")
+CALLBACK_CALLS = Counter('veec_callback_calls_total', "Appels des callbacks Dash par issue (ok, prevent, erreur)")
+CALLBACK_REQUEST_BYTES = Histogram('veec_callback_request_bytes', "Taille des requêtes de callback (Store compris)", BYTES_BUCKETS)
+CALLBACK_RESPONSE_BYTES = Histogram('veec_callback_response_bytes', "Taille des réponses de callback", BYTES_BUCKETS)
+HTTP_SECONDS = Histogram('veec_http_request_seconds', "Durée des requêtes HTTP (hors réponses en flux)")
+HTTP_REQUEST_BYTES = Histogram('veec_http_request_bytes', "Taille des corps de requête HTTP", BYTES_BUCKETS)
+HTTP_RESPONSE_BYTES = Histogram('veec_http_response_bytes', "Taille des réponses HTTP (hors réponses en flux)", BYTES_BUCKETS)
+SQLITE_QUERY_SECONDS = Histogram('veec_sqlite_query_seconds', "Durée des fonctions d'accès à SQLite")
+SQLITE_LOCK_WAIT_SECONDS = Histogram('veec_sqlite_lock_wait_seconds', "Attente du verrou d'écriture SQLite (BEGIN IMMEDIATE)")
+SQLITE_TRANSACTION_SECONDS = Histogram('veec_sqlite_transaction_seconds', "Durée des transactions d'écriture, verrou compris")
+MATCH_LOCK_WAIT_SECONDS = Histogram('veec_match_lock_wait_seconds', "Attente du verrou d'un match déjà pris par un autre thread")
+STATE_COPY_SECONDS = Histogram('veec_state_copy_seconds', "Reprise de l'état du match reçu du Store : journal et moteur de score (mode sans état serveur)")
+STATE_REBUILD_SECONDS = Histogram('veec_state_rebuild_seconds', "Reconstruction de l'état d'un match depuis SQLite")
+HISTORY_LENGTH = Histogram('veec_history_length', "Longueur de l'historique du match à chaque enregistrement de l'état", LENGTH_BUCKETS)
+MAINTENANCE_SECONDS = Histogram('veec_maintenance_seconds', "Durée des tâches de maintenance de la base (archivage, analyze, vacuum, checkpoint)")
+ARCHIVED_MATCHES = Counter('veec_archived_matches_total', "Matchs terminés archivés hors de la table 'actions'")
+
+_recent = {} # callback -> deque des dernières durées (panneau de débogage)
+
+# --- INSTRUMENTATION DE DASH ET FLASK ---
+
+def instrument_dash_callbacks(app):
+    """
+    Enveloppe chaque callback serveur déjà enregistré (app.callback_map) : à appeler après leur déclaration.
+    La fonction enveloppée par Dash retourne la réponse JSON : sa durée inclut la sérialisation.
+    """
+    if not ENABLED:
+        return
+    import flask
+    from dash.exceptions import PreventUpdate
+
+    for entry in app.callback_map.values():
+        func = entry.get('callback')
+        if func is None or getattr(func, '_veec_timed', False):
+            continue
+        name = getattr(func, '__wrapped__', func).__name__
+        recent = _recent.setdefault(name, deque(maxlen=RECENT_SAMPLES))
+
+        def timed_callback(*args, _func=func, _name=name, _recent=recent, **kwargs):
+            start = time.perf_counter()
+            status = 'erreur'
+            try:
+                response = _func(*args, **kwargs)
+                status = 'ok'
+            except PreventUpdate:
+                status = 'prevent'
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                CALLBACK_SECONDS.observe(elapsed, callback=_name)
+                CALLBACK_CALLS.inc(callback=_name, status=status)
+                _recent.append(elapsed)
+                CALLBACK_REQUEST_BYTES.observe(flask.request.content_length or 0, callback=_name)
+            CALLBACK_RESPONSE_BYTES.observe(len(response), callback=_name)
+            return response
+
+        timed_callback._veec_timed = True
+        entry['callback'] = timed_callback
+
+def instrument_flask(server):
+    """Durée et tailles des requêtes HTTP, par route ; démarre aussi l'écriture périodique des valeurs du worker."""
+    if not ENABLED:
+        return
+    import flask
+
+    @server.before_request
+    def _start_timer():
+        flask.g.veec_request_start = time.perf_counter()
+        _ensure_flusher()
+
+    @server.after_request
+    def _record_request(response):
+        start = flask.g.pop('veec_request_start', None)
+        if start is not None and not response.is_streamed:
+            # Les réponses en flux (direct, export, import) restent ouvertes : leur durée ne dit rien
+            route = flask.request.url_rule.rule if flask.request.url_rule else 'inconnue'
+            HTTP_SECONDS.observe(time.perf_counter() - start, route=route)
+            HTTP_REQUEST_BYTES.observe(flask.request.content_length or 0, route=route)
+            HTTP_RESPONSE_BYTES.observe(response.calculate_content_length() or 0, route=route)
+        return response
+
+# --- PLUSIEURS WORKERS ---
+
+_flusher_pid = None
+
+def _snapshot():
+    with _lock:
+        return {name: {key and json.dumps(key) or '': list(series) if isinstance(series, list) else series
+                       for key, series in metric.values.items()}
+                for name, metric in _metrics.items()}
+
+def _flush():
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(_snapshot(), f)
+    os.replace(f"{path}.tmp", path)
+
+def _run_flusher():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            _flush()
+        except OSError:
+            pass
+
+def _ensure_flusher():
+    global _flusher_pid
+    if METRICS_DIR is None or _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    threading.Thread(target=_run_flusher, name='veec-metrics', daemon=True).start()
+
+def mark_process_dead(pid):
+    """Supprime les valeurs d'un worker arrêté : elles ne sont plus additionnées à celles des workers en vie."""
+    if METRICS_DIR is None:
+        return
+    for filename in (f"{pid}.json", f"{pid}.json.tmp"):
+        try:
+            os.remove(os.path.join(METRICS_DIR, filename))
+        except FileNotFoundError:
+            pass
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True # Processus d'un autre utilisateur : il existe
+    return True
+
+def _merged_values():
+    """Valeurs de ce processus (à jour) additionnées à celles écrites par les autres workers en vie."""
+    merged = _snapshot()
+    if METRICS_DIR is None or not os.path.isdir(METRICS_DIR):
+        return merged
+    own_file = f"{os.getpid()}.json"
+    for filename in os.listdir(METRICS_DIR):
+        if not filename.endswith('.json') or filename == own_file:
+            continue
+        pid = filename[:-len('.json')]
+        if pid.isdigit() and not _process_alive(int(pid)):
+            # Worker tué sans passer par child_exit (SIGKILL, OOM) : son fichier est retiré ici
+            mark_process_dead(pid)
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, filename), encoding='utf-8') as f:
+                other = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, values in other.items():
+            target = merged.setdefault(name, {})
+            for key, series in values.items():
+                if key not in target:
+                    target[key] = series
+                elif isinstance(series, list):
+                    target[key] = [a + b for a, b in zip(target[key], series)]
+                else:
+                    target[key] += series
+    return merged
+
+# --- EXPOSITION ---
+
+def _format_labels(pairs, **extra):
+    pairs = list(pairs) + list(extra.items())
+    if not pairs:
+        return ''
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+def render():
+    """Toutes les mesures au format texte Prometheus (text/plain; version=0.0.4)."""
+    values = _merged_values()
+    lines = []
+    for name, metric in _metrics.items():
+        lines.append(f"# HELP {name} {metric.help_text}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for key, series in sorted(values.get(name, {}).items()):
+            pairs = [tuple(pair) for pair in json.loads(key)] if key else []
+            if metric.kind == 'counter':
+                lines.append(f"{name}{_format_labels(pairs)} {series}")
+                continue
+            cumulative = 0
+            for bound, count in zip((*metric.buckets, '+Inf'), series[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(pairs, le=bound)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(pairs)} {series[-1]}")
+            lines.append(f"{name}_count{_format_labels(pairs)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+def recent_callback_summary():
+    """{callback: (dernière durée, p50, p99, nombre)} en secondes, sur les derniers appels de ce processus."""
+    summary = {}
+    for name, samples in list(_recent.items()):
+        values = list(samples)
+        if not values:
+            continue
+        ordered = sorted(values)
+        summary[name] = (values[-1], ordered[len(ordered) // 2], ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], len(values))
+    return summary
@@ -0,0 +1,96 @@
+"""
+Référentiel des actions, construit une seule fois à l'import depuis ACTION_CATEGORIES.
+Les effectifs sont en base (roster.py) : LISTE_JOUEURS_PREDEFINIE ne sert plus qu'à créer la première équipe.
+
+Les chemins chauds (saisie, annulation, moteur de score, ingestion) font des recherches en O(1) dans
+ces tables au lieu de tester des sous-chaînes du code action.
+Ajouter une catégorie ou un résultat dans ACTION_CATEGORIES suffit : l'effet sur le score est déduit
+du code résultat (RESULT_POINT_EFFECTS).
+"""
+from collections import namedtuple
+
+# --- DONNÉES DE RÉFÉRENCE ---
+
+# Effectif d'origine, copié dans l'équipe 1 par la migration 10 de database.py
+LISTE_JOUEURS_PREDEFINIE = [
+    {"numero": 1, "nom": "Bryan R4"}, {"numero": 2, "nom": "Antoine Passeur"},
+    {"numero": 3, "nom": "Andréa R4"}, {"numero": 4, "nom": "Gianni Central"},
+    {"numero": 5, "nom": "Thibault R4"}, {"numero": 6, "nom": "Clément Pointu"},
+    {"numero": 7, "nom": "Valérian Libéro"}, {"numero": 10, "nom": "Tim Central"},
+    {"numero": 12, "nom": "Guillaume Pointu"}, {"numero": 14, "nom": "Romain Libéro"},
+    {"numero": 15, "nom": "Dorian Central"}, {"numero": 16, "nom": "Noah Passeur"},
+]
+
+ACTION_CATEGORIES = [
+    ("SERVICE", "SVC", [
+        ("🎯 Ace (P)", "ACE", '#28a745'),
+        ("🔄 Service OK (0)", "OK", '#ffc107'),
+        ("💥 Erreur (Adv P)", "ERR", '#dc3545')
+    ]),
+    ("RÉCEPTION", "REC", [
+        ("✅ Parfaite (+)", "PERF", '#28a745'),
+        ("👐 Moyenne (0)", "OK", '#ffc107'),
+        ("💔 Manquée (Adv P)", "ERR", '#dc3545')
+    ]),
+    ("PASSE", "PAS", [
+        ("⭐ Parfaite (+)", "PERF", '#17a2b8'),
+        ("👐 Moyenne (0)", "OK", '#ffc107'),
+        ("❌ Mauvaise Passe (Adv P)", "ERR", '#dc3545')
+    ]),
+    ("ATTAQUE", "ATK", [
+        ("💥 Point (P)", "POINT", '#28a745'),
+        ("👐 Contre (0)", "CONTRE", '#ffc107'),
+        ("❌ Faute (Adv P)", "ERR", '#dc3545')
+    ]),
+    ("BLOC", "BLK", [
+        ("🛡️ Point (P)", "POINT", '#28a745'),
+        ("🚫 Touché (0)", "TOUCH", '#17a2b8'),
+        ("⛔ Faute (Adv P)", "ERR", '#dc3545')
+    ]),
+    ("DEFÉNSE", "DEF", [
+        ("✅ Parfaite (+)", "PERF", '#28a745'),
+        ("👐 Moyenne (0)", "OK", '#17a2b8'),
+        ("❌ Manquée (Adv P)", "ERR", '#dc3545')
+    ]),
+]
+
+# Équipe qui marque selon le code résultat : ACE / POINT pour VEEC, ERR pour l'adversaire, sinon le jeu continue
+RESULT_POINT_EFFECTS = {'ACE': 'VEEC', 'POINT': 'VEEC', 'ERR': 'ADVERSE'}
+
+# Qualité du geste pour les statistiques : positif (point ou geste parfait), erreur, sinon neutre
+RESULT_QUALITY = {'ACE': 'positif', 'POINT': 'positif', 'PERF': 'positif', 'ERR': 'erreur'}
+
+# --- TABLES DE RECHERCHE ---
+
+# id : entier compact, index dans ACTIONS (ordre des boutons de la modale)
+ActionInfo = namedtuple('ActionInfo', ['id', 'code', 'category', 'category_title', 'result', 'label', 'color', 'point_effect', 'quality'])
+
+
+def _build_actions(categories):
+    actions = []
+    for title, code_base, buttons in categories:
+        for label, code_result, color in buttons:
+            actions.append(ActionInfo(
+                id=len(actions),
+                code=f"{code_base}_{code_result}",
+                category=code_base,
+                category_title=title,
+                result=code_result,
+                label=label,
+                color=color,
+                point_effect=RESULT_POINT_EFFECTS.get(code_result),
+                quality=RESULT_QUALITY.get(code_result, 'neutre'),
+            ))
+    return tuple(actions)
+
+
+ACTIONS = _build_actions(ACTION_CATEGORIES)
+ACTIONS_BY_CODE = {info.code: info for info in ACTIONS}
+ACTIONS_BY_CATEGORY_RESULT = {(info.category, info.result): info for info in ACTIONS}
+
+# Catégories dans l'ordre des colonnes de la modale : code -> titre
+CATEGORIES = {code_base: title for title, code_base, _ in ACTION_CATEGORIES}
+
+# Code action -> équipe qui marque (None si le jeu continue)
+POINT_EFFECTS = {info.code: info.point_effect for info in ACTIONS}
+
@@ -0,0 +1,162 @@
+"""
+Équipes et effectifs du club, stockés en base (tables 'teams' et 'players', migration 10 de database.py).
+
+La saisie lit les joueurs à chaque clic (boutons de la modale, nom enregistré avec l'action) : elle passe par
+un cache en mémoire, jamais par une requête par clic. Le cache est une photo immuable de toutes les équipes,
+remplacée d'un bloc : un lecteur voit l'ancienne ou la nouvelle, jamais un mélange. Une modification faite par
+ce processus l'invalide aussitôt ; celles des autres workers sont vues grâce à la version des équipes
+(incrémentée par trigger à chaque changement d'effectif), relue au plus toutes les ROSTER_CHECK_SECONDS.
+
+Un joueur qui quitte l'équipe est désactivé, jamais supprimé : ses actions gardent leur joueur_id.
+"""
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from database import DEFAULT_TEAM_ID, get_connection, transaction
+
+# --- CONFIGURATION ---
+
+ROSTER_CHECK_SECONDS = 2.0 # Délai maximal avant qu'un worker voie une modification faite par un autre
+MAX_NUMERO = 99
+
+Player = namedtuple('Player', ['id', 'team_id', 'numero', 'nom', 'actif'])
+# players : joueurs actifs par numéro croissant ; by_numero / by_nom : index des joueurs actifs
+Team = namedtuple('Team', ['id', 'nom', 'players', 'by_numero', 'by_nom'])
+Snapshot = namedtuple('Snapshot', ['version', 'teams'])
+
+# --- REQUÊTES ---
+
+# Change à chaque création d'équipe et à chaque modification d'un effectif (triggers de la migration 10)
+SQL_SELECT_ROSTER_VERSION = "SELECT COUNT(*), COALESCE(SUM(version), 0) FROM teams"
+
+SQL_SELECT_TEAMS = "SELECT id, nom FROM teams ORDER BY id"
+
+SQL_SELECT_PLAYERS = "SELECT id, team_id, numero, nom, actif FROM players ORDER BY team_id, numero, id"
+
+
+class RosterCache:
+    """Photo en mémoire des équipes, rechargée quand la version en base change."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    def _load(self, conn):
+        version = tuple(conn.execute(SQL_SELECT_ROSTER_VERSION).fetchone())
+        players = {}
+        for row in conn.execute(SQL_SELECT_PLAYERS).fetchall():
+            player = Player(*row)
+            if player.actif:
+                players.setdefault(player.team_id, []).append(player)
+        teams = {}
+        for team_id, nom in conn.execute(SQL_SELECT_TEAMS).fetchall():
+            active = tuple(players.get(team_id, ()))
+            teams[team_id] = Team(team_id, nom, active, {p.numero: p for p in active}, {p.nom: p for p in active})
+        return Snapshot(version, teams)
+
+    def snapshot(self, max_age=ROSTER_CHECK_SECONDS):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < max_age:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._checked_at < max_age:
+                return self._snapshot
+            with get_connection() as conn:
+                version = tuple(conn.execute(SQL_SELECT_ROSTER_VERSION).fetchone())
+                if self._snapshot is None or version != self._snapshot.version:
+                    conn.execute("BEGIN") # Version et effectifs lus dans la même photo de la base
+                    try:
+                        self._snapshot = self._load(conn)
+                    finally:
+                        conn.execute("COMMIT")
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+
+# --- INSTANCE DU PROCESSUS ---
+
+_cache = RosterCache()
+
+def refresh():
+    """Relit tout de suite la version en base (écran d'effectifs : modification faite juste avant par un autre worker)."""
+    _cache.snapshot(max_age=0)
+
+def version():
+    """Version des effectifs : change à chaque modification (clé des caches de mise en page)."""
+    return _cache.snapshot().version
+
+def teams():
+    """Équipes par id croissant."""
+    return list(_cache.snapshot().teams.values())
+
+def team(team_id):
+    """Équipe 'team_id', ou l'équipe par défaut si elle n'existe pas (identifiant venu du navigateur)."""
+    known = _cache.snapshot().teams
+    return known.get(team_id) or known[DEFAULT_TEAM_ID]
+
+def player(team_id, numero):
+    """Joueur actif portant ce numéro dans l'équipe, ou None."""
+    return team(team_id).by_numero.get(numero)
+
+# --- MODIFICATIONS ---
+
+def _clean_name(value, what):
+    nom = str(value or '').strip()
+    if not nom:
+        raise ValueError(f"{what} : nom vide")
+    return nom
+
+def create_team(nom):
+    """Crée une équipe sans joueur ; retourne son id."""
+    nom = _clean_name(nom, "équipe")
+    try:
+        with transaction() as conn:
+            team_id = conn.execute("INSERT INTO teams (nom) VALUES (?)", (nom,)).lastrowid
+    except sqlite3.IntegrityError:
+        raise ValueError(f"l'équipe {nom!r} existe déjà") from None
+    finally:
+        _cache.invalidate()
+    return team_id
+
+def save_team_players(team_id, rows):
+    """
+    Remplace l'effectif actif d'une équipe par 'rows' ([{'id', 'numero', 'nom'}, ...], id absent pour un nouveau joueur).
+    Les joueurs de l'équipe absents de 'rows' sont désactivés. Lève ValueError si une ligne est invalide.
+    """
+    cleaned, numeros, noms = [], set(), set()
+    for row in rows:
+        try:
+            numero = int(str(row.get('numero', '')).strip())
+        except ValueError:
+            raise ValueError(f"numéro invalide : {row.get('numero')!r}") from None
+        if not 0 <= numero <= MAX_NUMERO:
+            raise ValueError(f"numéro hors limites : {numero}")
+        if numero in numeros:
+            raise ValueError(f"numéro {numero} attribué deux fois")
+        nom = _clean_name(row.get('nom'), f"joueur N°{numero}")
+        if nom in noms: # Les statistiques sont regroupées par nom
+            raise ValueError(f"deux joueurs s'appellent {nom!r}")
+        numeros.add(numero)
+        noms.add(nom)
+        cleaned.append((row.get('id'), numero, nom))
+    try:
+        with transaction() as conn:
+            if conn.execute("SELECT 1 FROM teams WHERE id = ?", (team_id,)).fetchone() is None:
+                raise ValueError(f"équipe inconnue : {team_id}")
+            known = {row[0] for row in conn.execute("SELECT id FROM players WHERE team_id = ?", (team_id,)).fetchall()}
+            # Tout désactiver d'abord : deux joueurs peuvent échanger leurs numéros sans heurter l'index unique
+            conn.execute("UPDATE players SET actif = 0 WHERE team_id = ? AND actif", (team_id,))
+            for player_id, numero, nom in cleaned:
+                if player_id in known:
+                    conn.execute("UPDATE players SET numero = ?, nom = ?, actif = 1 WHERE id = ?", (numero, nom, player_id))
+                else:
+                    conn.execute("INSERT INTO players (team_id, numero, nom) VALUES (?, ?, ?)", (team_id, numero, nom))
+    finally:
+        _cache.invalidate()
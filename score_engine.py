@@ -0,0 +1,221 @@
+"""
+Moteur de score : l'état du match (score, sets, set en cours) est dérivé du journal des actions.
+
+Le moteur garde un instantané au début de chaque set. Annuler, rétablir ou corriger une action
+ne rejoue que les actions depuis l'instantané le plus proche, et non tout le match.
+Le journal et le score avant chaque action sont stockés en colonnes typées (action_log.ActionLog).
+"""
+from collections import namedtuple
+
+from action_log import ActionLog
+from registry import POINT_EFFECTS
+
+# --- RÈGLES DU VOLLEY-BALL ---
+POINTS_POUR_GAGNER = 25
+POINTS_POUR_GAGNER_SET_DECISIF = 15 # Non implémenté ici pour la simplification, on utilise 25
+MAX_SETS = 5 # Match au meilleur des 5 sets (3 sets gagnants)
+SETS_POUR_GAGNER = MAX_SETS // 2 + 1
+
+# Une action du journal (seuls 'action' et l'ordre comptent pour le score)
+Event = namedtuple('Event', ['timestamp', 'pos', 'joueur', 'action'])
+
+# État au début d'un set : 'index' est le nombre d'actions du journal déjà jouées
+SetSnapshot = namedtuple('SetSnapshot', ['index', 'current_set', 'sets_veec', 'sets_adverse'])
+
+# Fin de set produite par une action : score final du set et vainqueur
+SetResult = namedtuple('SetResult', ['set_num', 'score_veec', 'score_adverse', 'winner', 'match_over', 'timestamp'])
+
+# Score au moment d'une action (avant son effet) et éventuelle fin de set qu'elle a provoquée
+Derived = namedtuple('Derived', ['set_num', 'score_veec', 'score_adverse', 'set_result'])
+
+
+class ScoreEngine:
+    """Plie le journal des actions en état de match, avec un instantané par début de set."""
+
+    def __init__(self, events=()):
+        self.log = ActionLog()
+        self.set_results = {} # Index de l'action qui a clos un set -> SetResult
+        self.snapshots = [SetSnapshot(0, 1, 0, 0)]
+        self._restore(self.snapshots[0])
+        for event in events:
+            self.append(event)
+
+    @classmethod
+    def resume(cls, log, set_results):
+        """
+        Reprise d'un match enregistré (redémarrage, rechargement de la page) sans rejouer les sets terminés.
+        log : journal complet, avec le set et le score avant chaque action tels qu'enregistrés ;
+        set_results : (index de l'action qui a clos le set, SetResult) de chaque set terminé, dans l'ordre.
+        Seules les actions du set en cours sont rejouées. Si les fins de set ne correspondent pas au journal,
+        tout le match est rejoué.
+        """
+        engine = cls()
+        engine.log = log
+        start = sets_veec = sets_adverse = 0
+        for index, set_result in set_results:
+            if (engine.match_over or not start <= index < len(log)
+                    or set_result.set_num != len(engine.snapshots) or set_result.set_num != log.sets[index]):
+                return engine._replay_all()
+            engine.set_results[index] = set_result
+            if set_result.winner == 'VEEC':
+                sets_veec += 1
+            else:
+                sets_adverse += 1
+            engine.sets_veec, engine.sets_adverse = sets_veec, sets_adverse
+            if not set_result.match_over:
+                engine.snapshots.append(SetSnapshot(index + 1, set_result.set_num + 1, sets_veec, sets_adverse))
+            start = index + 1
+
+        if engine.match_over:
+            if start != len(log):
+                return engine._replay_all() # Actions après la fin du match : le journal fait foi
+            engine.current_set, engine.score_veec, engine.score_adverse = set_result.set_num, set_result.score_veec, set_result.score_adverse
+            return engine
+
+        engine._restore(engine.snapshots[-1])
+        for index in range(start, len(log)):
+            engine._record(index, engine._step(index))
+        return engine
+
+    def _replay_all(self):
+        self.set_results.clear()
+        self.snapshots = [SetSnapshot(0, 1, 0, 0)]
+        self._restore(self.snapshots[0])
+        for index in range(len(self.log)):
+            self._record(index, self._step(index))
+        return self
+
+    # --- ÉTAT COURANT ---
+
+    def __len__(self):
+        return len(self.log)
+
+    @property
+    def match_over(self):
+        return self.sets_veec >= SETS_POUR_GAGNER or self.sets_adverse >= SETS_POUR_GAGNER
+
+    def event(self, index):
+        return Event._make(self.log.event(index))
+
+    def derived(self, index):
+        """Score avant l'action 'index' et éventuelle fin de set qu'elle a provoquée."""
+        return Derived(*self.log.derived(index), self.set_results.get(index))
+
+    def _restore(self, snapshot):
+        self.current_set = snapshot.current_set
+        self.sets_veec = snapshot.sets_veec
+        self.sets_adverse = snapshot.sets_adverse
+        self.score_veec = 0
+        self.score_adverse = 0
+
+    def _step(self, index):
+        """Applique l'action 'index' du journal à l'état courant et retourne ses données dérivées."""
+        derived_set, avant_veec, avant_adverse = self.current_set, self.score_veec, self.score_adverse
+        effect = POINT_EFFECTS.get(self.log.action(index))
+        if effect == 'VEEC':
+            self.score_veec += 1
+        elif effect == 'ADVERSE':
+            self.score_adverse += 1
+
+        set_result = None
+        # Fin de set : 25 points et 2 points d'écart
+        # NOTE: Simplifié pour utiliser 25 points pour tous les sets. En réalité, le 5e set est à 15 points.
+        if self.score_veec >= POINTS_POUR_GAGNER and self.score_veec - self.score_adverse >= 2:
+            winner = 'VEEC'
+        elif self.score_adverse >= POINTS_POUR_GAGNER and self.score_adverse - self.score_veec >= 2:
+            winner = 'ADVERSE'
+        else:
+            winner = None
+
+        if winner:
+            if winner == 'VEEC':
+                self.sets_veec += 1
+            else:
+                self.sets_adverse += 1
+            set_result = SetResult(self.current_set, self.score_veec, self.score_adverse, winner,
+                                   self.match_over, self.log.event(index)[0])
+            if not self.match_over:
+                # Le set est terminé, passage au set suivant ; à la fin du match le score final reste affiché
+                self.current_set += 1
+                self.score_veec = 0
+                self.score_adverse = 0
+
+        return Derived(derived_set, avant_veec, avant_adverse, set_result)
+
+    def _replay(self, start_index, shift=0):
+        """
+        Rejoue le journal depuis l'instantané le plus proche précédant start_index.
+        Dès qu'un début de set rejoué est identique à l'ancien (même set et mêmes sets gagnés), la suite
+        du journal est inchangée : les anciennes données dérivées, déjà décalées avec leurs lignes, sont gardées.
+        shift : décalage des index après start_index (+1 insertion, -1 suppression), déjà appliqué au journal.
+        """
+        if shift:
+            self.set_results = {index + shift if index >= start_index else index: set_result
+                                for index, set_result in self.set_results.items()
+                                if not (shift < 0 and index == start_index)}
+        old_snapshots = {snap.index + shift: snap for snap in self.snapshots if snap.index > start_index}
+        old_end = (self.current_set, self.sets_veec, self.sets_adverse, self.score_veec, self.score_adverse)
+
+        self.snapshots = [snap for snap in self.snapshots if snap.index <= start_index]
+        snapshot = self.snapshots[-1]
+        self._restore(snapshot)
+
+        for index in range(snapshot.index, len(self.log)):
+            self._record(index, self._step(index))
+            new_snapshot = self.snapshots[-1]
+            old_snapshot = old_snapshots.get(new_snapshot.index)
+            if index + 1 == new_snapshot.index and old_snapshot and old_snapshot[1:] == new_snapshot[1:]:
+                # Même début de set qu'avant la modification : le reste du match ne change pas
+                self.snapshots.extend(snap._replace(index=new_index) for new_index, snap in sorted(old_snapshots.items())
+                                      if new_index > new_snapshot.index)
+                self.current_set, self.sets_veec, self.sets_adverse, self.score_veec, self.score_adverse = old_end
+                return
+
+    def _record(self, index, derived):
+        self.log.set_derived(index, derived.set_num, derived.score_veec, derived.score_adverse)
+        if derived.set_result:
+            self.set_results[index] = derived.set_result
+            if not derived.set_result.match_over:
+                self.snapshots.append(SetSnapshot(index + 1, self.current_set, self.sets_veec, self.sets_adverse))
+        else:
+            self.set_results.pop(index, None)
+
+    # --- MODIFICATIONS DU JOURNAL ---
+
+    def append(self, event):
+        """Ajoute une action en fin de journal (saisie normale) et retourne ses données dérivées."""
+        self.log.append(*event)
+        derived = self._step(len(self.log) - 1)
+        self._record(len(self.log) - 1, derived)
+        return derived
+
+    def pop(self):
+        """
+        Annule la dernière action. Retourne (action, données dérivées).
+        Dans le set en cours, l'état d'avant l'action est celui enregistré sur sa ligne : rien n'est rejoué.
+        Si l'action avait clos un set, ce set est rejoué depuis son instantané.
+        """
+        index = len(self.log) - 1
+        event, derived = self.event(index), self.derived(index)
+        self.log.pop()
+        if derived.set_result:
+            del self.set_results[index]
+            self._replay(index)
+        else:
+            self.current_set, self.score_veec, self.score_adverse = derived.set_num, derived.score_veec, derived.score_adverse
+        return event, derived
+
+    def replace(self, index, event):
+        """Corrige une action passée ; le journal est rejoué depuis le début de son set."""
+        self.log.replace(index, *event)
+        self._replay(index)
+
+    def insert(self, index, event):
+        """Insère une action oubliée ; le journal est rejoué depuis le début de son set."""
+        self.log.insert(index, *event)
+        self._replay(index, shift=1)
+
+    def remove(self, index):
+        """Supprime une action passée ; le journal est rejoué depuis le début de son set."""
+        del self.log[index]
+        self._replay(index, shift=-1)
@@ -0,0 +1,51 @@
+"""
+Configuration commune des tests : chaque test travaille sur une base SQLite neuve dans un dossier temporaire.
+Les variables d'environnement sont posées avant tout import des modules de l'application (lues à l'import).
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_SESSION_DIR = tempfile.mkdtemp(prefix='veec-tests-')
+os.environ.setdefault('VEEC_DB_NAME', os.path.join(_SESSION_DIR, 'match_stats.db'))
+os.environ.setdefault('VEEC_ANALYTICS_DIR', os.path.join(_SESSION_DIR, 'analytics_cache'))
+os.environ.setdefault('VEEC_ARCHIVE_DIR', os.path.join(_SESSION_DIR, 'archives'))
+os.environ.setdefault('VEEC_MAINTENANCE_INTERVAL', '0')
+os.environ.setdefault('VEEC_METRICS', '0')
+
+import pytest
+
+import analytics
+import archive
+import database
+import roster
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Base migrée à la dernière version, vide (hors équipe par défaut), propre au test."""
+    database.close_all_connections()
+    monkeypatch.setattr(database, 'DB_NAME', str(tmp_path / 'match_stats.db'))
+    monkeypatch.setattr(archive, 'ARCHIVE_DIR', str(tmp_path / 'archives'))
+    monkeypatch.setattr(analytics, '_snapshot', analytics.SeasonSnapshot(str(tmp_path / 'analytics_cache')))
+    roster._cache.invalidate()
+    database.init_db()
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        with app_module._match_states_lock:
+            app_module._match_states.clear()
+    yield tmp_path
+    database.close_all_connections()
+    roster._cache.invalidate()
+
+
+@pytest.fixture
+def appmod(db):
+    """Module app importé (layout et callbacks déclarés), sur la base du test."""
+    import app
+    with app._match_states_lock:
+        app._match_states.clear()
+    return app
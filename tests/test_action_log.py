@@ -0,0 +1,38 @@
+"""Journal en colonnes : encodage, sérialisation du Store et tables d'internement propres à chaque match."""
+from action_log import ActionLog, POSITIONS, ACTION_CODES
+
+
+def test_round_trip_through_store_columns():
+    log = ActionLog()
+    log.append('10:00:05', 'P1', "Bryan R4", 'SVC_ACE', 1, 0, 0)
+    log.append('2024-09-01 10:01', 'P4', "Joueur importé", 'ATK_ERR', 1, 1, 0)
+    log.append('9:05', 'P2', "Bryan R4", 'FIN_SET', 2, 25, 3)
+
+    copy = ActionLog.from_columns(log.to_columns())
+    assert [copy.event(i) for i in range(len(copy))] == [log.event(i) for i in range(len(log))]
+    assert [copy.derived(i) for i in range(len(copy))] == [(1, 0, 0), (1, 1, 0), (2, 25, 3)]
+
+def test_player_names_scoped_to_the_log():
+    first, second = ActionLog(), ActionLog()
+    first.append('10:00:00', 'P1', "Bryan R4", 'SVC_ACE')
+    second.append('10:00:00', 'P1', "Tim Central", 'SVC_ACE')
+    assert first.names.values == ["Bryan R4"]
+    assert second.names.values == ["Tim Central"]
+    assert second.event(0)[2] == "Tim Central"
+
+def test_odd_timestamps_stored_once():
+    log = ActionLog()
+    for _ in range(100): # Saisie puis annulation à répétition avec un horodatage importé
+        log.append('hier soir', 'P1', "Bryan R4", 'SVC_ACE')
+        log.pop()
+    log.append('hier soir', 'P1', "Bryan R4", 'SVC_ACE')
+    log.replace(0, 'hier soir', 'P2', "Bryan R4", 'SVC_OK')
+    assert log.texts == ['hier soir']
+    assert log.event(0) == ('hier soir', 'P2', "Bryan R4", 'SVC_OK')
+
+def test_shared_tables_do_not_grow_with_matches():
+    sizes = len(POSITIONS.values), len(ACTION_CODES.values)
+    for n in range(50):
+        log = ActionLog()
+        log.append('10:00:00', 'P3', f"Joueur {n}", 'REC_PERF')
+    assert (len(POSITIONS.values), len(ACTION_CODES.values)) == sizes
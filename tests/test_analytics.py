@@ -0,0 +1,34 @@
+"""Analyse de saison : les 'derniers matchs' et les fenêtres glissantes suivent la date des matchs, pas l'ordre des lignes."""
+import analytics
+from importer import import_file
+
+JOUEUR = "Bryan R4"
+
+
+def write_match(path, match_id, action, count):
+    lines = ["match_id;timestamp;position;joueur_nom;action_code"]
+    lines += [f"{match_id};10:00:{i:02d};P1;{JOUEUR};{action}" for i in range(count)]
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return str(path)
+
+
+def test_last_matches_follow_match_dates_not_import_order(db):
+    # Le match le plus récent est importé avant le plus ancien : ses lignes ont les plus petits id
+    import_file(write_match(db / 'recent.csv', 'Match_20250301_100000_cccccc', 'ATK_POINT', 4))
+    import_file(write_match(db / 'ancien.csv', 'Match_20240901_100000_aaaaaa', 'ATK_ERR', 2))
+    import_file(write_match(db / 'milieu.csv', 'Match_20241201_100000_bbbbbb', 'REC_OK', 3))
+    analytics.refresh()
+
+    last = analytics.group_stats(by=('match',), last_matches=2)
+    assert list(last['match']) == ['Match_20241201_100000_bbbbbb', 'Match_20250301_100000_cccccc']
+
+    rolling = analytics.rolling_efficiency(window=2)
+    assert list(rolling['match']) == ['Match_20240901_100000_aaaaaa', 'Match_20241201_100000_bbbbbb',
+                                      'Match_20250301_100000_cccccc']
+    assert list(rolling['efficacite']) == [-100.0, 0.0, 100.0]
+    assert list(rolling['efficacite_glissante']) == [-100.0, -40.0, 57.1]
+
+def test_match_ids_without_date_sort_first():
+    ids = ['Match_20250301_100000_cccccc', 'ancien-format', 'Match_20240901_100000_aaaaaa']
+    assert sorted(ids, key=analytics.match_chronology_key) == ['ancien-format', 'Match_20240901_100000_aaaaaa',
+                                                               'Match_20250301_100000_cccccc']
@@ -0,0 +1,149 @@
+"""Archivage des matchs terminés : un match archivé se relit (historique, reprise, export, analyse) comme avant."""
+import json
+import os
+import sqlite3
+import zlib
+from contextlib import closing
+
+import pytest
+
+import archive
+import database
+import export
+from importer import import_file
+from score_engine import POINTS_POUR_GAGNER, SETS_POUR_GAGNER
+
+JOUEUR = "Bryan R4"
+TERMINE = 'Match_20240914_100000_aaaaaa'
+EN_COURS = 'Match_20240921_100000_bbbbbb'
+ACTIONS_TERMINE = 4 * POINTS_POUR_GAGNER * SETS_POUR_GAGNER // 3 # 3 points toutes les 4 actions (match_rows)
+
+
+def write_csv(path, rows):
+    lines = ["match_id;timestamp;position;joueur_nom;action_code"] + [";".join(row) for row in rows]
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return str(path)
+
+def match_rows(match_id, count, codes=('SVC_ACE', 'REC_OK', 'SVC_ACE', 'ATK_POINT')):
+    return [(match_id, f"10:{i // 60:02d}:{i % 60:02d}", f"P{i % 6 + 1}", JOUEUR, codes[i % len(codes)]) for i in range(count)]
+
+def age_matches(days=90):
+    """Matchs modifiés il y a 'days' jours (l'archivage ne prend que les matchs terminés depuis longtemps)."""
+    with database.transaction() as conn:
+        conn.execute("UPDATE matches SET updated_at = datetime('now', ?)", (f"-{days} days",))
+
+@pytest.fixture
+def season(db):
+    # Match terminé (3 sets gagnés) et match en cours
+    import_file(write_csv(db / 'saison.csv', match_rows(TERMINE, ACTIONS_TERMINE)
+                          + match_rows(EN_COURS, 30)))
+    age_matches()
+    return db
+
+
+def test_archived_match_reads_as_before(season):
+    rows = archive.fetch_all_stats(TERMINE)
+    page = archive.fetch_stats_page(TERMINE, filters=[('action', 'contains', 'ACE')], sort_by=[('score', 'desc')], offset=5, limit=10)
+    version = database.fetch_match_version(TERMINE)
+    aggregates = database.fetch_player_aggregates(TERMINE)
+    set_results = database.fetch_set_results(TERMINE)
+
+    assert archive.archive_finished_matches() == [TERMINE]
+    assert database.fetch_all_stats(TERMINE) == [] # Lignes sorties de la base principale
+    assert [dict(row) for row in archive.fetch_all_stats(TERMINE)] == [dict(row) for row in rows]
+    assert archive.fetch_stats_page(TERMINE, filters=[('action', 'contains', 'ACE')], sort_by=[('score', 'desc')],
+                                    offset=5, limit=10) == page
+    assert database.fetch_match_version(TERMINE) == version
+    assert database.fetch_player_aggregates(TERMINE) == aggregates
+    assert database.fetch_set_results(TERMINE) == set_results
+    assert os.path.exists(archive.archive_path('2024-2025'))
+
+    # Match en cours : jamais archivé
+    assert len(database.fetch_all_stats(EN_COURS)) == 30
+
+def test_archived_match_resumes(season, appmod):
+    before = appmod.rebuild_match_state(TERMINE)
+    archive.archive_finished_matches()
+    state = appmod.rebuild_match_state(TERMINE)
+    assert state['_engine'].match_over
+    for key in ('current_set', 'sets_veec', 'sets_adverse', 'score_veec', 'score_adverse', 'db_version'):
+        assert state[key] == before[key]
+    engine, expected = state['_engine'], before['_engine']
+    assert [engine.event(i) for i in range(len(engine))] == [expected.event(i) for i in range(len(expected))]
+
+def test_export_and_incremental_reads_include_archives(season):
+    ids = sorted(row['id'] for match_id in (TERMINE, EN_COURS) for row in archive.fetch_all_stats(match_id))
+    archive.archive_finished_matches()
+
+    exported = ''.join(export.stream_csv()).splitlines()
+    assert len(exported) == len(ids) + 1
+    assert len(''.join(export.stream_csv(match_id=TERMINE)).splitlines()) == len(archive.fetch_all_stats(TERMINE)) + 1
+
+    assert sorted(row['id'] for rows in archive.iter_actions_since(0, batch_size=7) for row in rows) == ids
+    since = ids[40]
+    assert sorted(row['id'] for rows in archive.iter_actions_since(since) for row in rows) == ids[41:]
+
+def test_import_into_archived_match_is_rejected(season):
+    archive.archive_finished_matches()
+    rows = archive.fetch_all_stats(TERMINE)
+    set_results = database.fetch_set_results(TERMINE)
+    report = import_file(write_csv(season / 'ajout.csv', [(TERMINE, '12:00:00', 'P2', JOUEUR, 'REC_OK')]))
+    assert (report['imported'], report['rejected']) == (0, 1) # Match terminé, repris depuis son archive
+    assert [dict(row) for row in archive.fetch_all_stats(TERMINE)] == [dict(row) for row in rows]
+    assert database.fetch_set_results(TERMINE) == set_results
+
+def test_interrupted_archiving_is_merged_on_next_pass(season, monkeypatch):
+    # Fichier d'archive écrit, puis le processus s'arrête avant la suppression dans la base principale
+    transaction = archive.transaction
+    monkeypatch.setattr(archive, 'transaction', lambda: (_ for _ in ()).throw(KeyboardInterrupt))
+    with pytest.raises(KeyboardInterrupt):
+        archive.archive_finished_matches()
+    monkeypatch.setattr(archive, 'transaction', transaction)
+    assert os.path.exists(archive.archive_path('2024-2025'))
+    rows = archive.fetch_all_stats(TERMINE)
+    assert len(rows) == ACTIONS_TERMINE # Lignes encore dans 'actions', pas comptées deux fois
+
+    assert archive.archive_finished_matches() == [TERMINE]
+    assert database.fetch_all_stats(TERMINE) == []
+    assert [dict(row) for row in archive.fetch_all_stats(TERMINE)] == [dict(row) for row in rows]
+
+def test_match_modified_during_archiving_is_left_for_next_pass(season, monkeypatch):
+    write_archives = archive._write_archives
+
+    def concurrent_write(season_name, entries):
+        write_archives(season_name, entries)
+        database.insert_stat(TERMINE, 3, '12:00:00', 25, 0, 'P1', JOUEUR, 'REC', 'OK')
+
+    monkeypatch.setattr(archive, '_write_archives', concurrent_write)
+    assert archive.archive_finished_matches() == []
+    assert len(database.fetch_all_stats(TERMINE)) == ACTIONS_TERMINE + 1
+
+def test_payload_archived_before_rosters_still_decodes(season):
+    archive.archive_finished_matches()
+    path = archive.archive_path('2024-2025')
+    with closing(sqlite3.connect(path)) as conn:
+        payload = conn.execute("SELECT payload FROM archived_matches WHERE match_id = ?", (TERMINE,)).fetchone()[0]
+        columns = json.loads(zlib.decompress(payload))
+        del columns['joueur_id'] # Archive écrite avant la migration 10
+        conn.execute("UPDATE archived_matches SET payload = ? WHERE match_id = ?",
+                     (zlib.compress(json.dumps(columns).encode('utf-8')), TERMINE))
+        conn.commit()
+
+    rows = archive.fetch_all_stats(TERMINE)
+    assert len(rows) == ACTIONS_TERMINE
+    assert {row['joueur_id'] for row in rows} == {None}
+    assert {row['joueur_nom'] for row in rows} == {JOUEUR}
+
+def test_run_maintenance_archives_and_reports(season):
+    report = archive.run_maintenance(older_than_days=30)
+    assert report['archives'] == 1
+    assert database.fetch_all_stats(TERMINE) == []
+
+@pytest.mark.parametrize('match_id, updated_at, expected', [
+    ('Match_20240801_100000_aaaaaa', None, '2024-2025'),
+    ('Match_20250731_100000_aaaaaa', None, '2024-2025'),
+    ('Match_20240315_100000_aaaaaa', None, '2023-2024'),
+    ('ancien-format', '2023-09-02 18:00:00', '2023-2024'),
+])
+def test_season_of(match_id, updated_at, expected):
+    assert archive.season_of(match_id, updated_at) == expected
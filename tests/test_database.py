@@ -0,0 +1,57 @@
+"""Couche SQLite : écritures groupées (group commit), fins de set et historique paginé."""
+from concurrent.futures import Future
+
+import pytest
+
+import database
+from score_engine import SetResult
+
+MATCH_ID = 'Match_20250101_100000_aaaaaa'
+
+
+def action(match_id=MATCH_ID, score_veec=0, **kwargs):
+    return dict(match_id=match_id, set_num=1, timestamp='10:00:00', score_veec=score_veec, score_adverse=0, position='P1',
+                joueur_nom='Bryan R4', action_category='SVC', action_result='ACE', **kwargs)
+
+def set_result(set_num=1):
+    return SetResult(set_num, 25, 0, 'VEEC', False, '10:30:00')
+
+def set_rows():
+    with database.get_connection() as conn:
+        return conn.execute("SELECT * FROM match_sets WHERE match_id = ?", (MATCH_ID,)).fetchall()
+
+
+@pytest.mark.parametrize('group_commit', [False, True])
+def test_action_and_set_result_written_together(db, monkeypatch, group_commit):
+    monkeypatch.setattr(database, 'GROUP_COMMIT', group_commit)
+    database.insert_stat(**action(score_veec=24), set_result=set_result())
+    assert [row['last_action_id'] for row in set_rows()] == [database.fetch_all_stats(MATCH_ID)[0]['id']]
+
+    # Fin du set 1 déjà enregistrée : l'unité échoue, l'action ne doit pas rester seule en base
+    with pytest.raises(database.sqlite3.IntegrityError):
+        database.insert_stat(**action(score_veec=25), set_result=set_result())
+    assert len(database.fetch_all_stats(MATCH_ID)) == 1
+
+def test_failed_unit_does_not_abort_its_batch(db):
+    ok, failing = Future(), Future()
+    unit = [(database.SQL_INSERT_ACTION, tuple(action().values()) + (None,))]
+    database._writer._commit_batch([
+        (unit + [(database.SQL_INSERT_SET_RESULT, database._set_result_params(MATCH_ID, set_result()))], ok),
+        (unit + [(database.SQL_INSERT_SET_RESULT, database._set_result_params(MATCH_ID, set_result()))], failing),
+    ])
+    assert ok.result() is None
+    with pytest.raises(database.sqlite3.IntegrityError):
+        failing.result()
+    assert len(database.fetch_all_stats(MATCH_ID)) == 1
+    assert len(set_rows()) == 1
+
+def test_new_connection_opens_while_a_write_is_in_progress(db):
+    with database.transaction() as conn:
+        conn.execute(database.SQL_INSERT_ACTION, tuple(action().values()) + (None,))
+        database.close_all_connections() # Pool vide : la lecture ouvre une nouvelle connexion
+        assert database.fetch_match_version(MATCH_ID) == 0
+
+def test_new_database_uses_incremental_vacuum(db):
+    with database.get_connection() as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
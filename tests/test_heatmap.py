@@ -0,0 +1,91 @@
+"""Carte de chaleur des zones : taux par zone, couleurs et tailles des marqueurs, Patch renvoyé par le callback."""
+from contextvars import copy_context
+
+import dash
+import numpy as np
+import pytest
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+
+import database
+
+MATCH_ID = 'Match_20250101_100000_aaaaaa'
+
+
+def aggregate(position, code, count):
+    category, result = code.split('_')
+    return {'position': position, 'joueur_nom': "Bryan R4", 'action_category': category, 'action_result': result, 'count': count}
+
+# P1 : 3 aces et 1 service raté ; P3 : 1 réception neutre et 1 attaque ratée ; P6 : aucune action
+AGGREGATES = [aggregate('P1', 'SVC_ACE', 3), aggregate('P1', 'SVC_ERR', 1),
+              aggregate('P3', 'REC_OK', 1), aggregate('P3', 'ATK_ERR', 1),
+              aggregate('P9', 'SVC_ACE', 5)] # Position inconnue : ignorée
+
+def assigned(patch):
+    """Valeurs affectées par le Patch, par propriété de la trace des zones."""
+    return {op['location'][-1]: op['params']['value'] for op in patch.to_plotly_json()['operations']}
+
+def call(fn, prop_id, *args):
+    def run():
+        context_value.set(AttributeDict(triggered_inputs=[{'prop_id': prop_id, 'value': None}]))
+        return getattr(fn, '__wrapped__', fn)(*args)
+    return copy_context().run(run)
+
+
+def test_zone_rates(appmod):
+    totals, positifs, erreurs = appmod.zone_rates(AGGREGATES)
+    by_zone = {p: (totals[i], positifs[i], erreurs[i]) for p, i in appmod.ZONE_INDEX.items()}
+    assert by_zone['P1'] == (4, 3, 1)
+    assert by_zone['P3'] == (2, 0, 1)
+    assert by_zone['P6'] == (0, 0, 0)
+    assert sum(totals) == 6
+
+@pytest.mark.parametrize('mode, zone, rate', [('reussite', 'P1', 0.75), ('reussite', 'P3', 0.0),
+                                               ('erreurs', 'P1', 0.25), ('erreurs', 'P3', 0.5)])
+def test_patch_colors_zones_by_rate(appmod, mode, zone, rate):
+    values = assigned(appmod.patch_court_heatmap(mode, AGGREGATES))
+    index = appmod.ZONE_INDEX[zone]
+    assert values['color'][index] == appmod.rate_colors(np.array([rate]), np.array([True]), invert=(mode == 'erreurs'))[0]
+    assert values['color'][appmod.ZONE_INDEX['P6']] == appmod.ZONE_EMPTY_COLOR
+    assert values['hovertext'][appmod.ZONE_INDEX['P6']].endswith("aucune action")
+    assert f"({round(100 * rate)} %)" in values['hovertext'][index]
+
+def test_rate_colors_run_from_red_to_green(appmod):
+    assert appmod.rate_colors(np.array([0.0, 1.0]), np.array([True, True])) == ["rgb(220,53,69)", "rgb(40,167,69)"]
+    assert appmod.rate_colors(np.array([0.0, 1.0]), np.array([True, True]), invert=True) == ["rgb(40,167,69)", "rgb(220,53,69)"]
+    assert appmod.rate_colors(np.array([0.0]), np.array([False])) == [appmod.ZONE_EMPTY_COLOR]
+
+def test_marker_sizes_follow_zone_volume(appmod):
+    sizes = assigned(appmod.patch_court_heatmap('reussite', AGGREGATES))['size']
+    size = appmod.ZONE_MARKER_SIZE
+    assert sizes[appmod.ZONE_INDEX['P1']] == round(size * 4 / 3) # Zone la plus fournie
+    assert sizes[appmod.ZONE_INDEX['P3']] == size # Moitié du volume de P1
+    assert sizes[appmod.ZONE_INDEX['P6']] == round(size * 2 / 3)
+    # Aucune action nulle part : toutes les zones à la taille minimale, en gris
+    values = assigned(appmod.patch_court_heatmap('erreurs', []))
+    assert values['size'] == [round(size * 2 / 3)] * len(appmod.ZONE_ORDER)
+    assert values['color'] == [appmod.ZONE_EMPTY_COLOR] * len(appmod.ZONE_ORDER)
+
+def test_zones_mode_resets_markers(appmod):
+    values = assigned(appmod.patch_court_heatmap('zones', AGGREGATES))
+    assert values == {'color': appmod.VEEC_COLOR, 'size': appmod.ZONE_MARKER_SIZE,
+                      'hovertext': [appmod.VEEC_ZONES_COORDS[p]['name'] for p in appmod.ZONE_ORDER]}
+
+def test_callback_ignores_entries_while_map_is_off(appmod):
+    store = {'match_id': MATCH_ID}
+    with pytest.raises(dash.exceptions.PreventUpdate):
+        call(appmod.update_court_heatmap, 'match-state.data', 'zones', None, None, store)
+    with pytest.raises(dash.exceptions.PreventUpdate):
+        call(appmod.update_court_heatmap, 'heatmap-player-filter.value', 'zones', "Bryan R4", None, store)
+    # Retour au mode 'zones' : la carte est remise à zéro
+    assert assigned(call(appmod.update_court_heatmap, 'heatmap-mode.value', 'zones', None, None, store))['size'] == \
+        appmod.ZONE_MARKER_SIZE
+
+def test_callback_reads_position_aggregates(appmod):
+    for code in ('SVC_ACE', 'SVC_ACE', 'SVC_ERR'):
+        category, result = code.split('_')
+        database.insert_stat(MATCH_ID, 1, '10:00:00', 0, 0, 'P1', "Bryan R4", category, result)
+    values = assigned(call(appmod.update_court_heatmap, 'match-state.data', 'reussite', None, None, {'match_id': MATCH_ID}))
+    assert values['hovertext'][appmod.ZONE_INDEX['P1']].endswith("2/3 positifs (67 %)")
+    values = assigned(call(appmod.update_court_heatmap, 'match-state.data', 'reussite', None, 'ATK', {'match_id': MATCH_ID}))
+    assert values['color'][appmod.ZONE_INDEX['P1']] == appmod.ZONE_EMPTY_COLOR # Filtre de catégorie
@@ -0,0 +1,58 @@
+"""Table d'historique mise à jour par Patch : la fenêtre des HISTORIQUE_MAX_ROWS lignes doit rester identique à un rendu complet."""
+import random
+
+from score_engine import ScoreEngine, Event, POINTS_POUR_GAGNER
+
+
+def apply_patch(rows, patch):
+    """Applique au contenu de la table les opérations du Patch, comme le fait dash-renderer."""
+    rows = list(rows)
+    for op in patch.to_plotly_json()['operations']:
+        if op['operation'] == 'Delete':
+            del rows[op['location'][0]]
+        elif op['operation'] == 'Prepend':
+            rows.insert(0, op['params']['value'])
+        elif op['operation'] == 'Append':
+            rows.append(op['params']['value'])
+        else:
+            raise AssertionError(f"opération inattendue : {op}")
+    return rows
+
+def entry(n, action):
+    return Event(f"10:{n // 60 % 60:02d}:{n % 60:02d}", f"P{n % 6 + 1}", "Bryan R4", action)
+
+
+def test_patched_window_matches_full_render(appmod):
+    rng = random.Random(11)
+    engine = ScoreEngine()
+    rows = appmod.historique_table_data(engine)
+    for n in range(400):
+        length_before = appmod.historique_length(engine)
+        if len(engine) and rng.random() < 0.35:
+            engine.pop()
+            patch = appmod.patch_historique_table(engine, removed=length_before - appmod.historique_length(engine))
+        else:
+            engine.append(entry(n, rng.choice(['SVC_ACE', 'ATK_ERR', 'REC_OK', 'SVC_ACE'])))
+            patch = appmod.patch_historique_table(engine, added=appmod.historique_length(engine) - length_before)
+        rows = apply_patch(rows, patch)
+        assert rows == appmod.historique_table_data(engine), n
+
+def test_window_edges(appmod):
+    """Autour de HISTORIQUE_MAX_ROWS : ligne la plus ancienne qui sort, puis revient après une annulation."""
+    max_rows = appmod.HISTORIQUE_MAX_ROWS
+    engine = ScoreEngine()
+    rows = []
+    # Jusqu'à max_rows + 2 lignes, dont une fin de set (deux lignes ajoutées par la même action)
+    while appmod.historique_length(engine) < max_rows + 2:
+        length_before = appmod.historique_length(engine)
+        engine.append(entry(len(engine), 'SVC_ACE' if len(engine) < POINTS_POUR_GAGNER else 'REC_OK'))
+        rows = apply_patch(rows, appmod.patch_historique_table(engine, added=appmod.historique_length(engine) - length_before))
+        assert len(rows) == min(appmod.historique_length(engine), max_rows)
+        assert rows == appmod.historique_table_data(engine)
+
+    while len(engine):
+        length_before = appmod.historique_length(engine)
+        engine.pop()
+        rows = apply_patch(rows, appmod.patch_historique_table(engine, removed=length_before - appmod.historique_length(engine)))
+        assert rows == appmod.historique_table_data(engine)
+    assert rows == []
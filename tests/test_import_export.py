@@ -0,0 +1,174 @@
+"""Import en masse (importer.py), export en flux (export.py) et aller-retour de l'un à l'autre."""
+import sqlite3
+import zipfile
+
+import pytest
+
+import database
+import export
+from importer import ImportAborted, import_file
+from registry import LISTE_JOUEURS_PREDEFINIE
+from score_engine import POINTS_POUR_GAGNER, SETS_POUR_GAGNER
+
+JOUEUR = "Bryan R4"
+MATCH_ID = 'Match_20250101_100000_aaaaaa'
+
+
+def write_csv(path, rows, header="match_id;timestamp;position;joueur_nom;action_code"):
+    path.write_text("\n".join([header] + [";".join(map(str, row)) for row in rows]) + "\n", encoding='utf-8')
+    return str(path)
+
+def aces(match_id, count):
+    return [(match_id, f"10:{i // 60:02d}:{i % 60:02d}", 'P1', JOUEUR, 'SVC_ACE') for i in range(count)]
+
+
+def test_import_commits_batch_by_batch(db):
+    path = write_csv(db / 'saison.csv', aces(MATCH_ID, 12))
+    lock_free = []
+
+    def try_write(report):
+        # Entre deux paquets, une saisie doit pouvoir prendre le verrou d'écriture
+        other = sqlite3.connect(database.DB_NAME, timeout=0, isolation_level=None)
+        try:
+            other.execute("BEGIN IMMEDIATE")
+            other.execute("ROLLBACK")
+            if report['step'] == 'insertion':
+                lock_free.append(report['imported'])
+        finally:
+            other.close()
+
+    report = import_file(path, batch_size=5, progress=try_write)
+    assert report['imported'] == 12
+    assert lock_free == [5, 10, 12]
+
+def test_batches_keep_aggregates_versions_and_set_results(db):
+    # Deux sets gagnés, à cheval sur plusieurs paquets
+    rows = aces(MATCH_ID, 2 * POINTS_POUR_GAGNER + 3)
+    import_file(write_csv(db / 'saison.csv', rows), batch_size=7)
+
+    assert [(r.set_num, r.score_veec) for _, r in database.fetch_set_results(MATCH_ID)] == [(1, 25), (2, 25)]
+    assert database.fetch_match_version(MATCH_ID) >= len(rows)
+    aggregates = database.fetch_player_aggregates(MATCH_ID)
+    assert sum(row['count'] for row in aggregates) == len(rows)
+    with database.get_connection() as conn:
+        team_id, sets_veec = conn.execute("SELECT team_id, sets_veec FROM matches WHERE match_id = ?", (MATCH_ID,)).fetchone()
+    assert (team_id, sets_veec) == (database.DEFAULT_TEAM_ID, 2)
+
+def test_strict_import_writes_nothing_on_a_late_invalid_line(db):
+    rows = aces(MATCH_ID, 10) + [(MATCH_ID, '10:59:00', 'P9', JOUEUR, 'SVC_ACE')]
+    with pytest.raises(ImportAborted):
+        import_file(write_csv(db / 'saison.csv', rows), strict=True, batch_size=3)
+    assert database.fetch_all_stats(MATCH_ID) == []
+
+def test_lenient_import_skips_invalid_lines(db):
+    rows = aces(MATCH_ID, 4) + [(MATCH_ID, '10:59:00', 'P1', "Inconnu", 'SVC_ACE'), (MATCH_ID, '11:00:00', 'P1', JOUEUR, 'XXX')]
+    report = import_file(write_csv(db / 'saison.csv', rows), batch_size=2)
+    assert (report['read'], report['imported'], report['rejected']) == (6, 4, 2)
+    assert [e['line'] for e in report['errors']] == [6, 7]
+
+# --- ALLER-RETOUR EXPORT -> IMPORT ---
+
+AUTRE_MATCH = 'Match_20250108_100000_bbbbbb'
+ROUND_TRIP_COLUMNS = ('match_id', 'set_num', 'timestamp', 'score_veec', 'score_adverse', 'position', 'joueur_nom',
+                      'joueur_id', 'action_code')
+
+def season_rows():
+    """Deux matchs, dont un set terminé, plusieurs joueurs de l'effectif et des actions sans effet sur le score."""
+    joueurs = [p['nom'] for p in LISTE_JOUEURS_PREDEFINIE[:3]]
+    codes = ['ATK_POINT', 'REC_OK', 'ATK_ERR', 'BLK_POINT', 'SVC_ERR']
+    rows = aces(MATCH_ID, POINTS_POUR_GAGNER)
+    rows += [(MATCH_ID, f"11:00:{i:02d}", f"P{i % 6 + 1}", joueurs[i % 3], codes[i % 5]) for i in range(20)]
+    rows += [(AUTRE_MATCH, f"14:00:{i:02d}", 'P3', joueurs[i % 3], codes[i % 5]) for i in range(7)]
+    return rows
+
+def table(match_ids=(MATCH_ID, AUTRE_MATCH)):
+    return [tuple(row[column] for column in ROUND_TRIP_COLUMNS)
+            for match_id in match_ids for row in reversed(database.fetch_all_stats(match_id))]
+
+def export_to(path, fmt, **filters):
+    with open(path, 'wb') as f:
+        for chunk in export.EXPORT_STREAMS[fmt](**filters):
+            f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    return str(path)
+
+def fresh_database(path, monkeypatch):
+    database.close_all_connections()
+    monkeypatch.setattr(database, 'DB_NAME', str(path))
+    database.init_db()
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl', 'xlsx'])
+def test_export_then_import_round_trip(db, monkeypatch, fmt):
+    import_file(write_csv(db / 'saison.csv', season_rows()))
+    exported = table()
+    set_results = database.fetch_set_results(MATCH_ID)
+    assert len(set_results) == 1
+    path = export_to(db / f'saison.{fmt}', fmt)
+
+    fresh_database(db / 'copie.db', monkeypatch)
+    report = import_file(path)
+    assert (report['imported'], report['rejected']) == (len(exported), 0)
+    assert table() == exported
+    assert [r for _, r in database.fetch_set_results(MATCH_ID)] == [r for _, r in set_results]
+
+def test_filtered_export_round_trip(db, monkeypatch):
+    import_file(write_csv(db / 'saison.csv', season_rows()))
+    exported = table([AUTRE_MATCH])
+    path = export_to(db / 'match.jsonl', 'jsonl', match_id=AUTRE_MATCH)
+
+    fresh_database(db / 'copie.db', monkeypatch)
+    assert import_file(path)['imported'] == len(exported)
+    assert table() == exported
+
+def test_xlsx_export_rolls_over_to_new_sheets(db, monkeypatch):
+    monkeypatch.setattr(export, 'XLSX_MAX_ROWS', 10) # En-tête + 9 lignes par feuille
+    import_file(write_csv(db / 'saison.csv', season_rows()))
+    exported = table()
+    path = export_to(db / 'saison.xlsx', 'xlsx')
+    with zipfile.ZipFile(path) as archive:
+        sheets = [name for name in archive.namelist() if name.startswith('xl/worksheets/')]
+        workbook = archive.read('xl/workbook.xml').decode('utf-8')
+    sheet_count = -(-len(exported) // 9)
+    assert len(sheets) == sheet_count
+    assert workbook.count('<sheet ') == sheet_count
+
+    fresh_database(db / 'copie.db', monkeypatch)
+    report = import_file(path)
+    assert (report['read'], report['imported']) == (len(exported), len(exported))
+    assert table() == exported
+
+# --- SET ET SCORE RECALCULÉS ---
+
+def stored_scores(match_id=MATCH_ID):
+    return [(row['set_num'], row['score_veec'], row['score_adverse']) for row in reversed(database.fetch_all_stats(match_id))]
+
+def test_scores_continue_from_actions_already_stored(db):
+    import_file(write_csv(db / 'debut.csv', aces(MATCH_ID, 3)))
+    import_file(write_csv(db / 'suite.csv', aces(MATCH_ID, POINTS_POUR_GAGNER)[3:]))
+    assert stored_scores() == [(1, n, 0) for n in range(POINTS_POUR_GAGNER)]
+    assert [(r.set_num, r.score_veec) for _, r in database.fetch_set_results(MATCH_ID)] == [(1, POINTS_POUR_GAGNER)]
+
+def test_rows_with_their_own_score_feed_the_engine(db):
+    # Les deux premières lignes donnent leur set et leur score, les suivantes non
+    header = "match_id;timestamp;position;joueur_nom;action_code;set_num;score"
+    rows = [row + (1, f"{n}-0") for n, row in enumerate(aces(MATCH_ID, 2))]
+    rows += [row + ('', '') for row in aces(MATCH_ID, 4)[2:]] + [(MATCH_ID, '10:05:00', 'P1', JOUEUR, 'ATK_ERR', '', '')]
+    import_file(write_csv(db / 'mixte.csv', rows, header=header))
+    assert stored_scores() == [(1, 0, 0), (1, 1, 0), (1, 2, 0), (1, 3, 0), (1, 4, 0)]
+
+def test_rows_after_match_end_are_rejected(db):
+    match_length = POINTS_POUR_GAGNER * SETS_POUR_GAGNER
+    report = import_file(write_csv(db / 'saison.csv', aces(MATCH_ID, match_length + 5)))
+    assert (report['imported'], report['rejected']) == (match_length, 5)
+    assert report['errors'][0]['message'] == f"match déjà terminé : {MATCH_ID}"
+    assert stored_scores()[-1] == (SETS_POUR_GAGNER, POINTS_POUR_GAGNER - 1, 0)
+
+    # Match terminé en base : un nouvel import ne peut plus rien y ajouter
+    report = import_file(write_csv(db / 'ajout.csv', aces(MATCH_ID, 2)))
+    assert (report['imported'], report['rejected']) == (0, 2)
+    assert len(database.fetch_all_stats(MATCH_ID)) == match_length
+
+def test_strict_import_refuses_rows_after_match_end(db):
+    rows = aces(MATCH_ID, POINTS_POUR_GAGNER * SETS_POUR_GAGNER + 1)
+    with pytest.raises(ImportAborted):
+        import_file(write_csv(db / 'saison.csv', rows), strict=True)
+    assert database.fetch_all_stats(MATCH_ID) == []
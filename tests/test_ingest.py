@@ -0,0 +1,33 @@
+"""Ingestion de la file d'actions du navigateur (/api/actions/bulk) : idempotence et validation."""
+import uuid
+
+import database
+
+MATCH_ID = 'Match_20250101_100000_aaaaaa'
+
+
+def client_action(seq, action='SVC_ACE', **kwargs):
+    return {'uuid': uuid.uuid4().hex, 'seq': seq, 'match_id': MATCH_ID, 'pos': 1, 'joueur': 1, 'action': action,
+            'timestamp': '10:00:00', **kwargs}
+
+
+def test_bulk_ingest_is_idempotent(appmod):
+    actions = [client_action(1), client_action(2, 'ATK_ERR')]
+    client = appmod.app.server.test_client()
+    first = client.post('/api/actions/bulk', json={'actions': actions}).get_json()
+    again = client.post('/api/actions/bulk', json={'actions': actions}).get_json()
+    assert len(first['inserted']) == 2 and first['history_added'] == {MATCH_ID: 2}
+    assert again['inserted'] == [] and sorted(again['duplicates']) == sorted(a['uuid'] for a in actions)
+    assert len(database.fetch_all_stats(MATCH_ID)) == 2
+
+def test_mixed_seq_types_sorted_numerically(appmod):
+    actions = [client_action('10', 'ATK_ERR'), client_action(2), client_action(None, 'REC_OK'), client_action('x')]
+    response = appmod.app.server.test_client().post('/api/actions/bulk', json={'actions': actions})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['rejected'] == [{'uuid': actions[3]['uuid'], 'reason': 'seq invalide'}]
+    codes = [row['action_code'] for row in reversed(database.fetch_all_stats(MATCH_ID))]
+    assert codes == ['REC_OK', 'SVC_ACE', 'ATK_ERR']
+    with database.get_connection() as conn:
+        seqs = conn.execute("SELECT client_seq, typeof(client_seq) FROM actions ORDER BY id").fetchall()
+    assert [tuple(row) for row in seqs] == [(None, 'null'), (2, 'integer'), (10, 'integer')]
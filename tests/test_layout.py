@@ -0,0 +1,58 @@
+"""Route /_dash-layout : layout pré-sérialisé, identifiant de match propre à chaque chargement, effectifs à jour."""
+import json
+
+import pytest
+from dash._utils import to_json
+
+import roster
+
+
+def find_component(node, component_id):
+    """Composant 'component_id' dans le layout sérialisé (arbre de {'type', 'namespace', 'props'})."""
+    if isinstance(node, list):
+        return next((found for child in node if (found := find_component(child, component_id))), None)
+    if isinstance(node, dict):
+        props = node.get('props', {})
+        if props.get('id') == component_id:
+            return node
+        return next((found for value in props.values() if (found := find_component(value, component_id))), None)
+    return None
+
+@pytest.fixture
+def client(appmod):
+    appmod.layout_json_template.cache_clear()
+    appmod.static_layout.cache_clear()
+    return appmod.app.server.test_client()
+
+def fetch_layout(client):
+    response = client.get('/_dash-layout')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    body = response.get_data(as_text=True)
+    return body, find_component(json.loads(body), 'match-state')['props']['data']['match_id']
+
+
+def test_each_page_load_gets_its_own_match(client, appmod):
+    first_body, first_id = fetch_layout(client)
+    second_body, second_id = fetch_layout(client)
+    assert first_id != second_id
+    assert appmod.LAYOUT_MATCH_ID_PLACEHOLDER not in first_body
+    # Même contenu que la sérialisation normale du layout, à l'identifiant près
+    assert first_body == to_json(appmod.serve_layout(first_id))
+    assert second_body == to_json(appmod.serve_layout(second_id))
+    # Servi par la route pré-sérialisée (sérialisé une seule fois), et non par la sérialisation de Dash
+    assert appmod.layout_json_template.cache_info()[:2] == (1, 1)
+
+def test_layout_rebuilt_when_rosters_change(client, appmod):
+    body, _ = fetch_layout(client)
+    assert "Nouvelle recrue" not in body
+
+    players = [{'id': p.id, 'numero': p.numero, 'nom': p.nom} for p in roster.team(appmod.DEFAULT_TEAM_ID).players]
+    version = roster.version()
+    roster.save_team_players(appmod.DEFAULT_TEAM_ID, players + [{'numero': 98, 'nom': "Nouvelle recrue"}])
+    assert roster.version() != version
+
+    body, match_id = fetch_layout(client)
+    assert appmod.layout_json_template.cache_info().misses == 2
+    assert "Nouvelle recrue" in body
+    assert body == to_json(appmod.serve_layout(match_id))
@@ -0,0 +1,63 @@
+"""Courtier du score en direct : plafond de flux par worker et mémoire bornée des derniers messages."""
+import live
+from live import MatchBroker
+
+
+def test_subscribe_refused_beyond_limit():
+    broker = MatchBroker()
+    first = broker.subscribe('m1', limit=2)
+    assert broker.subscribe('m2', limit=2) is not None
+    assert broker.subscribe('m1', limit=2) is None
+
+    broker.unsubscribe('m1', first)
+    broker.unsubscribe('m1', first) # Fin du générateur puis fermeture de la réponse : compté une seule fois
+    assert broker.subscriber_count() == 1
+    assert broker.subscribe('m1', limit=2) is not None
+
+def test_last_message_sent_to_new_subscriber():
+    broker = MatchBroker()
+    broker.publish('m1', {'score_veec': 3})
+    subscriber = broker.subscribe('m1')
+    assert subscriber.get_nowait() == '{"score_veec": 3}'
+
+def test_finished_match_without_subscriber_is_forgotten():
+    broker = MatchBroker()
+    broker.publish('m1', {'match_over': False})
+    assert broker.last_message('m1') is not None
+    broker.publish('m1', {'match_over': True})
+    assert broker.last_message('m1') is None
+
+def test_idle_matches_pruned(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(live.time, 'monotonic', lambda: now[0])
+    broker = MatchBroker()
+    subscriber = broker.subscribe('watched')
+    broker.publish('watched', {'match_over': False})
+    broker.publish('idle', {'match_over': False})
+    left = broker.subscribe('left')
+    broker.publish('left', {'match_over': True})
+    broker.unsubscribe('left', left)
+
+    now[0] += live.IDLE_SECONDS + live.PRUNE_INTERVAL_SECONDS
+    broker.publish('watched', {'match_over': False})
+    assert broker.last_message('watched') is not None
+    assert broker.last_message('idle') is None
+    assert broker.last_message('left') is None
+    broker.unsubscribe('watched', subscriber)
+
+def test_events_route_returns_503_when_full(appmod, monkeypatch):
+    monkeypatch.setattr(appmod, 'MAX_STREAMS', 1)
+    monkeypatch.setattr(appmod, '_ensure_live_watcher', lambda: None)
+    client = appmod.app.server.test_client()
+
+    opened = client.get('/live/Match_20250101_100000_aaaaaa/events')
+    assert opened.status_code == 200
+    refused = client.get('/live/Match_20250101_100000_bbbbbb/events')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == str(live.RETRY_AFTER_SECONDS)
+
+    opened.close() # Déconnexion du spectateur : sa place est libérée
+    assert appmod.broker.subscriber_count() == 0
+    again = client.get('/live/Match_20250101_100000_bbbbbb/events')
+    assert again.status_code == 200
+    again.close()
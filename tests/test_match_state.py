@@ -0,0 +1,150 @@
+"""Saisie et annulation côté serveur : état en mémoire, table 'actions' et fins de set doivent rester d'accord."""
+import json
+from contextvars import copy_context
+
+import pytest
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+
+import database
+
+
+def call(fn, prop_id, value, *args):
+    """Exécute un callback Dash hors requête HTTP, comme déclenché par 'prop_id'."""
+    def run():
+        context_value.set(AttributeDict(triggered_inputs=[{'prop_id': prop_id, 'value': value}]))
+        return getattr(fn, '__wrapped__', fn)(*args)
+    return copy_context().run(run)
+
+def new_match(appmod):
+    return call(appmod.start_new_match, 'btn-new-match.n_clicks', 1, 1, None)[0]
+
+def enter(appmod, store, action, pos=1, joueur=1):
+    """Sélection (position, joueur) puis saisie d'une action ; retourne le nouveau Store."""
+    store = dict(store, temp_selected_pos=pos, temp_selected_player=joueur)
+    prop_id = json.dumps({'type': 'select-action-btn', 'value': action}, separators=(',', ':')) + '.n_clicks'
+    return call(appmod.process_stat_entry, prop_id, 1, [1], store)[0]
+
+def undo(appmod, store):
+    return call(appmod.handle_undo, 'btn-undo-last.n_clicks', 1, 1, store)[0]
+
+def db_codes(match_id):
+    return [row['action_code'] for row in reversed(database.fetch_all_stats(match_id))]
+
+
+def test_entry_and_undo_keep_database_in_order(appmod):
+    store = new_match(appmod)
+    match_id = store['match_id']
+    for action in ('SVC_ACE', 'ATK_ERR', 'REC_PERF', 'ATK_POINT'):
+        store = enter(appmod, store, action)
+    assert db_codes(match_id) == ['SVC_ACE', 'ATK_ERR', 'REC_PERF', 'ATK_POINT']
+
+    store = undo(appmod, store)
+    store = undo(appmod, store)
+    store = enter(appmod, store, 'BLK_POINT')
+    assert db_codes(match_id) == ['SVC_ACE', 'ATK_ERR', 'BLK_POINT']
+
+    state = appmod.load_match_state(store)
+    assert (state['score_veec'], state['score_adverse']) == (2, 1)
+    rebuilt = appmod.rebuild_match_state(match_id)
+    assert [rebuilt['_engine'].event(i).action for i in range(len(rebuilt['_engine']))] == db_codes(match_id)
+    assert (rebuilt['score_veec'], rebuilt['score_adverse']) == (2, 1)
+
+def test_undo_reopens_set_and_drops_its_result(appmod):
+    store = new_match(appmod)
+    match_id = store['match_id']
+    for _ in range(appmod.POINTS_POUR_GAGNER):
+        store = enter(appmod, store, 'SVC_ACE')
+    assert len(database.fetch_set_results(match_id)) == 1
+    assert appmod.load_match_state(store)['sets_veec'] == 1
+
+    store = undo(appmod, store)
+    assert database.fetch_set_results(match_id) == []
+    state = appmod.rebuild_match_state(match_id)
+    assert (state['sets_veec'], state['score_veec'], state['current_set']) == (0, appmod.POINTS_POUR_GAGNER - 1, 1)
+
+def test_failed_insert_forgets_cached_state(appmod, monkeypatch):
+    store = enter(appmod, new_match(appmod), 'SVC_ACE')
+    match_id = store['match_id']
+
+    def failing_insert(**kwargs):
+        raise database.sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(appmod, 'insert_stat', failing_insert)
+    with pytest.raises(database.sqlite3.OperationalError):
+        enter(appmod, store, 'SVC_ACE')
+    assert match_id not in appmod._match_states
+
+    state = appmod.load_match_state(store)
+    assert state['score_veec'] == 1
+    assert len(state['_engine']) == 1
+
+def test_failed_undo_forgets_cached_state(appmod, monkeypatch):
+    store = enter(appmod, enter(appmod, new_match(appmod), 'SVC_ACE'), 'SVC_ACE')
+    match_id = store['match_id']
+
+    confirm_match_write = appmod.confirm_match_write
+    def failing_confirm(state):
+        raise database.sqlite3.OperationalError('disk I/O error')
+    monkeypatch.setattr(appmod, 'confirm_match_write', failing_confirm)
+    with pytest.raises(database.sqlite3.OperationalError):
+        undo(appmod, store)
+    assert match_id not in appmod._match_states
+    monkeypatch.setattr(appmod, 'confirm_match_write', confirm_match_write)
+
+    # La suppression a été validée : l'état reconstruit la reflète
+    assert appmod.load_match_state(store)['score_veec'] == 1
+
+def test_stale_tab_entry_refused_and_reloaded(appmod):
+    tab_a = new_match(appmod)
+    tab_b = dict(tab_a) # Même match ouvert dans un second onglet
+    tab_a = enter(appmod, tab_a, 'SVC_ACE')
+
+    prop_id = json.dumps({'type': 'select-action-btn', 'value': 'ATK_ERR'}, separators=(',', ':')) + '.n_clicks'
+    outputs = call(appmod.process_stat_entry, prop_id, 1, [1], dict(tab_b, temp_selected_pos=1, temp_selected_player=1))
+    tab_b, histo_table, score_veec = outputs[0], outputs[2], outputs[3]
+    assert db_codes(tab_a['match_id']) == ['SVC_ACE']
+    assert score_veec == '1' and len(histo_table) == 1
+    assert tab_b['temp_selected_pos'] is None
+
+    tab_b = enter(appmod, tab_b, 'ATK_ERR') # Onglet rechargé : la saisie suivante est acceptée
+    assert db_codes(tab_a['match_id']) == ['SVC_ACE', 'ATK_ERR']
+
+def test_stale_tab_undo_refused(appmod):
+    tab_a = enter(appmod, new_match(appmod), 'SVC_ACE')
+    tab_b = dict(tab_a)
+    tab_a = enter(appmod, tab_a, 'ATK_ERR')
+
+    tab_b = undo(appmod, tab_b) # L'onglet ne voit pas ATK_ERR : rien n'est supprimé
+    assert db_codes(tab_a['match_id']) == ['SVC_ACE', 'ATK_ERR']
+    undo(appmod, tab_b)
+    assert db_codes(tab_a['match_id']) == ['SVC_ACE']
+
+def test_team_change_keeps_tab_current(appmod):
+    import roster
+    team_id = roster.create_team("VEEC 2")
+    roster.save_team_players(team_id, [{'numero': 9, 'nom': "Léo Pointu"}])
+    store = call(appmod.start_new_match, 'btn-new-match.n_clicks', 1, 1, team_id)[0]
+    store = enter(appmod, store, 'SVC_ACE', joueur=9)
+    assert db_codes(store['match_id']) == ['SVC_ACE']
+    assert database.fetch_all_stats(store['match_id'])[0]['joueur_nom'] == "Léo Pointu"
+
+def test_restart_resumes_from_recorded_set_results(appmod, monkeypatch):
+    store = new_match(appmod)
+    match_id = store['match_id']
+    for action in ['SVC_ACE'] * appmod.POINTS_POUR_GAGNER + ['ATK_ERR', 'SVC_ACE']:
+        store = enter(appmod, store, action)
+    before = appmod.load_match_state(store)
+
+    appmod._match_states.clear() # Redémarrage du serveur : plus rien en mémoire
+    steps = []
+    step = appmod.ScoreEngine._step
+    monkeypatch.setattr(appmod.ScoreEngine, '_step', lambda self, index: steps.append(index) or step(self, index))
+    state = appmod.load_match_state(store)
+    assert steps == [appmod.POINTS_POUR_GAGNER, appmod.POINTS_POUR_GAGNER + 1] # Seul le set 2 est rejoué
+    for key in ('current_set', 'sets_veec', 'score_veec', 'score_adverse'):
+        assert state[key] == before[key]
+    assert (state['current_set'], state['score_veec'], state['score_adverse']) == (2, 1, 1)
+
+    store = enter(appmod, store, 'SVC_ACE')
+    assert appmod.load_match_state(store)['score_veec'] == 2
+    assert len(db_codes(match_id)) == appmod.POINTS_POUR_GAGNER + 3
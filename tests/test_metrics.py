@@ -0,0 +1,32 @@
+"""Mesures partagées entre workers : seuls les workers en vie sont additionnés."""
+import json
+import os
+import subprocess
+import sys
+
+import metrics
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_dead_worker_files_removed_when_collecting(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    values = {'veec_test_total': {'': 2}}
+    dead, alive = dead_pid(), os.getppid()
+    for pid in (dead, alive):
+        (tmp_path / f"{pid}.json").write_text(json.dumps(values), encoding='utf-8')
+
+    assert metrics._merged_values()['veec_test_total'][''] == 2 # Le worker arrêté n'est plus compté
+    assert sorted(os.listdir(tmp_path)) == [f"{alive}.json"]
+
+def test_mark_process_dead(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    (tmp_path / "123.json").write_text("{}", encoding='utf-8')
+    (tmp_path / "123.json.tmp").write_text("{}", encoding='utf-8')
+    metrics.mark_process_dead(123)
+    metrics.mark_process_dead(123) # Déjà supprimé : sans erreur
+    assert os.listdir(tmp_path) == []
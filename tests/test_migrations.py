@@ -0,0 +1,106 @@
+"""Migrations du schéma : une base créée par la première version de l'application doit arriver intacte à la dernière version."""
+import sqlite3
+
+import pytest
+
+import database
+from score_engine import POINTS_POUR_GAGNER
+
+JOUEUR = "Bryan R4"
+MATCH_ID = 'Match_20240901_100000_aaaaaa'
+AUTRE_MATCH = 'Match_20240908_100000_bbbbbb'
+
+
+def legacy_rows():
+    """Lignes telles que les écrivait la première version : score 'V-A' et code 'CAT_RESULTAT' en texte."""
+    rows = [(MATCH_ID, 1, f"10:00:{i:02d}", f"{i}-0", 'P1', JOUEUR, 'SVC_ACE') for i in range(POINTS_POUR_GAGNER)]
+    rows += [(MATCH_ID, 2, "10:30:00", "0-0", 'P4', "Joueur parti", 'ATK_ERR'),
+             (AUTRE_MATCH, 1, "11:00:00", "0-0", 'P2', JOUEUR, 'REC_PERF')]
+    return rows
+
+@pytest.fixture
+def legacy_db(db, monkeypatch):
+    """Base à la version 0 (user_version non posé), créée comme le faisait la première version de l'application."""
+    path = str(db / 'ancienne.db')
+    conn = sqlite3.connect(path)
+    database._migration_1_create_actions(conn)
+    conn.executemany("""
+        INSERT INTO actions (match_id, set_num, timestamp, score_at_action, position, joueur_nom, action_code)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, legacy_rows())
+    conn.commit()
+    conn.close()
+    database.close_all_connections()
+    monkeypatch.setattr(database, 'DB_NAME', path)
+    return path
+
+def migrate_to(version):
+    with database.transaction() as conn:
+        for target_version, migration in enumerate(database.MIGRATIONS[:version], start=1):
+            migration(conn)
+            conn.execute(f"PRAGMA user_version={target_version}")
+
+def user_version():
+    with database.get_connection() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def test_legacy_database_migrates_to_latest_version(legacy_db):
+    database.init_db()
+    assert user_version() == database.SCHEMA_VERSION == 10
+
+    rows = list(reversed(database.fetch_all_stats(MATCH_ID)))
+    assert len(rows) == POINTS_POUR_GAGNER + 1
+    assert (rows[3]['score_veec'], rows[3]['score_adverse'], rows[3]['action_code']) == (3, 0, 'SVC_ACE')
+    assert (rows[-1]['set_num'], rows[-1]['action_category'], rows[-1]['action_result']) == (2, 'ATK', 'ERR')
+
+    aggregates = {(row['joueur_nom'], row['action_category'], row['action_result']): row['count']
+                  for row in database.fetch_player_aggregates(MATCH_ID)}
+    assert aggregates == {(JOUEUR, 'SVC', 'ACE'): POINTS_POUR_GAGNER, ("Joueur parti", 'ATK', 'ERR'): 1}
+
+    assert database.fetch_match_versions([MATCH_ID, AUTRE_MATCH]) == {MATCH_ID: len(rows), AUTRE_MATCH: 1}
+    assert [(action_id, r.set_num, r.winner) for action_id, r in database.fetch_set_results(MATCH_ID)] == \
+        [(rows[POINTS_POUR_GAGNER - 1]['id'], 1, 'VEEC')]
+
+    with database.get_connection() as conn:
+        matches = conn.execute("SELECT sets_veec, status, team_id, archive FROM matches WHERE match_id = ?", (MATCH_ID,)).fetchone()
+        joueurs = dict(conn.execute("SELECT joueur_nom, joueur_id FROM actions WHERE match_id = ? GROUP BY joueur_nom", (MATCH_ID,)).fetchall())
+        bryan = conn.execute("SELECT id FROM players WHERE team_id = ? AND nom = ?", (database.DEFAULT_TEAM_ID, JOUEUR)).fetchone()[0]
+        effectif = conn.execute("SELECT COUNT(*) FROM players WHERE team_id = ?", (database.DEFAULT_TEAM_ID,)).fetchone()[0]
+    assert tuple(matches) == (1, 'en_cours', database.DEFAULT_TEAM_ID, None)
+    assert joueurs == {JOUEUR: bryan, "Joueur parti": None}
+    assert effectif == len(database.LISTE_JOUEURS_PREDEFINIE)
+
+def test_migrated_database_keeps_ids_and_triggers(legacy_db):
+    database.init_db()
+    last_id = database.fetch_all_stats(MATCH_ID)[0]['id']
+    database.delete_last_stat_and_get_data(MATCH_ID)
+    database.insert_stat(MATCH_ID, 2, '10:31:00', 0, 0, 'P1', JOUEUR, 'SVC', 'OK')
+
+    rows = database.fetch_all_stats(MATCH_ID)
+    assert rows[0]['id'] > last_id # Id d'une action annulée jamais réattribué (AUTOINCREMENT)
+    assert database.fetch_match_version(MATCH_ID) == POINTS_POUR_GAGNER + 3
+    with database.get_connection() as conn:
+        assert [row[0] for row in conn.execute("SELECT action_id FROM actions_deleted")] == [last_id]
+
+def test_intermediate_version_keeps_deleted_ids_reserved(legacy_db):
+    # Base arrêtée à la version 8, avec une action annulée en fin de table
+    migrate_to(8)
+    assert user_version() == 8
+    with database.transaction() as conn: # Annulation telle que l'écrivait la version 8 (colonnes de l'époque)
+        deleted_id = conn.execute("SELECT MAX(id) FROM actions").fetchone()[0]
+        conn.execute("DELETE FROM actions WHERE id = ?", (deleted_id,))
+
+    database.init_db()
+    assert user_version() == database.SCHEMA_VERSION
+    database.insert_stat(AUTRE_MATCH, 1, '11:00:01', 0, 0, 'P2', JOUEUR, 'REC', 'OK')
+    assert database.fetch_all_stats(AUTRE_MATCH)[0]['id'] > deleted_id
+
+def test_init_db_is_idempotent(legacy_db):
+    database.init_db()
+    versions = database.fetch_match_versions([MATCH_ID])
+    database.init_db()
+    assert user_version() == database.SCHEMA_VERSION
+    assert database.fetch_match_versions([MATCH_ID]) == versions
+    with database.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM teams").fetchone()[0] == 1
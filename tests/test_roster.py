@@ -0,0 +1,79 @@
+"""Effectifs en base : cache invalidé par les modifications, vu par les autres workers, joueurs désactivés et non supprimés."""
+import pytest
+
+import database
+import roster
+from database import DEFAULT_TEAM_ID
+
+
+def rows(team_id=DEFAULT_TEAM_ID):
+    return [{'id': p.id, 'numero': p.numero, 'nom': p.nom} for p in roster.team(team_id).players]
+
+class Clock:
+    """Horloge de roster.time.monotonic avancée à la main."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(db, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(roster.time, 'monotonic', clock)
+    roster._cache.invalidate()
+    return clock
+
+
+def test_edit_invalidates_the_process_cache_at_once(clock):
+    team_id = roster.create_team("Seniors B")
+    assert [t.nom for t in roster.teams()][-1] == "Seniors B" # Sans attendre ROSTER_CHECK_SECONDS
+
+    roster.save_team_players(team_id, [{'numero': 7, 'nom': "Léa"}, {'numero': 12, 'nom': "Inès"}])
+    assert [(p.numero, p.nom) for p in roster.team(team_id).players] == [(7, "Léa"), (12, "Inès")]
+    assert roster.player(team_id, 12).nom == "Inès"
+
+    with pytest.raises(ValueError):
+        roster.create_team("Seniors B")
+    with pytest.raises(ValueError):
+        roster.save_team_players(team_id, [{'numero': 7, 'nom': "Léa"}, {'numero': 7, 'nom': "Zoé"}])
+    assert [(p.numero, p.nom) for p in roster.team(team_id).players] == [(7, "Léa"), (12, "Inès")]
+
+def test_other_workers_see_edits_after_the_version_check(clock):
+    other = roster.RosterCache() # Cache d'un autre worker
+    before = other.snapshot()
+    players = rows()
+    roster.save_team_players(DEFAULT_TEAM_ID, players[1:] + [{'id': players[0]['id'], 'numero': 42, 'nom': players[0]['nom']}])
+
+    # Modification faite par ce processus : l'autre cache ne relit la version qu'après ROSTER_CHECK_SECONDS
+    clock.now += roster.ROSTER_CHECK_SECONDS / 2
+    assert other.snapshot() is before
+    clock.now += roster.ROSTER_CHECK_SECONDS
+    after = other.snapshot()
+    assert after.version != before.version
+    assert after.teams[DEFAULT_TEAM_ID].by_numero[42].nom == players[0]['nom']
+
+    # Version inchangée : la photo est gardée, seule la version a été relue
+    clock.now += roster.ROSTER_CHECK_SECONDS * 2
+    assert other.snapshot() is after
+
+def test_removed_player_is_deactivated_not_deleted(clock):
+    players = rows()
+    leaving = players[0]
+    database.insert_stat('Match_20250101_100000_aaaaaa', 1, '10:00:00', 0, 0, 'P1', leaving['nom'], 'SVC', 'ACE',
+                         joueur_id=leaving['id'])
+
+    roster.save_team_players(DEFAULT_TEAM_ID, players[1:] + [{'numero': leaving['numero'], 'nom': "Remplaçant"}])
+    assert leaving['nom'] not in roster.team(DEFAULT_TEAM_ID).by_nom
+    assert roster.player(DEFAULT_TEAM_ID, leaving['numero']).nom == "Remplaçant" # Numéro libéré et réattribué
+
+    with database.get_connection() as conn:
+        row = conn.execute("""
+            SELECT p.nom, p.actif FROM actions a JOIN players p ON p.id = a.joueur_id WHERE a.match_id = ?
+        """, ('Match_20250101_100000_aaaaaa',)).fetchone()
+    assert tuple(row) == (leaving['nom'], 0)
+
+    # Retour du joueur avec son id : réactivé, ses actions passées le retrouvent
+    roster.save_team_players(DEFAULT_TEAM_ID, rows() + [{'id': leaving['id'], 'numero': 50, 'nom': leaving['nom']}])
+    assert roster.team(DEFAULT_TEAM_ID).by_nom[leaving['nom']].id == leaving['id']
@@ -0,0 +1,108 @@
+"""Moteur de score : toute modification du journal doit donner le même état qu'un rejeu complet."""
+import random
+
+from action_log import ActionLog
+from registry import ACTIONS
+from score_engine import ScoreEngine, Event, SetResult, POINTS_POUR_GAGNER, SETS_POUR_GAGNER
+
+CODES = [info.code for info in ACTIONS]
+
+
+def event(n, action):
+    return Event(f"10:{n // 60 % 60:02d}:{n % 60:02d}", f"P{n % 6 + 1}", f"Joueur {n % 4}", action)
+
+def state(engine):
+    """Tout ce que le moteur dérive du journal, pour comparer deux moteurs."""
+    return (engine.score_veec, engine.score_adverse, engine.sets_veec, engine.sets_adverse, engine.current_set,
+            dict(engine.set_results), list(engine.snapshots),
+            [engine.derived(i)[:3] for i in range(len(engine))], [engine.event(i) for i in range(len(engine))])
+
+def reference(engine):
+    return ScoreEngine(engine.event(i) for i in range(len(engine)))
+
+def aces(count, start=0, action='SVC_ACE'):
+    return [event(start + n, action) for n in range(count)]
+
+
+def test_set_and_match_end():
+    engine = ScoreEngine()
+    derived = [engine.append(e) for e in aces(POINTS_POUR_GAGNER)]
+    assert derived[-1].set_result == SetResult(1, 25, 0, 'VEEC', False, engine.event(24).timestamp)
+    assert (engine.current_set, engine.sets_veec, engine.score_veec) == (2, 1, 0)
+
+    for s in range(1, SETS_POUR_GAGNER):
+        for e in aces(POINTS_POUR_GAGNER, start=s * 100):
+            engine.append(e)
+    assert engine.match_over
+    assert (engine.sets_veec, engine.score_veec, engine.current_set) == (SETS_POUR_GAGNER, 25, SETS_POUR_GAGNER)
+    assert list(engine.set_results.values())[-1].match_over
+
+def test_two_point_lead_required():
+    engine = ScoreEngine()
+    for n in range(24):
+        engine.append(event(2 * n, 'SVC_ACE'))
+        engine.append(event(2 * n + 1, 'ATK_ERR'))
+    engine.append(event(100, 'SVC_ACE')) # 25-24 : le set continue
+    assert (engine.current_set, engine.score_veec, engine.score_adverse) == (1, 25, 24)
+    engine.append(event(101, 'SVC_ACE'))
+    assert (engine.current_set, engine.sets_veec) == (2, 1)
+
+def test_pop_reopens_closed_set():
+    engine = ScoreEngine(aces(POINTS_POUR_GAGNER + 2))
+    engine.pop()
+    engine.pop()
+    engine.pop() # Annule le point du set
+    assert (engine.current_set, engine.sets_veec, engine.score_veec) == (1, 0, 24)
+    assert engine.set_results == {}
+    assert state(engine) == state(reference(engine))
+
+def test_random_edits_match_full_replay():
+    rng = random.Random(7)
+    engine = ScoreEngine()
+    for n in range(3000):
+        op = rng.random()
+        if op < 0.75 or len(engine) < 2:
+            engine.append(event(n, rng.choice(CODES)))
+        elif op < 0.85:
+            engine.pop()
+        elif op < 0.9:
+            engine.replace(rng.randrange(len(engine)), event(n, rng.choice(CODES)))
+        elif op < 0.95:
+            engine.insert(rng.randrange(len(engine)), event(n, rng.choice(CODES)))
+        else:
+            engine.remove(rng.randrange(len(engine)))
+        if n % 100 == 0:
+            assert state(engine) == state(reference(engine)), n
+    assert state(engine) == state(reference(engine))
+
+def resumed(engine, set_results=None):
+    log = ActionLog.from_columns(engine.log.to_columns()) # Journal tel que relu depuis SQLite (set et score enregistrés)
+    return ScoreEngine.resume(log, sorted(engine.set_results.items()) if set_results is None else set_results)
+
+def test_resume_without_replaying_finished_sets(monkeypatch):
+    rng = random.Random(3)
+    engine = ScoreEngine(event(n, rng.choice(['SVC_ACE', 'SVC_ACE', 'ATK_ERR', 'REC_OK'])) for n in range(150))
+    assert 0 < len(engine.set_results) and not engine.match_over
+
+    steps = []
+    step = ScoreEngine._step
+    monkeypatch.setattr(ScoreEngine, '_step', lambda self, index: steps.append(index) or step(self, index))
+    assert state(resumed(engine)) == state(engine)
+    assert steps == list(range(engine.snapshots[-1].index, len(engine))) # Seul le set en cours est rejoué
+
+def test_resume_finished_match():
+    engine = ScoreEngine(aces(POINTS_POUR_GAGNER * SETS_POUR_GAGNER))
+    assert engine.match_over
+    assert state(resumed(engine)) == state(engine)
+
+def test_resume_replays_when_set_results_do_not_match_log():
+    engine = ScoreEngine(aces(POINTS_POUR_GAGNER * 2 + 5))
+    results = sorted(engine.set_results.items())
+    # Fin de set manquante (écriture concurrente), fin de set hors du journal, numéro de set faux
+    for broken in (results[1:], [(-1, results[0][1])] + results[1:], [(results[0][0], results[0][1]._replace(set_num=2))]):
+        assert state(resumed(engine, broken)) == state(engine)
+
+def test_resume_with_actions_after_match_end():
+    events = aces(POINTS_POUR_GAGNER * SETS_POUR_GAGNER) + aces(3, start=500, action='ATK_ERR')
+    engine = ScoreEngine(events) # Données importées : actions saisies après la fin du match
+    assert state(resumed(engine)) == state(engine)